@@ -1,11 +1,24 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify, stream_with_context
+import gzip
+import json
 import requests
 import os
+import threading
+
+import archive
+from response_cache import ResponseCache
+from worker_pool import WORKER_URLS, ShardFailed, WorkerPool, WorkerUnavailable, merge_rows
+
+try:
+    import zstandard  # noqa: F401 - urllib3 can only decode zstd bodies when this is installed
+    WORKER_ENCODINGS = 'zstd, gzip'
+except ImportError:
+    WORKER_ENCODINGS = 'gzip'
 
 app = Flask(__name__)
 
 # Environment variables
-WORKER_URL = os.getenv('WORKER_URL', 'http://localhost:5001')
+WORKER_URL = WORKER_URLS[0]  # WORKER_URLS (comma-separated) or WORKER_URL; see worker_pool.py
 DEFAULT_LEAGUE_ID = os.getenv('DEFAULT_LEAGUE_ID', '208271')
 FAVORITE_LEAGUES = os.getenv('FAVORITE_LEAGUES', '')  # Comma-separated: "208271:My League,123456:Friends League"
 
@@ -13,11 +26,233 @@ FAVORITE_LEAGUES = os.getenv('FAVORITE_LEAGUES', '')  # Comma-separated: "208271
 print("=" * 80)
 print("CONFIGURATION LOADED:")
 print("=" * 80)
-print(f"WORKER_URL: {WORKER_URL}")
+print(f"WORKER_URLS: {', '.join(WORKER_URLS)}")
 print(f"DEFAULT_LEAGUE_ID: {DEFAULT_LEAGUE_ID}")
 print(f"FAVORITE_LEAGUES: {FAVORITE_LEAGUES if FAVORITE_LEAGUES else 'Not configured'}")
 print("=" * 80)
 
+pool = WorkerPool()
+ui_cache = ResponseCache()
+FINAL_MAX_AGE = 600  # Seconds browsers may reuse a finished gameweek's response without asking
+_warming = set()
+
+
+def worker_headers():
+    """
+    Ask the worker for a compressed body, plus the browser's row layout
+    (X-Row-Format: columnar) if it asked for one.
+    """
+    headers = {'Accept-Encoding': WORKER_ENCODINGS}
+    if request.headers.get('X-Row-Format'):
+        headers['X-Row-Format'] = request.headers['X-Row-Format']
+    return headers
+
+
+def passthrough(response):
+    """
+    Relay a worker response (requested with stream=True) without parsing it. The
+    compressed bytes go out untouched when the browser accepts the same encoding;
+    otherwise they are decompressed, but still never decoded and re-encoded as JSON.
+    """
+    try:
+        if 'json' not in response.headers.get('Content-Type', ''):
+            print(f"❌ Unexpected worker response ({response.status_code}, {response.headers.get('Content-Type')})")
+            return jsonify({'error': 'Worker returned an unexpected response. Please check the server status page.'}), 502
+
+        headers = {'Content-Type': response.headers['Content-Type'], 'Vary': 'Accept-Encoding'}
+        encoding = response.headers.get('Content-Encoding')
+        if encoding and request.accept_encodings[encoding] > 0:
+            body = response.raw.read(decode_content=False)
+            headers['Content-Encoding'] = encoding
+        else:
+            body = response.content
+        return Response(body, status=response.status_code, headers=headers)
+    finally:
+        response.close()
+
+
+def decode_body(body, encoding):
+    if encoding == 'gzip':
+        return gzip.decompress(body)
+    if encoding == 'zstd':
+        return zstandard.ZstdDecompressor().decompressobj().decompress(body)
+    return body
+
+
+def serve_cached(entry, source):
+    """
+    Answer from a cache entry: 304 when the browser's If-None-Match/If-Modified-Since
+    still matches, otherwise the stored bytes (decompressed only if the browser can't
+    take the stored encoding). Finished gameweeks may be reused by the browser for
+    FINAL_MAX_AGE; anything live is revalidated on every request.
+    """
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains_weak(entry.etag)
+    else:
+        not_modified = bool(request.if_modified_since) and request.if_modified_since.timestamp() >= entry.stored_at
+
+    if not_modified:
+        response = Response(status=304)
+    elif entry.encoding and request.accept_encodings[entry.encoding] <= 0:
+        response = Response(decode_body(entry.body, entry.encoding), content_type=entry.content_type)
+    else:
+        response = Response(entry.body, content_type=entry.content_type)
+        if entry.encoding:
+            response.headers['Content-Encoding'] = entry.encoding
+
+    response.set_etag(entry.etag, weak=True)
+    response.last_modified = entry.stored_at
+    if entry.final:
+        response.cache_control.max_age = FINAL_MAX_AGE
+    else:
+        response.cache_control.no_cache = True
+    response.vary.update(('Accept-Encoding', 'X-Row-Format'))
+    response.headers['X-Cache'] = source
+    return response
+
+
+def cached_worker_response(key, method, path, **kwargs):
+    """
+    Serve `key` from the UI cache while it is fresh; otherwise ask the league's
+    worker (key[0] is the league id, or whatever else picks the worker) and keep a
+    successful JSON answer. If no worker
+    can be reached or the answer is a failure, an expired entry is served rather
+    than an error.
+    """
+    entry = ui_cache.get(key)
+    if entry is not None and entry.fresh():
+        ui_cache.record('hits')
+        return serve_cached(entry, 'HIT')
+
+    try:
+        _, response = pool.request(method, path, key=key[0], headers=worker_headers(), stream=True, **kwargs)
+    except requests.exceptions.RequestException:
+        if entry is None:
+            raise
+        ui_cache.record('stale')
+        return serve_cached(entry, 'STALE')
+
+    content_type = response.headers.get('Content-Type', '')
+    if response.status_code == 200 and 'json' in content_type:
+        try:
+            body = response.raw.read(decode_content=False)
+        finally:
+            response.close()
+        final = response.headers.get('X-Gameweek-Final') == 'true'
+        ui_cache.record('misses')
+        return serve_cached(ui_cache.put(key, body, content_type, response.headers.get('Content-Encoding'), final), 'MISS')
+
+    if entry is not None and (response.status_code >= 500 or 'json' not in content_type):
+        response.close()
+        ui_cache.record('stale')
+        return serve_cached(entry, 'STALE')
+    return passthrough(response)
+
+
+def json_entry(key, payload, final):
+    """Cache a response built here rather than relayed from a worker."""
+    body = json.dumps(payload, separators=(',', ':')).encode()
+    return ui_cache.put(key, gzip.compress(body, compresslevel=5), 'application/json', 'gzip', final)
+
+
+def merged_entry(key, league_id, gameweek, leaderboard, final, shards):
+    """Cache a leaderboard merged from shards, in the same shape as the worker's /process answer."""
+    return json_entry(key, {
+        'status': 'completed',
+        'gameweek': gameweek,
+        'league_id': league_id,
+        'gameweek_final': final,
+        'leaderboard': leaderboard,
+        'total_managers': len(leaderboard),
+        'shards': shards,
+    }, final)
+
+
+def rows_out(rows):
+    """
+    Row dicts in the layout the browser asked for: plain rows, or with X-Row-Format:
+    columnar the worker's {columns: {field: [...]}, length} layout (absent fields null).
+    """
+    if request.headers.get('X-Row-Format', '').strip().lower() == 'columnar':
+        fields = list(dict.fromkeys(field for row in rows for field in row))
+        return {'columns': {field: [row.get(field) for row in rows] for field in fields}, 'length': len(rows)}
+    return rows
+
+
+def archived_leaderboard(key, league_id, gameweek):
+    """
+    A finished leaderboard from ARCHIVE_DIR (see archive.py) for when no worker can
+    answer, or None if not archived. Cached as live, so the worker's current totals
+    replace it as soon as a worker is back.
+    """
+    archived = archive.leaderboard(league_id, gameweek)
+    if archived is None:
+        return None
+    leaderboard = archived.entries(range(len(archived)))
+    return json_entry(key, {
+        'status': 'completed',
+        'gameweek': gameweek,
+        'league_id': league_id,
+        'gameweek_final': True,
+        'leaderboard': rows_out(leaderboard),
+        'total_managers': len(leaderboard),
+        'archived': True,
+        'built_at': archived.meta['created_at'],
+    }, False)
+
+
+def sharded_leaderboard(key, league_id, gameweek, incremental, shards):
+    """
+    /leaderboard for a league split across workers (see worker_pool.py): every shard
+    is built on its own worker and the rows merged here, then cached like any answer.
+    """
+    entry = ui_cache.get(key)
+    if entry is not None and entry.fresh():
+        ui_cache.record('hits')
+        return serve_cached(entry, 'HIT')
+
+    try:
+        results = pool.run_shards('/process', {'gameweek': gameweek, 'league_id': league_id,
+                                               'incremental': incremental}, shards, key=league_id, timeout=300)
+    except (ShardFailed, requests.exceptions.ConnectionError) as e:
+        if entry is None:
+            if isinstance(e, ShardFailed):
+                return jsonify({'error': str(e)}), e.status_code
+            raise
+        ui_cache.record('stale')
+        return serve_cached(entry, 'STALE')
+
+    leaderboard = merge_rows(row for result in results for row in result['leaderboard'])
+    pool.publish_index(league_id, gameweek, leaderboard)
+    final = all(result['gameweek_final'] for result in results)
+    ui_cache.record('misses')
+    return serve_cached(merged_entry(key, league_id, gameweek, leaderboard, final, shards), 'MISS')
+
+
+def leaderboard_key(league_id, gameweek, live=False):
+    return (league_id, gameweek, 'leaderboard', live, request.headers.get('X-Row-Format', ''))
+
+
+def warm_from_job(worker, job_id, key):
+    """Store a finished job's full leaderboard under `key`, so the next visitor skips the job."""
+    try:
+        response = requests.get(
+            f'{worker.url}/jobs/{job_id}/result',
+            headers={'Accept-Encoding': WORKER_ENCODINGS, 'X-Row-Format': key[-1]},
+            stream=True,
+            timeout=60
+        )
+        try:
+            if response.status_code == 200:
+                ui_cache.put(key, response.raw.read(decode_content=False), response.headers['Content-Type'],
+                             response.headers.get('Content-Encoding'), response.headers.get('X-Gameweek-Final') == 'true')
+        finally:
+            response.close()
+    except Exception as e:
+        print(f"Cache warm from job {job_id} failed: {e}")
+    finally:
+        _warming.discard(key)
+
 
 @app.route('/')
 def index():
@@ -30,32 +265,62 @@ def status():
     return render_template('status.html')
 
 
-@app.route('/leaderboard', methods=['POST'])
+@app.route('/leaderboard', methods=['GET', 'POST'])
 def leaderboard():
-    """Forward request to worker server"""
+    """
+    Forward request to worker server, through the UI cache (see cached_worker_response).
+    Takes form fields (POST) or query parameters (GET). With cached=only nothing is
+    sent to the worker: a cached leaderboard (fresh, or any finished-gameweek one),
+    an archived one while no worker is up, or a 404.
+    """
     print("\n" + "=" * 80)
     print("LEADERBOARD REQUEST RECEIVED")
     print("=" * 80)
 
     try:
-        gameweek = request.form.get('gameweek')
-        league_id = request.form.get('league_id')
+        gameweek = int(request.values.get('gameweek'))
+        league_id = int(request.values.get('league_id'))
+        incremental = request.values.get('incremental') == 'true'
+        live = request.values.get('live') == 'true'
+        key = leaderboard_key(league_id, gameweek, live)
 
         print(f"Gameweek: {gameweek}")
         print(f"League ID: {league_id}")
-        print(f"Forwarding to: {WORKER_URL}/process")
 
-        # Forward to worker server
-        response = requests.post(
-            f'{WORKER_URL}/process',
-            json={'gameweek': int(gameweek), 'league_id': int(league_id)},
-            timeout=300  # 5 minute timeout
-        )
-
-        print(f"✓ Worker responded with status: {response.status_code}")
+        entry = ui_cache.get(key)
+        if not live and not pool.healthy() and (entry is None or not (entry.fresh() or entry.final)):
+            archived = archived_leaderboard(key, league_id, gameweek)
+            if archived is not None:
+                print("No worker up; served from the archive")
+                return serve_cached(archived, 'ARCHIVE')
+
+        if request.values.get('cached') == 'only':
+            if entry is None or not (entry.fresh() or entry.final):
+                print("Not cached")
+                return jsonify({'error': 'Not cached', 'cached': False}), 404
+            print("Served from UI cache")
+            ui_cache.record('hits')
+            return serve_cached(entry, 'HIT')
+
+        # Only ask for the league's size when the worker pool will actually be used.
+        shards = 1 if live or (entry is not None and entry.fresh()) else pool.shard_count(league_id)
+        if shards > 1:
+            print(f"Splitting into {shards} shards across the worker pool")
+            response = sharded_leaderboard(key, league_id, gameweek, incremental, shards)
+        else:
+            print("Forwarding to the worker pool: /process")
+            response = cached_worker_response(
+                key, 'POST', '/process',
+                json={'gameweek': gameweek, 'league_id': league_id, 'incremental': incremental, 'live': live},
+                timeout=300  # 5 minute timeout
+            )
+
+        if isinstance(response, tuple):
+            return response
+        print(f"✓ Answered with status: {response.status_code} ({response.headers.get('X-Cache', 'worker')})")
         print("=" * 80 + "\n")
 
-        return jsonify(response.json())
+        return response
 
     except requests.exceptions.Timeout:
         error_msg = 'Processing timeout after 5 minutes'
@@ -64,10 +329,14 @@ def leaderboard():
         return jsonify({'error': 'Processing timeout. Please try again.'}), 504
 
     except requests.exceptions.ConnectionError as e:
-        error_msg = f'Cannot connect to worker at {WORKER_URL}'
+        error_msg = f'Cannot connect to any worker ({", ".join(WORKER_URLS)})'
         print(f"❌ CONNECTION ERROR: {error_msg}")
         print(f"Details: {str(e)}")
         print("=" * 80 + "\n")
+        archived = None if live else archived_leaderboard(key, league_id, gameweek)
+        if archived is not None:
+            print("Served from the archive")
+            return serve_cached(archived, 'ARCHIVE')
         return jsonify({
             'error': 'Worker server not available. Please check the status page and contact the developer if the issue persists.'
         }), 503
@@ -80,6 +349,272 @@ def leaderboard():
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/leaderboard/stream', methods=['POST'])
+def leaderboard_stream():
+    """Stream the worker's NDJSON leaderboard (/process with "stream": true) straight through to the browser.
+
+    Rows reach the client as the worker computes them, and the connection never
+    sits idle long enough to hit a proxy or gunicorn timeout. The worker follows
+    any build of the same league already running, so this costs no extra fan-out.
+    """
+    print("\n" + "=" * 80)
+    print("STREAMING LEADERBOARD REQUEST RECEIVED")
+    print("=" * 80)
+
+    try:
+        gameweek = request.form.get('gameweek')
+        league_id = request.form.get('league_id')
+        incremental = request.form.get('incremental') == 'true'
+
+        print(f"Gameweek: {gameweek}")
+        print(f"League ID: {league_id}")
+        print("Streaming from the worker pool: /process")
+
+        _, response = pool.request(
+            'POST', '/process', key=int(league_id),
+            json={'gameweek': int(gameweek), 'league_id': int(league_id), 'incremental': incremental, 'stream': True},
+            stream=True,
+            timeout=(10, 120)  # 10s to connect, then up to 2 minutes between chunks
+        )
+
+        print(f"✓ Worker responded with status: {response.status_code}")
+        print("=" * 80 + "\n")
+
+        if response.status_code != 200:
+            return passthrough(response)
+
+        def relay():
+            try:
+                for chunk in response.iter_content(chunk_size=None):
+                    yield chunk
+            except requests.exceptions.RequestException as e:
+                print(f"❌ STREAM INTERRUPTED: {str(e)}")
+                yield b'{"type":"error","error":"Connection to worker lost mid-stream. Please try again."}\n'
+            finally:
+                response.close()
+
+        return Response(stream_with_context(relay()), mimetype='application/x-ndjson')
+
+    except requests.exceptions.Timeout:
+        print("❌ STREAM TIMEOUT")
+        print("=" * 80 + "\n")
+        return jsonify({'error': 'Processing timeout. Please try again.'}), 504
+
+    except requests.exceptions.ConnectionError as e:
+        print(f"❌ CONNECTION ERROR: {str(e)}")
+        print("=" * 80 + "\n")
+        return jsonify({
+            'error': 'Worker server not available. Please check the status page and contact the developer if the issue persists.'
+        }), 503
+
+    except Exception as e:
+        print(f"❌ UNKNOWN ERROR: {str(e)}")
+        print("=" * 80 + "\n")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/leaderboard/jobs', methods=['POST'])
+def submit_leaderboard_job():
+    """Queue a leaderboard job on the worker. Returns straight away with a job id to poll."""
+    print("\n" + "=" * 80)
+    print("LEADERBOARD JOB REQUEST RECEIVED")
+    print("=" * 80)
+
+    try:
+        gameweek = request.form.get('gameweek')
+        league_id = request.form.get('league_id')
+        incremental = request.form.get('incremental') == 'true'
+        live = request.form.get('live') == 'true'
+
+        print(f"Gameweek: {gameweek}")
+        print(f"League ID: {league_id}")
+        shards = pool.shard_count(int(league_id))
+        if shards > 1:
+            job = pool.submit_sharded(int(league_id), int(gameweek), incremental, shards)
+            print(f"Split into {shards} shard jobs: {job.id}")
+            print("=" * 80 + "\n")
+            described = job.describe()
+            return jsonify(described), 500 if described['status'] == 'failed' else 202
+
+        print("Submitting to the worker pool: /jobs")
+
+        worker, response = pool.request(
+            'POST', '/jobs', key=int(league_id),
+            json={'gameweek': int(gameweek), 'league_id': int(league_id), 'incremental': incremental},
+            headers=worker_headers(),
+            stream=True,
+            timeout=15
+        )
+        if response.headers.get('X-Job-Id'):
+            pool.remember_job(response.headers['X-Job-Id'], worker)
+
+        print(f"✓ {worker.url} responded with status: {response.status_code}")
+        print("=" * 80 + "\n")
+
+        return passthrough(response)
+
+    except requests.exceptions.Timeout:
+        print("❌ JOB SUBMIT TIMEOUT")
+        print("=" * 80 + "\n")
+        return jsonify({'error': 'Worker did not accept the job in time. Please try again.'}), 504
+
+    except requests.exceptions.ConnectionError as e:
+        print(f"❌ CONNECTION ERROR: {str(e)}")
+        print("=" * 80 + "\n")
+        return jsonify({
+            'error': 'Worker server not available. Please check the status page and contact the developer if the issue persists.'
+        }), 503
+
+    except Exception as e:
+        print(f"❌ UNKNOWN ERROR: {str(e)}")
+        print("=" * 80 + "\n")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/leaderboard/jobs/<job_id>', methods=['GET'])
+def leaderboard_job_status(job_id):
+    """
+    Short poll for a job's progress and any new rows (pass ?since= from the last poll).
+    Sharded jobs are answered here (see worker_pool.ShardedJob); others are relayed
+    from the worker that holds them.
+    """
+    try:
+        since = request.args.get('since', 0, type=int)
+        sharded = pool.sharded_job(job_id)
+        if sharded is not None:
+            job = sharded.poll(since)
+            if job['status'] == 'completed':
+                key = leaderboard_key(sharded.league_id, sharded.gameweek)
+                entry = ui_cache.get(key)
+                if entry is None or not entry.fresh():
+                    merged_entry(key, sharded.league_id, sharded.gameweek, sharded.leaderboard,
+                                 bool(sharded.final), sharded.count)
+            return jsonify(job)
+
+        # Without a record of the job's worker (e.g. after a restart), ask each in turn.
+        candidates = pool.job_workers(job_id)
+        for i, worker in enumerate(candidates):
+            try:
+                worker, response = pool.request(
+                    'GET', f'/jobs/{job_id}', workers=[worker],
+                    params={'since': since},
+                    headers=worker_headers(),
+                    stream=True,
+                    timeout=15
+                )
+            except WorkerUnavailable:
+                if i == len(candidates) - 1:
+                    raise
+                continue
+            if response.status_code != 404 or i == len(candidates) - 1:
+                break
+            response.close()
+
+        # A finished job's leaderboard goes into the UI cache in the background.
+        if response.headers.get('X-Job-Status') == 'completed':
+            key = leaderboard_key(int(response.headers['X-League-Id']), int(response.headers['X-Gameweek']))
+            entry = ui_cache.get(key)
+            if key not in _warming and (entry is None or not entry.fresh()):
+                _warming.add(key)
+                threading.Thread(target=warm_from_job, args=(worker, job_id, key), daemon=True).start()
+
+        return passthrough(response)
+
+    except requests.exceptions.Timeout:
+        return jsonify({'error': 'Worker did not answer the poll in time.'}), 504
+
+    except requests.exceptions.ConnectionError:
+        return jsonify({'error': 'Worker server not available.'}), 503
+
+    except Exception as e:
+        print(f"❌ JOB POLL ERROR: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/leaderboard/season', methods=['POST'])
+def season_leaderboard():
+    """Forward a season/gameweek-range request (JSON: league_id, from_gameweek, to_gameweek) to the worker"""
+    try:
+        payload = request.get_json()
+        print(f"Season table: League {payload.get('league_id')}, "
+              f"GW{payload.get('from_gameweek') or 1}-{payload.get('to_gameweek') or 'current'}")
+
+        _, response = pool.request('POST', '/season', key=payload.get('league_id'), json=payload,
+                                   headers=worker_headers(), stream=True, timeout=300)
+        return passthrough(response)
+
+    except requests.exceptions.Timeout:
+        print("❌ SEASON TIMEOUT")
+        return jsonify({'error': 'Processing timeout. Please try again.'}), 504
+
+    except requests.exceptions.ConnectionError:
+        return jsonify({'error': 'Worker server not available.'}), 503
+
+    except Exception as e:
+        print(f"❌ SEASON ERROR: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
+def archived_rankings(key, payload):
+    """
+    A ranking page from an archived leaderboard for when no worker can answer (see
+    archived_leaderboard), or None; bad parameters are left for the worker's error.
+    """
+    archived = archive.leaderboard(payload.get('league_id'), payload.get('gameweek'))
+    page_size = payload.get('top') or payload.get('page_size') or 50
+    if (archived is None or payload['sort'] not in archive.SORT_FIELDS
+            or (payload.get('page') or 1) < 1 or not 1 <= page_size <= archive.MAX_PAGE_SIZE):
+        return None
+    entry = ui_cache.get(key)
+    if entry is None or not entry.fresh():
+        result = archived.rankings(payload['sort'], payload.get('page') or 1, page_size,
+                                   payload.get('team_id'), explicit_page='page' in payload)
+        result['rows'] = rows_out(result['rows'])
+        entry = json_entry(key, result, False)
+    return serve_cached(entry, 'ARCHIVE')
+
+
+@app.route('/leaderboard/rankings', methods=['GET'])
+def leaderboard_rankings():
+    """
+    One sorted page of a leaderboard from the worker's ranking index, so the browser
+    never has to download and sort the whole league.
+    Query: league_id, gameweek, sort (net_points/gw_points/total_points/tiebreak), page, page_size, top, team_id
+    """
+    try:
+        payload = {key: request.args.get(key, type=int)
+                   for key in ('league_id', 'gameweek', 'page', 'page_size', 'top', 'team_id')
+                   if request.args.get(key)}
+        payload['sort'] = request.args.get('sort', 'net_points')
+
+        key = (payload.get('league_id'), payload.get('gameweek'), 'rankings', payload['sort'],
+               payload.get('page'), payload.get('page_size'), payload.get('top'), payload.get('team_id'),
+               request.headers.get('X-Row-Format', ''))
+
+        if not pool.healthy():
+            archived = archived_rankings(key, payload)
+            if archived is not None:
+                return archived
+        try:
+            return cached_worker_response(key, 'POST', '/rankings', json=payload, timeout=300)
+        except requests.exceptions.ConnectionError:
+            archived = archived_rankings(key, payload)
+            if archived is None:
+                raise
+            return archived
+
+    except requests.exceptions.Timeout:
+        print("❌ RANKINGS TIMEOUT")
+        return jsonify({'error': 'Processing timeout. Please try again.'}), 504
+
+    except requests.exceptions.ConnectionError:
+        return jsonify({'error': 'Worker server not available.'}), 503
+
+    except Exception as e:
+        print(f"❌ RANKINGS ERROR: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
 @app.route('/tiebreaker', methods=['POST'])
 def tiebreaker():
     """Forward tiebreaker request to worker server.
@@ -96,18 +631,21 @@ def tiebreaker():
 
         print(f"Gameweek: {gameweek}")
         print(f"Managers in payload: {len(managers)}")
-        print(f"Forwarding to: {WORKER_URL}/tiebreaker")
+        print("Forwarding to the worker pool: /tiebreaker")
 
-        response = requests.post(
-            f'{WORKER_URL}/tiebreaker',
+        # Keyed by gameweek, so the gameweek's live stats and picks stay cached on one worker.
+        _, response = pool.request(
+            'POST', '/tiebreaker', key=f'gw{gameweek}',
             json={'gameweek': int(gameweek), 'managers': managers},
-            timeout=120
+            headers=worker_headers(),
+            stream=True,
+            timeout=300  # Whole-league picks fan-out for big leagues
         )
 
         print(f"✓ Worker responded with status: {response.status_code}")
         print("=" * 80 + "\n")
 
-        return jsonify(response.json())
+        return passthrough(response)
 
     except requests.exceptions.Timeout:
         print("❌ TIEBREAKER TIMEOUT")
@@ -125,28 +663,54 @@ def tiebreaker():
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/rivals', methods=['POST'])
+def rivals():
+    """Head-to-head diffs for a few managers in a gameweek, from the worker.
+    Expects JSON: { gameweek: int, team_ids: [your team_id, rival, ...] }
+    """
+    try:
+        payload = request.get_json()
+        gameweek = int(payload['gameweek'])
+        team_ids = [int(team_id) for team_id in payload.get('team_ids') or ()]
+
+        # Keyed by gameweek like /tiebreaker, so the picks and live stats are warm on one worker.
+        key = (f'gw{gameweek}', 'rivals', tuple(team_ids))
+        return cached_worker_response(key, 'POST', '/rivals',
+                                      json={'gameweek': gameweek, 'team_ids': team_ids}, timeout=60)
+
+    except requests.exceptions.Timeout:
+        print("❌ RIVALS TIMEOUT")
+        return jsonify({'error': 'Processing timeout. Please try again.'}), 504
+
+    except requests.exceptions.ConnectionError:
+        return jsonify({'error': 'Worker server not available.'}), 503
+
+    except Exception as e:
+        print(f"❌ RIVALS ERROR: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
 @app.route('/health', methods=['GET'])
 def health():
-    """Health check endpoint - checks both UI and worker"""
-    ui_status = {'status': 'ok', 'worker_url': WORKER_URL}
-
-    # Try to ping worker
-    try:
-        response = requests.get(f'{WORKER_URL}/health', timeout=5)
-        worker_status = response.json()
-        ui_status['worker'] = worker_status
-        ui_status['worker_reachable'] = True
-    except:
-        ui_status['worker'] = {'status': 'unreachable'}
-        ui_status['worker_reachable'] = False
+    """Health check endpoint - checks the UI and every worker in the pool"""
+    ui_status = {'status': 'ok', 'worker_url': WORKER_URL, 'cache': ui_cache.stats(), 'archive': archive.stats()}
+
+    # Ping every worker; `worker` is the first one that answered
+    checks = pool.check()
+    reachable = [health for _, health in checks if health is not None]
+    ui_status['workers'] = [{**worker.describe(), 'reachable': health is not None} for worker, health in checks]
+    ui_status['worker'] = reachable[0] if reachable else {'status': 'unreachable'}
+    ui_status['worker_reachable'] = bool(reachable)
+    if not reachable:
         ui_status['warning'] = 'Worker server is not responding'
+    elif len(reachable) < len(checks):
+        ui_status['warning'] = f'{len(checks) - len(reachable)} of {len(checks)} workers are not responding'
 
     return jsonify(ui_status)
 
 
-@app.route('/favorite-leagues', methods=['GET'])
-def favorite_leagues():
-    """Return list of favorite leagues"""
+def configured_leagues():
+    """DEFAULT_LEAGUE_ID followed by the FAVORITE_LEAGUES entries, as [{'id', 'name'}]"""
     leagues = []
 
     # Always add default league
@@ -169,7 +733,63 @@ def favorite_leagues():
         except Exception as e:
             print(f"Error parsing FAVORITE_LEAGUES: {e}")
 
-    return jsonify(leagues)
+    return leagues
+
+
+@app.route('/favorite-leagues', methods=['GET'])
+def favorite_leagues():
+    """Return list of favorite leagues"""
+    return jsonify(configured_leagues())
+
+
+@app.route('/leaderboard/batch', methods=['POST'])
+def batch_leaderboards():
+    """
+    Forward a multi-league request to the worker, which fetches each manager once
+    across all the leagues. Expects JSON {gameweek, league_ids}; league_ids defaults
+    to the default + favorite leagues.
+    """
+    print("\n" + "=" * 80)
+    print("BATCH REQUEST RECEIVED")
+    print("=" * 80)
+
+    try:
+        payload = request.get_json()
+        gameweek = int(payload['gameweek'])
+        league_ids = payload.get('league_ids') or [league['id'] for league in configured_leagues()]
+        league_ids = [int(league_id) for league_id in league_ids]
+
+        print(f"Gameweek: {gameweek}")
+        print(f"Leagues: {league_ids}")
+        print("Forwarding to the worker pool: /batch")
+
+        _, response = pool.request(
+            'POST', '/batch',
+            json={'gameweek': gameweek, 'league_ids': league_ids},
+            headers=worker_headers(),
+            stream=True,
+            timeout=300
+        )
+
+        print(f"✓ Worker responded with status: {response.status_code}")
+        print("=" * 80 + "\n")
+
+        return passthrough(response)
+
+    except requests.exceptions.Timeout:
+        print("❌ BATCH TIMEOUT")
+        print("=" * 80 + "\n")
+        return jsonify({'error': 'Processing timeout. Please try again.'}), 504
+
+    except requests.exceptions.ConnectionError as e:
+        print(f"❌ CONNECTION ERROR: {str(e)}")
+        print("=" * 80 + "\n")
+        return jsonify({'error': 'Worker server not available.'}), 503
+
+    except Exception as e:
+        print(f"❌ UNKNOWN ERROR: {str(e)}")
+        print("=" * 80 + "\n")
+        return jsonify({'error': str(e)}), 500
 
 
 if __name__ == '__main__':
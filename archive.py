@@ -0,0 +1,152 @@
+"""
+Read-only access to the worker's archive files (see local-worker/archive.py for
+the layout), so finished gameweeks can be served with no worker online.
+
+Copy files from the worker's archive directory (or GET /archive/<name> on the
+worker) into ARCHIVE_DIR. When no worker can answer, /leaderboard and
+/leaderboard/rankings fall back to a matching file. Files are memory-mapped and
+columns read in place through memoryviews, so this needs only the standard
+library and a ranking page touches only the rows it returns. total_points and
+overall_rank are as of when the file was built; the worker brings them up to
+date from the standings, so its answer replaces this one once it is back.
+"""
+import json
+import mmap
+import os
+import struct
+import threading
+from collections import OrderedDict
+
+ARCHIVE_DIR = os.getenv('ARCHIVE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'archive'))
+MAX_OPEN = 64
+MAGIC = b'FPLARCH1'
+PREFIX = struct.Struct('<8sI')
+SORT_FIELDS = ('net_points', 'gw_points', 'total_points')
+MAX_PAGE_SIZE = 500
+FIELDS = ('manager_name', 'player_name', 'team_id', 'gw_points', 'transfer_cost',
+          'net_points', 'total_points', 'overall_rank')
+NO_RANK = 0
+
+_open = OrderedDict()  # path -> (mtime, LeaderboardArchive)
+_lock = threading.Lock()
+
+
+class LeaderboardArchive:
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+        magic, length = PREFIX.unpack_from(self._map)
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not an archive file')
+        self.meta = json.loads(self._map[PREFIX.size:PREFIX.size + length])
+        if self.meta['kind'] != 'leaderboard':
+            raise ValueError(f'{path} is a {self.meta["kind"]} archive')
+        self.rows = self.meta['rows']
+
+    def __len__(self):
+        return self.rows
+
+    def column(self, name):
+        kind, offset, length = self.meta['columns'][name]
+        return self._view[offset:offset + length].cast(kind)
+
+    def text(self, name, indices):
+        _, offset, _ = self.meta['columns'][name]
+        ends = self._view[offset:offset + 4 * (self.rows + 1)].cast('I')
+        data = offset + 4 * (self.rows + 1)
+        return [str(self._view[data + ends[i]:data + ends[i + 1]], 'utf-8') for i in indices]
+
+    def entries(self, indices):
+        """Row dicts for the given row indices, as the worker sends them."""
+        columns = {field: self.column(field) for field in FIELDS if field not in ('manager_name', 'player_name')}
+        names, players = self.text('manager_name', indices), self.text('player_name', indices)
+        rows = []
+        for i, name, player in zip(indices, names, players):
+            row = {field: columns[field][i] if field in columns else None for field in FIELDS}
+            row['manager_name'], row['player_name'] = name, player
+            if row['overall_rank'] == NO_RANK:
+                row['overall_rank'] = None
+            rows.append(row)
+        return rows
+
+    def describe(self):
+        return {
+            'league_id': self.meta['league_id'],
+            'gameweek': self.meta['gameweek'],
+            'total_managers': self.rows,
+            'final': True,
+            'built_at': self.meta['created_at'],
+            'archived': True,
+        }
+
+    def rankings(self, sort, page, page_size, team_id=None, explicit_page=True):
+        """The worker's /rankings answer for this leaderboard (rows still need rows_out)."""
+        team = None
+        if team_id is not None:
+            team_ids = self.column('team_id')
+            i = next((i for i in range(self.rows) if team_ids[i] == team_id), None)
+            if i is not None:
+                ranks = {}
+                for field in SORT_FIELDS:
+                    place = self.column(f'place.{field}')[i]
+                    ranks[field] = {
+                        'rank': self.column(f'rank.{field}')[i],
+                        'tied': self.column(f'tied.{field}')[i],
+                        'position': place + 1,
+                        'page': place // page_size + 1,
+                    }
+                team = {'row': self.entries([i])[0], 'ranks': ranks}
+                if not explicit_page:
+                    page = ranks[sort]['page']
+
+        start = (page - 1) * page_size
+        order = self.column(f'order.{sort}')
+        indices = [order[i] for i in range(start, min(start + page_size, self.rows))]
+        rank, tied = self.column(f'rank.{sort}'), self.column(f'tied.{sort}')
+        rows = self.entries(indices)
+        for row, i in zip(rows, indices):
+            row['rank'] = rank[i]
+            row['tied'] = tied[i]
+
+        result = {
+            **self.describe(),
+            'sort': sort,
+            'page': page,
+            'page_size': page_size,
+            'pages': -(-self.rows // page_size),
+            'rows': rows,
+        }
+        if team_id is not None:
+            result['team'] = team
+        return result
+
+
+def leaderboard(league_id, gameweek):
+    """The archived leaderboard for (league, gameweek) in ARCHIVE_DIR, or None."""
+    path = os.path.join(ARCHIVE_DIR, f'league-{league_id}-gw{gameweek}.fplarc')
+    try:
+        mtime = os.stat(path).st_mtime
+    except FileNotFoundError:
+        return None
+    with _lock:
+        opened = _open.get(path)
+        if opened is not None and opened[0] == mtime:
+            _open.move_to_end(path)
+            return opened[1]
+    try:
+        archive = LeaderboardArchive(path)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Ignoring archive {path}: {e}")
+        return None
+    with _lock:
+        _open[path] = (mtime, archive)
+        while len(_open) > MAX_OPEN:
+            _open.popitem(last=False)
+    return archive
+
+
+def stats():
+    files = os.listdir(ARCHIVE_DIR) if os.path.isdir(ARCHIVE_DIR) else []
+    return {'files': sum(name.endswith('.fplarc') for name in files), 'open': len(_open)}
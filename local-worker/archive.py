@@ -0,0 +1,369 @@
+"""
+Columnar archive files for finished leaderboards and season matrices.
+
+A finished gameweek's leaderboard can only change through an FPL correction,
+yet /process used to rebuild it from cached histories on every request and
+keep it nowhere but memory. Once a (league, gameweek) is final, its
+leaderboard is written here as one file: a column per field plus the ranking
+index's sort orders, ranks and tie counts. Season matrices are kept the same
+way, one file per (league, first gameweek, last gameweek); a request is served
+from the narrowest file covering its range. Later requests memory-map the file
+and read columns in place, so a ranking page reads only the rows it shows and a
+50k-row file costs no parsing to open.
+
+What never changes is each manager's points for the archived gameweek(s).
+Names, season totals, league ranks and who is in the league do, so the worker
+builds from a file by paging today's standings and taking only the points from
+it (points_by_team, SeasonMatrix.reindexed); managers who joined since are
+fetched as usual.
+
+The files have no dependencies on the worker: the UI proxy's archive.py reads
+the same layout with the standard library only, so copying this directory next
+to app.py (ARCHIVE_DIR there) lets Render serve finished gameweeks with no
+worker online. GET /archive on the worker lists the files and
+GET /archive/<name> downloads one.
+
+Layout (little-endian):
+
+    b'FPLARCH1'        magic
+    u32                header length
+    header             JSON: kind, league_id, gameweek or gameweeks, rows,
+                       created_at and columns {name: [type, offset, length]}
+    column data        each starting on an 8-byte boundary
+
+Column types are struct codes: 'i' int32, 'q' int64, 'B' uint8, and 'str' for
+text, stored as rows + 1 uint32 end offsets followed by the UTF-8 bytes. Season
+matrices are int32 / uint8 columns of rows x len(gameweeks), row-major.
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+import records
+import season
+from ranking import SORT_FIELDS
+
+ARCHIVE_DIR = os.getenv('ARCHIVE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'archive'))
+MAX_OPEN = int(os.getenv('ARCHIVE_OPEN', '64'))  # Memory-mapped files kept open, least recently used out
+MAGIC = b'FPLARCH1'
+PREFIX = struct.Struct('<8sI')
+DTYPES = {'i': '<i4', 'q': '<i8', 'B': 'u1', 'I': '<u4'}
+NO_RANK = 0  # overall_rank of a manager FPL hasn't ranked yet
+
+_open = OrderedDict()  # path -> (mtime, Archive)
+_lock = threading.Lock()
+
+
+def leaderboard_name(league_id, gameweek):
+    return f'league-{league_id}-gw{gameweek}.fplarc'
+
+
+def season_name(league_id, first_gameweek, last_gameweek):
+    return f'season-{league_id}-gw{first_gameweek}-{last_gameweek}.fplarc'
+
+
+def _season_archives(league_id):
+    """Every season archive for a league, as SeasonArchive objects."""
+    prefix = f'season-{league_id}-gw'
+    names = os.listdir(ARCHIVE_DIR) if os.path.isdir(ARCHIVE_DIR) else ()
+    found = (_cached(name, SeasonArchive) for name in names if name.startswith(prefix) and name.endswith('.fplarc'))
+    return [archived for archived in found if archived is not None]
+
+
+def _covering_season(league_id, first_gameweek, last_gameweek):
+    """The narrowest season archive covering the range, or None."""
+    exact = _cached(season_name(league_id, first_gameweek, last_gameweek), SeasonArchive)
+    if exact is not None:
+        return exact
+    covering = [archived for archived in _season_archives(league_id) if archived.covers(first_gameweek, last_gameweek)]
+    return min(covering, key=lambda archived: len(archived.gameweeks), default=None)
+
+
+def _text(values):
+    encoded = [value.encode() for value in values]
+    ends = np.cumsum([len(value) for value in encoded], dtype=np.uint32)
+    return np.concatenate(([0], ends)).astype('<u4').tobytes() + b''.join(encoded)
+
+
+def write(name, meta, columns):
+    """
+    Write an archive atomically: columns is [(name, type, values)] with numpy arrays
+    or sequences for numeric types and strings for 'str'. Readers that already have
+    the old file mapped keep reading it until they reopen.
+    """
+    if sys.byteorder != 'little':
+        raise RuntimeError('Archives are little-endian and memory-mapped as-is')
+    blobs, index, offset = [], {}, 0
+    for column, kind, values in columns:
+        blob = _text(values) if kind == 'str' else np.ascontiguousarray(values, dtype=DTYPES[kind]).tobytes()
+        blobs.append(blob)
+        index[column] = [kind, offset, len(blob)]
+        offset += -(-len(blob) // 8) * 8
+
+    # Column offsets above are relative; shift them past the header once its size is known.
+    header = {**meta, 'created_at': time.time(), 'columns': index}
+    start = 0
+    while True:
+        encoded = json.dumps({**header, 'columns': {k: [t, o + start, n] for k, (t, o, n) in index.items()}}).encode()
+        needed = -(-(PREFIX.size + len(encoded)) // 8) * 8
+        if needed == start:
+            break
+        start = needed
+
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    path = os.path.join(ARCHIVE_DIR, name)
+    temp = f'{path}.{os.getpid()}.tmp'
+    with open(temp, 'wb') as f:
+        f.write(PREFIX.pack(MAGIC, len(encoded)) + encoded)
+        f.write(b'\0' * (start - PREFIX.size - len(encoded)))
+        for blob in blobs:
+            f.write(blob)
+            f.write(b'\0' * (-len(blob) % 8))
+    os.replace(temp, path)
+    return path
+
+
+class Archive:
+    """A memory-mapped archive file. Numeric columns are numpy views of the mapping."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, length = PREFIX.unpack_from(self._map)
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not an archive file')
+        self.meta = json.loads(self._map[PREFIX.size:PREFIX.size + length])
+        self.rows = self.meta['rows']
+
+    def column(self, name):
+        kind, offset, length = self.meta['columns'][name]
+        dtype = np.dtype(DTYPES[kind])
+        return np.frombuffer(self._map, dtype=dtype, count=length // dtype.itemsize, offset=offset)
+
+    def text(self, name, indices):
+        """The strings at the given row indices; only their bytes are read."""
+        _, offset, _ = self.meta['columns'][name]
+        ends = np.frombuffer(self._map, dtype='<u4', count=self.rows + 1, offset=offset)
+        data = offset + 4 * (self.rows + 1)
+        return [self._map[data + int(ends[i]):data + int(ends[i + 1])].decode() for i in indices]
+
+
+class LeaderboardArchive(Archive):
+    """
+    A finished leaderboard, rows in served order (net points, descending). Answers
+    the same page / rank_of / describe calls as ranking.RankingIndex, from the file.
+    """
+    final = True
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.league_id = self.meta['league_id']
+        self.gameweek = self.meta['gameweek']
+        self.team_ids = self.column('team_id')
+
+    def __len__(self):
+        return self.rows
+
+    def fresh(self):
+        return True
+
+    def points_by_team(self):
+        """{team_id: (gw_points, transfer_cost)} for every archived manager."""
+        return dict(zip(self.team_ids.tolist(),
+                        zip(self.column('gw_points').tolist(), self.column('transfer_cost').tolist())))
+
+    def manager_rows(self, indices=None):
+        """records.ManagerRow objects for the given row indices (default: all, in order)."""
+        indices = np.arange(self.rows) if indices is None else np.asarray(indices, dtype=np.int64)
+        names = self.text('manager_name', indices)
+        players = self.text('player_name', indices)
+        columns = {field: self.column(field)[indices].tolist()
+                   for field in ('team_id', 'gw_points', 'transfer_cost', 'total_points', 'overall_rank')}
+        return [
+            records.ManagerRow(names[i], players[i], columns['team_id'][i], columns['gw_points'][i],
+                               columns['transfer_cost'][i], columns['total_points'][i],
+                               columns['overall_rank'][i] if columns['overall_rank'][i] != NO_RANK else None)
+            for i in range(len(indices))
+        ]
+
+    def page(self, field, page=1, page_size=50):
+        start = (page - 1) * page_size
+        indices = self.column(f'order.{field}')[start:start + page_size]
+        ranks, tied = self.column(f'rank.{field}')[indices], self.column(f'tied.{field}')[indices]
+        entries = []
+        for row, rank, ties in zip(self.manager_rows(indices), ranks.tolist(), tied.tolist()):
+            entry = row.to_dict()
+            entry['rank'] = rank
+            entry['tied'] = ties
+            entries.append(entry)
+        return entries
+
+    def rank_of(self, team_id, page_size=50):
+        found = np.flatnonzero(self.team_ids == team_id)
+        if not found.size:
+            return None
+        i = int(found[0])
+        ranks = {}
+        for field in SORT_FIELDS:
+            place = int(self.column(f'place.{field}')[i])
+            ranks[field] = {
+                'rank': int(self.column(f'rank.{field}')[i]),
+                'tied': int(self.column(f'tied.{field}')[i]),
+                'position': place + 1,
+                'page': place // page_size + 1,
+            }
+        return {'row': self.manager_rows([i])[0].to_dict(), 'ranks': ranks}
+
+    def describe(self):
+        return {
+            'league_id': self.league_id,
+            'gameweek': self.gameweek,
+            'total_managers': self.rows,
+            'final': True,
+            'built_at': self.meta['created_at'],
+            'archived': True,
+        }
+
+
+class SeasonArchive(Archive):
+    """A league's season matrix for a contiguous range of finished gameweeks."""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.gameweeks = self.meta['gameweeks']
+
+    def covers(self, first_gameweek, last_gameweek):
+        return self.gameweeks[0] <= first_gameweek and last_gameweek <= self.gameweeks[-1]
+
+    def matrix(self, first_gameweek, last_gameweek):
+        """season.SeasonMatrix for a range within the archive; its arrays are views of the file."""
+        shape = (self.rows, len(self.gameweeks))
+        columns = slice(first_gameweek - self.gameweeks[0], last_gameweek - self.gameweeks[0] + 1)
+        indices = range(self.rows)
+        names, players = self.text('manager_name', indices), self.text('player_name', indices)
+        team_ids, totals, ranks = (self.column(field).tolist() for field in ('team_id', 'total_points', 'overall_rank'))
+        managers = [
+            records.ManagerRow(names[i], players[i], team_ids[i], total_points=totals[i],
+                               overall_rank=ranks[i] if ranks[i] != NO_RANK else None)
+            for i in indices
+        ]
+        return season.SeasonMatrix.from_arrays(
+            managers, self.gameweeks[columns],
+            self.column('points').reshape(shape)[:, columns],
+            self.column('costs').reshape(shape)[:, columns],
+            self.column('played').view(bool).reshape(shape)[:, columns],
+        )
+
+
+def _cached(name, cls):
+    path = os.path.join(ARCHIVE_DIR, name)
+    try:
+        mtime = os.stat(path).st_mtime
+    except FileNotFoundError:
+        return None
+    with _lock:
+        opened = _open.get(path)
+        if opened is not None and opened[0] == mtime:
+            _open.move_to_end(path)
+            return opened[1]
+    try:
+        archive = cls(path)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Ignoring archive {path}: {e}")
+        return None
+    with _lock:
+        _open[path] = (mtime, archive)
+        _open.move_to_end(path)
+        while len(_open) > MAX_OPEN:
+            _open.popitem(last=False)  # Unmapped once nothing references it
+    return archive
+
+
+def leaderboard(league_id, gameweek):
+    """The archived leaderboard for a finished (league, gameweek), or None."""
+    return _cached(leaderboard_name(league_id, gameweek), LeaderboardArchive)
+
+
+def season_matrix(league_id, first_gameweek, last_gameweek):
+    """An archived season.SeasonMatrix for the range, or None if no archive covers it."""
+    archived = _covering_season(league_id, first_gameweek, last_gameweek)
+    if archived is None:
+        return None
+    return archived.matrix(first_gameweek, last_gameweek)
+
+
+def _manager_columns(managers):
+    return [
+        ('team_id', 'q', [m.team_id for m in managers]),
+        ('manager_name', 'str', [m.manager_name for m in managers]),
+        ('player_name', 'str', [m.player_name for m in managers]),
+        ('total_points', 'i', [m.total_points for m in managers]),
+        ('overall_rank', 'i', [m.overall_rank or NO_RANK for m in managers]),
+    ]
+
+
+def save_leaderboard(index):
+    """Archive a final ranking.RankingIndex: its rows plus every sort's order, rank, place and ties."""
+    rows = index.rows
+    columns = _manager_columns(rows) + [
+        ('gw_points', 'i', [row.gw_points for row in rows]),
+        ('transfer_cost', 'i', [row.transfer_cost for row in rows]),
+        ('net_points', 'i', [row.net_points for row in rows]),
+    ]
+    for field in SORT_FIELDS:
+        columns += [
+            (f'order.{field}', 'i', index.orders[field]),
+            (f'place.{field}', 'i', index.places[field]),
+            (f'rank.{field}', 'i', index.ranks[field]),
+            (f'tied.{field}', 'i', index.tied[field]),
+        ]
+    meta = {'kind': 'leaderboard', 'league_id': index.league_id, 'gameweek': index.gameweek, 'rows': len(rows)}
+    return write(leaderboard_name(index.league_id, index.gameweek), meta, columns)
+
+
+def save_season(league_id, matrix, replace=False):
+    """
+    Archive a season.SeasonMatrix whose gameweeks are all final, in its own file
+    beside any other ranges of the league, unless one of them already covers it
+    (replace: write it anyway, e.g. because the league's members changed).
+    """
+    first_gameweek, last_gameweek = matrix.gameweeks[0], matrix.gameweeks[-1]
+    if not replace and _covering_season(league_id, first_gameweek, last_gameweek) is not None:
+        return None
+    columns = _manager_columns(matrix.managers) + [
+        ('points', 'i', matrix.points),
+        ('costs', 'i', matrix.costs),
+        ('played', 'B', matrix.played),
+    ]
+    meta = {'kind': 'season', 'league_id': league_id, 'gameweeks': matrix.gameweeks, 'rows': len(matrix.managers)}
+    return write(season_name(league_id, first_gameweek, last_gameweek), meta, columns)
+
+
+def listing():
+    """Every archive file with its size and header fields, for GET /archive."""
+    files = []
+    for name in sorted(os.listdir(ARCHIVE_DIR)) if os.path.isdir(ARCHIVE_DIR) else ():
+        if not name.endswith('.fplarc'):
+            continue
+        path = os.path.join(ARCHIVE_DIR, name)
+        with open(path, 'rb') as f:
+            magic, length = PREFIX.unpack(f.read(PREFIX.size))
+            if magic != MAGIC:
+                continue
+            meta = json.loads(f.read(length))
+        meta.pop('columns')
+        files.append({'name': name, 'bytes': os.path.getsize(path), **meta})
+    return files
+
+
+def stats():
+    with _lock:
+        return {'open': len(_open), 'dir': ARCHIVE_DIR}
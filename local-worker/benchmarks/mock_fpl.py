@@ -0,0 +1,232 @@
+"""
+Local stand-in for the FPL API, for benchmarking the worker.
+
+Serves synthetic but internally consistent data for the endpoints the worker
+uses: bootstrap-static, classic-league standings, entry history, entry picks,
+event live stats and fixtures. League ids double as league sizes (league 5000
+has 5000 managers), so any size can be requested without configuration.
+
+Latency, jitter and 429s are injectable, either at random (--throttle-rate) or
+like a real rate limit (--rate-limit requests/second, sliding 1s window).
+
+Run standalone:  python mock_fpl.py --port 8000 --latency 0.05 --jitter 0.02
+"""
+import argparse
+import asyncio
+import collections
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from aiohttp import web
+
+PAGE_SIZE = 50
+PLAYERS = 600
+SEASON_START = datetime(2025, 8, 15, 17, 30, tzinfo=timezone.utc)
+# Squad shape: 2 GK, 5 DEF, 5 MID, 3 FWD. Starters are picks 1-11 (1-4-4-2 here).
+SQUAD_TYPES = [1, 2, 2, 2, 2, 3, 3, 3, 3, 4, 4, 1, 2, 3, 4]
+CHIPS = ['bboost', '3xc', 'freehit', 'wildcard']
+
+
+def element_type(player_id):
+    return 1 + (player_id * 7) % 4
+
+
+def player_points(player_id, gameweek):
+    return (player_id * 31 + gameweek * 17) % 13 - 1
+
+
+def gw_points(team_id, gameweek):
+    return 20 + (team_id * 7919 + gameweek * 104729) % 80
+
+
+def transfer_cost(team_id, gameweek):
+    return 4 * ((team_id + gameweek) % 9 == 0) + 4 * ((team_id + gameweek) % 23 == 0)
+
+
+class MockFPL:
+    def __init__(self, current_gameweek=20, latency=0.0, jitter=0.0, throttle_rate=0.0, rate_limit=0):
+        self.current_gameweek = current_gameweek
+        self.latency = latency
+        self.jitter = jitter
+        self.throttle_rate = throttle_rate
+        self.rate_limit = rate_limit
+        self.requests = collections.Counter()
+        self._window = collections.deque()
+        self._leagues = {}
+
+    def totals(self, team_id, upto):
+        total, rows = 0, []
+        for gw in range(1, upto + 1):
+            points, cost = gw_points(team_id, gw), transfer_cost(team_id, gw)
+            total += points - cost
+            rows.append({
+                'event': gw, 'points': points, 'total_points': total, 'event_transfers_cost': cost,
+                'rank': None, 'overall_rank': None, 'bank': 0, 'value': 1000, 'points_on_bench': 0,
+            })
+        return rows
+
+    def league(self, league_id):
+        """Entries of a league sorted by total, cached: (team_id, total, event_total)."""
+        if league_id not in self._leagues:
+            entries = []
+            for i in range(1, league_id + 1):
+                team_id = league_id * 1_000_000 + i
+                rows = self.totals(team_id, self.current_gameweek)
+                entries.append((team_id, rows[-1]['total_points'], rows[-1]['points']))
+            entries.sort(key=lambda e: e[1], reverse=True)
+            self._leagues[league_id] = entries
+        return self._leagues[league_id]
+
+    @web.middleware
+    async def conditions(self, request, handler):
+        """Inject latency and throttling in front of every endpoint."""
+        if request.path.startswith('/__'):
+            return await handler(request)
+        kind = request.match_info.route.name or 'other'
+        self.requests[kind] += 1
+        self.requests['total'] += 1
+        if self.latency or self.jitter:
+            await asyncio.sleep(max(0.0, random.gauss(self.latency, self.jitter)))
+
+        now = time.monotonic()
+        self._window.append(now)
+        while self._window and self._window[0] < now - 1:
+            self._window.popleft()
+        if random.random() < self.throttle_rate or (self.rate_limit and len(self._window) > self.rate_limit):
+            self.requests['throttled'] += 1
+            return web.Response(status=429, headers={'Retry-After': '1'})
+        return await handler(request)
+
+    async def bootstrap(self, request):
+        events = []
+        for gw in range(1, 39):
+            events.append({
+                'id': gw,
+                'name': f'Gameweek {gw}',
+                'deadline_time': (SEASON_START + timedelta(weeks=gw - 1)).strftime('%Y-%m-%dT%H:%M:%SZ'),
+                'finished': gw < self.current_gameweek,
+                'data_checked': gw < self.current_gameweek,
+                'is_previous': gw == self.current_gameweek - 1,
+                'is_current': gw == self.current_gameweek,
+                'is_next': gw == self.current_gameweek + 1,
+            })
+        elements = [
+            {'id': pid, 'element_type': element_type(pid), 'team': 1 + pid % 20, 'web_name': f'Player {pid}'}
+            for pid in range(1, PLAYERS + 1)
+        ]
+        return web.json_response({'events': events, 'elements': elements})
+
+    async def standings(self, request):
+        league_id = int(request.match_info['league_id'])
+        page = int(request.query.get('page_standings', 1))
+        entries = self.league(league_id)
+        chunk = entries[(page - 1) * PAGE_SIZE:page * PAGE_SIZE]
+        results = [{
+            'id': team_id,
+            'entry': team_id,
+            'entry_name': f'Team {team_id}',
+            'player_name': f'Manager {team_id % 1_000_000}',
+            'event_total': event_total,
+            'total': total,
+            'rank': (page - 1) * PAGE_SIZE + i + 1,
+            'last_rank': (page - 1) * PAGE_SIZE + i + 1,
+            'rank_sort': (page - 1) * PAGE_SIZE + i + 1,
+        } for i, (team_id, total, event_total) in enumerate(chunk)]
+        return web.json_response({
+            'league': {'id': league_id, 'name': f'Mock League {league_id}'},
+            'standings': {'has_next': page * PAGE_SIZE < len(entries), 'page': page, 'results': results},
+        })
+
+    async def history(self, request):
+        team_id = int(request.match_info['team_id'])
+        return web.json_response({'current': self.totals(team_id, self.current_gameweek), 'past': [], 'chips': []})
+
+    async def picks(self, request):
+        team_id = int(request.match_info['team_id'])
+        gameweek = int(request.match_info['gameweek'])
+        chip = CHIPS[team_id % len(CHIPS)] if team_id % 11 == 0 else None
+        by_type = collections.defaultdict(list)
+        for pid in range(1, PLAYERS + 1):
+            by_type[element_type(pid)].append(pid)
+        picks, used = [], collections.Counter()
+        for position, etype in enumerate(SQUAD_TYPES, start=1):
+            pool = by_type[etype]
+            pid = pool[(team_id * 13 + used[etype] * 37) % len(pool)]
+            used[etype] += 1
+            starter = position <= 11 or chip == 'bboost'
+            picks.append({
+                'element': pid,
+                'position': position,
+                'multiplier': (3 if chip == '3xc' else 2) if position == 1 else int(starter),
+                'is_captain': position == 1,
+                'is_vice_captain': position == 2,
+                'element_type': etype,
+            })
+        row = self.totals(team_id, gameweek)[-1]
+        return web.json_response({'active_chip': chip, 'automatic_subs': [], 'entry_history': row, 'picks': picks})
+
+    async def live(self, request):
+        gameweek = int(request.match_info['gameweek'])
+        elements = [{
+            'id': pid,
+            'stats': {
+                'minutes': 0 if (pid + gameweek) % 10 == 0 else 90,
+                'goals_scored': int((pid + gameweek) % 17 == 0),
+                'assists': int((pid + gameweek) % 13 == 0),
+                'total_points': 0 if (pid + gameweek) % 10 == 0 else player_points(pid, gameweek),
+            },
+        } for pid in range(1, PLAYERS + 1)]
+        return web.json_response({'elements': elements})
+
+    async def fixtures(self, request):
+        gameweek = int(request.query.get('event', self.current_gameweek))
+        # In the current gameweek only the first half of the fixtures are over.
+        return web.json_response([{
+            'id': gameweek * 100 + i,
+            'event': gameweek,
+            'team_h': 2 * i + 1,
+            'team_a': 2 * i + 2,
+            'started': gameweek <= self.current_gameweek,
+            'finished': gameweek < self.current_gameweek or (gameweek == self.current_gameweek and i < 5),
+            'finished_provisional': gameweek < self.current_gameweek or (gameweek == self.current_gameweek and i < 5),
+        } for i in range(10)])
+
+    async def stats(self, request):
+        return web.json_response(dict(self.requests))
+
+    async def reset(self, request):
+        self.requests.clear()
+        return web.json_response({'ok': True})
+
+    def make_app(self):
+        app = web.Application(middlewares=[self.conditions])
+        app.router.add_get('/api/bootstrap-static/', self.bootstrap, name='bootstrap')
+        app.router.add_get('/api/leagues-classic/{league_id}/standings/', self.standings, name='standings')
+        app.router.add_get('/api/entry/{team_id}/history/', self.history, name='history')
+        app.router.add_get('/api/entry/{team_id}/event/{gameweek}/picks/', self.picks, name='picks')
+        app.router.add_get('/api/event/{gameweek}/live/', self.live, name='live')
+        app.router.add_get('/api/fixtures/', self.fixtures, name='fixtures')
+        app.router.add_get('/__stats', self.stats)
+        app.router.add_post('/__reset', self.reset)
+        return app
+
+
+def serve(port, **options):
+    """Run the mock until killed (used as a multiprocessing target by run_benchmark.py)."""
+    mock = MockFPL(**options)
+    web.run_app(mock.make_app(), host='127.0.0.1', port=port, print=None, access_log=None)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local FPL API stand-in')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--current-gameweek', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.0, help='Mean response delay in seconds')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Std-dev of the response delay in seconds')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='Probability of a random 429')
+    parser.add_argument('--rate-limit', type=int, default=0, help='Requests/second before answering 429 (0 = off)')
+    args = parser.parse_args()
+    print(f"Mock FPL API on http://127.0.0.1:{args.port}/api/")
+    serve(args.port, current_gameweek=args.current_gameweek, latency=args.latency, jitter=args.jitter,
+          throttle_rate=args.throttle_rate, rate_limit=args.rate_limit)
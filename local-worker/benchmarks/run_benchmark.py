@@ -0,0 +1,189 @@
+"""
+End-to-end benchmark for the worker against the local mock FPL API.
+
+Starts mock_fpl.py in a separate process, points the worker at it and runs the
+leaderboard build (and optionally the tiebreaker enrichment) for each league
+size, cold and then warm against the same cache. Reports wall time, upstream
+requests and requests/second, p50/p99 per-fetch latency, and peak RSS.
+
+  python benchmarks/run_benchmark.py --sizes 50,500,5000 --latency 0.05
+  python benchmarks/run_benchmark.py --sizes 50000 --rate-limit 200 --tiebreaker 500
+
+Each run uses a throwaway cache file and archive directory, with the prefetcher
+off, so results don't depend on earlier runs.
+Compare numbers before and after a change with the same flags on the same machine.
+"""
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+import urllib.request
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+# The worker reads these at import time: keep the cache and archive files in a throwaway
+# directory (an archived leaderboard would make later "cold" runs free) and don't let the
+# prefetcher fetch anything behind the benchmark's back.
+_cache_dir = tempfile.mkdtemp(prefix='fpl-bench-')
+os.environ['FPL_CACHE_PATH'] = os.path.join(_cache_dir, 'cache.sqlite3')
+os.environ['ARCHIVE_DIR'] = os.path.join(_cache_dir, 'archive')
+os.environ['PREFETCH'] = '0'
+
+import fetcher  # noqa: E402
+import mock_fpl  # noqa: E402
+import worker  # noqa: E402
+
+
+class LatencyRecorder:
+    """fetcher observer collecting per-attempt latencies."""
+
+    def __init__(self):
+        self.samples = []
+
+    def __call__(self, url, status, latency):
+        self.samples.append(latency)
+
+    def reset(self):
+        self.samples = []
+
+    def percentile(self, p):
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+def mock_request(port, path, method='GET'):
+    req = urllib.request.Request(f'http://127.0.0.1:{port}{path}', method=method)
+    with urllib.request.urlopen(req, timeout=5) as response:
+        return json.loads(response.read())
+
+
+def start_mock(port, args):
+    process = multiprocessing.Process(
+        target=mock_fpl.serve,
+        args=(port,),
+        kwargs=dict(current_gameweek=args.gameweek, latency=args.latency, jitter=args.jitter,
+                    throttle_rate=args.throttle_rate, rate_limit=args.rate_limit),
+        daemon=True,
+    )
+    process.start()
+    for _ in range(100):
+        try:
+            mock_request(port, '/__stats')
+            return process
+        except OSError:
+            time.sleep(0.05)
+    process.terminate()
+    raise RuntimeError(f"Mock FPL API did not start on port {port}")
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux, bytes on macOS.
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+
+def measure(label, port, recorder, fn, verbose=False):
+    mock_request(port, '/__reset', method='POST')
+    recorder.reset()
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    started = time.perf_counter()
+    with output:
+        result = fn()
+    elapsed = time.perf_counter() - started
+    hits = mock_request(port, '/__stats')
+    total = hits.get('total', 0)
+    return {
+        'run': label,
+        'seconds': round(elapsed, 3),
+        'requests': total,
+        'req_per_s': round(total / elapsed, 1) if elapsed else 0.0,
+        'throttled': hits.get('throttled', 0),
+        'p50_ms': round(recorder.percentile(50) * 1000, 1),
+        'p99_ms': round(recorder.percentile(99) * 1000, 1),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'result': result,
+    }
+
+
+def run_size(size, port, recorder, args):
+    def leaderboard():
+        board, error = worker.get_gw_leaderboard(size, args.gameweek, incremental=args.incremental)
+        if error:
+            raise RuntimeError(error)
+        return board
+
+    results = []
+    for label in ['cold'] + ['warm'] * args.warm:
+        results.append(measure(f'leaderboard {label}', port, recorder, leaderboard, args.verbose))
+    board = results[0].pop('result')
+    for r in results[1:]:
+        r.pop('result')
+
+    if args.tiebreaker:
+        team_ids = [row.team_id for row in board[:args.tiebreaker]]
+        r = measure(f'tiebreaker x{len(team_ids)}', port, recorder,
+                    lambda: worker.enrich_with_tiebreaker(team_ids, args.gameweek), args.verbose)
+        r.pop('result')
+        results.append(r)
+
+    for r in results:
+        r['size'] = size
+    return results
+
+
+def print_table(rows):
+    columns = ['size', 'run', 'seconds', 'requests', 'req_per_s', 'throttled', 'p50_ms', 'p99_ms', 'peak_rss_mb']
+    widths = {c: max(len(c), *(len(str(r[c])) for r in rows)) for c in columns}
+    print('  '.join(c.rjust(widths[c]) for c in columns))
+    for r in rows:
+        print('  '.join(str(r[c]).rjust(widths[c]) for c in columns))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='50,500,5000,50000', help='Comma-separated league sizes')
+    parser.add_argument('--gameweek', type=int, default=20, help='Current gameweek in the mock (and the one benchmarked)')
+    parser.add_argument('--warm', type=int, default=1, help='Warm runs against the populated cache per size')
+    parser.add_argument('--incremental', action='store_true', help='Build leaderboards with incremental=True')
+    parser.add_argument('--tiebreaker', type=int, default=0, help='Also enrich the top N managers with tiebreakers')
+    parser.add_argument('--latency', type=float, default=0.02, help='Mock mean response delay in seconds')
+    parser.add_argument('--jitter', type=float, default=0.01, help='Mock response delay std-dev in seconds')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='Mock probability of a random 429')
+    parser.add_argument('--rate-limit', type=int, default=0, help='Mock requests/second before 429 (0 = off)')
+    parser.add_argument('--port', type=int, default=8799)
+    parser.add_argument('--json', action='store_true', help='Print results as JSON lines instead of a table')
+    parser.add_argument('--verbose', action='store_true', help="Don't silence the worker's own logging")
+    args = parser.parse_args()
+
+    mock = start_mock(args.port, args)
+    worker.BASE_URL = f'http://127.0.0.1:{args.port}/api/'
+    recorder = LatencyRecorder()
+    fetcher.add_observer(recorder)
+
+    print(f"FETCH_CONCURRENCY={fetcher.CONCURRENCY} FETCH_RATE={fetcher.RATE or 'adaptive'} "
+          f"latency={args.latency}s±{args.jitter}s throttle={args.throttle_rate} rate_limit={args.rate_limit or 'off'}")
+    rows = []
+    try:
+        for size in (int(s) for s in args.sizes.split(',')):
+            for r in run_size(size, args.port, recorder, args):
+                rows.append(r)
+                if args.json:
+                    print(json.dumps(r), flush=True)
+    finally:
+        mock.terminate()
+    if not args.json:
+        print_table(rows)
+
+
+if __name__ == '__main__':
+    main()
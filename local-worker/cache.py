@@ -0,0 +1,365 @@
+"""
+Persistent on-disk cache for FPL API responses.
+
+Raw response bodies are kept in a SQLite file next to the worker so they survive
+restarts. Callers pick a TTL based on what the data is, and can additionally pass
+valid_after: any entry stored after that moment is served regardless of its TTL.
+That is how finished-gameweek data becomes permanent — once a gameweek is final,
+everything fetched after the moment we first saw it final can never change.
+
+The same file also keeps the last computed leaderboard per (league, gameweek) so
+incremental refreshes only refetch managers whose standings moved, and which
+background prefetch work is already done.
+
+Nothing here touches SQLite on the fetch loop, so a fan-out never waits on it:
+reads run on a couple of reader threads (get_async batches them; the *_async
+helpers cover the rest) and writes go through one writer thread, which commits
+whatever piled up during the previous commit as a single transaction. Queued
+responses are visible to reads before they land; a queued snapshot is not, which
+only means an incremental refresh started meanwhile reuses fewer rows.
+"""
+import asyncio
+import atexit
+import functools
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+CACHE_PATH = os.getenv('FPL_CACHE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fpl_cache.sqlite3'))
+MAX_AGE_DAYS = 300  # Anything older than a season is pruned on startup
+
+# TTLs in seconds
+TTL_BOOTSTRAP = 300
+TTL_STANDINGS = 120
+TTL_HISTORY = 300
+TTL_PICKS = 300
+TTL_LIVE = 60
+
+READERS = 2  # Threads answering cache reads for the fetch loop
+READ_BATCH = 500  # Max urls per read query
+WRITE_BATCH = 500  # Max responses written per transaction
+
+_local = threading.local()
+_readers = ThreadPoolExecutor(READERS, thread_name_prefix='cache-read')
+_writes = queue.Queue()
+_writer = None
+_pending = {}  # url -> entry queued for the writer (None = delete), so reads see it before it lands
+_pending_lock = threading.Lock()
+_lookups = []  # (url, future) waiting for the next batched read; fetch loop only
+_finals = {}  # gameweek -> final_at; never changes once set
+_MISSING = object()
+
+
+def _conn():
+    """One connection per thread; WAL lets gunicorn worker processes share the file."""
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(CACHE_PATH, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            'url TEXT PRIMARY KEY, body BLOB NOT NULL, stored_at REAL NOT NULL, expires_at REAL NOT NULL)'
+        )
+        conn.execute('CREATE TABLE IF NOT EXISTS final_gameweeks (gameweek INTEGER PRIMARY KEY, final_at REAL NOT NULL)')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS snapshots ('
+            'league_id INTEGER, gameweek INTEGER, stored_at REAL NOT NULL, body TEXT NOT NULL, '
+            'PRIMARY KEY (league_id, gameweek))'
+        )
+        conn.execute('CREATE TABLE IF NOT EXISTS league_pages (league_id INTEGER PRIMARY KEY, pages INTEGER NOT NULL)')
+        conn.execute('CREATE TABLE IF NOT EXISTS prefetched (key TEXT PRIMARY KEY, done_at REAL NOT NULL)')
+        conn.commit()
+        _local.conn = conn
+    return conn
+
+
+def _valid(entry, valid_after):
+    _, stored_at, expires_at = entry
+    return expires_at >= time.time() or (valid_after is not None and stored_at >= valid_after)
+
+
+def _queued(url):
+    """(body, stored_at, expires_at) of a write still in the queue, None for a queued delete, else _MISSING."""
+    with _pending_lock:
+        return _pending.get(url, _MISSING)
+
+
+def get(url, valid_after=None):
+    """Return the cached body for url, or None if missing/expired."""
+    entry = _queued(url)
+    if entry is _MISSING:
+        entry = _conn().execute('SELECT body, stored_at, expires_at FROM responses WHERE url = ?', (url,)).fetchone()
+    if entry is None or not _valid(entry, valid_after):
+        return None
+    return entry[0]
+
+
+async def get_async(url, valid_after=None):
+    """get() for the fetch loop: SQLite is read on a reader thread, never on the loop."""
+    entry = _queued(url)
+    if entry is _MISSING:
+        entry = await _read(url)
+    if entry is None or not _valid(entry, valid_after):
+        return None
+    return entry[0]
+
+
+def get_stored_after(url, stored_after):
+    """Return the cached body for url if it was stored at or after stored_after, ignoring its TTL."""
+    entry = _queued(url)
+    if entry is not _MISSING:
+        return entry[0] if entry is not None and entry[1] >= stored_after else None
+    row = _conn().execute(
+        'SELECT body FROM responses WHERE url = ? AND stored_at >= ?', (url, stored_after)
+    ).fetchone()
+    return row[0] if row else None
+
+
+async def get_stored_after_async(url, stored_after):
+    entry = _queued(url)
+    if entry is _MISSING:
+        entry = await _read(url)
+    return entry[0] if entry is not None and entry[1] >= stored_after else None
+
+
+async def _read(url):
+    """
+    (body, stored_at, expires_at) for url, or None. Lookups made in the same turn of
+    the fetch loop go to a reader thread together as one query, so a fan-out pays
+    one thread hop per batch rather than per manager.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+    if not _lookups:
+        loop.call_soon(_read_batch, loop)
+    _lookups.append((url, future))
+    return await future
+
+
+def _read_batch(loop):
+    batch = _lookups[:]
+    del _lookups[:]
+
+    def resolve(done):
+        error = done.exception()
+        entries = {} if error else done.result()
+        for url, future in batch:
+            if future.done():
+                continue  # Its fetch was cancelled
+            if error:
+                future.set_exception(error)
+            else:
+                future.set_result(entries.get(url))
+
+    loop.run_in_executor(_readers, _select, list({url for url, _ in batch})).add_done_callback(resolve)
+
+
+def _select(urls):
+    conn = _conn()
+    entries = {}
+    for i in range(0, len(urls), READ_BATCH):
+        chunk = urls[i:i + READ_BATCH]
+        for url, *entry in conn.execute(
+            f'SELECT url, body, stored_at, expires_at FROM responses WHERE url IN ({",".join("?" * len(chunk))})',
+            chunk,
+        ):
+            entries[url] = tuple(entry)
+    return entries
+
+
+def put(url, body, ttl):
+    """Queue a response for the writer thread; readers see it straight away."""
+    now = time.time()
+    _queue_write(url, (body, now, now + ttl))
+
+
+def delete(url):
+    """Drop a cached body, e.g. one that turned out to be corrupt."""
+    _queue_write(url, None)
+
+
+def _queue_write(url, entry):
+    with _pending_lock:
+        _pending[url] = entry
+        _start_writer()
+    _writes.put((url, entry))
+
+
+def _queue_task(fn, *args):
+    """Run fn(*args, conn) on the writer thread, inside its next transaction."""
+    with _pending_lock:
+        _start_writer()
+    _writes.put(functools.partial(fn, *args))
+
+
+def _start_writer():
+    global _writer
+    if _writer is None:
+        _writer = threading.Thread(target=_write_forever, name='cache-writer', daemon=True)
+        _writer.start()
+
+
+def _write_forever():
+    """Write queued responses and tasks, everything that piled up during the last commit in one transaction."""
+    while True:
+        batch = [_writes.get()]
+        while len(batch) < WRITE_BATCH:
+            try:
+                batch.append(_writes.get_nowait())
+            except queue.Empty:
+                break
+        responses = [item for item in batch if not callable(item)]
+        try:
+            conn = _conn()
+            with conn:
+                conn.executemany(
+                    'INSERT OR REPLACE INTO responses (url, body, stored_at, expires_at) VALUES (?, ?, ?, ?)',
+                    [(url, *entry) for url, entry in responses if entry is not None],
+                )
+                conn.executemany('DELETE FROM responses WHERE url = ?', [(url,) for url, entry in responses if entry is None])
+                for task in batch:
+                    if callable(task):
+                        try:
+                            task(conn)
+                        except (TypeError, ValueError) as e:  # Unencodable snapshot row; the rest still land
+                            print(f"Cache write task {task.func.__name__} failed: {e}")
+        except sqlite3.Error as e:
+            print(f"Cache write of {len(batch)} items failed: {e}")
+        finally:
+            with _pending_lock:
+                for url, entry in responses:
+                    if url in _pending and _pending[url] is entry:
+                        del _pending[url]
+            for _ in batch:
+                _writes.task_done()
+
+
+def flush():
+    """Wait until every queued write is on disk."""
+    _writes.join()
+
+
+async def _off_loop(fn, *args):
+    """A blocking call below, made from the fetch loop on a reader thread."""
+    return await asyncio.get_running_loop().run_in_executor(_readers, fn, *args)
+
+
+def final_at(gameweek):
+    """When this worker first saw the gameweek finished with bonus confirmed (None if not yet)."""
+    if gameweek in _finals:
+        return _finals[gameweek]
+    row = _conn().execute('SELECT final_at FROM final_gameweeks WHERE gameweek = ?', (gameweek,)).fetchone()
+    if row:
+        _finals[gameweek] = row[0]
+    return row[0] if row else None
+
+
+async def final_at_async(gameweek):
+    if gameweek in _finals:
+        return _finals[gameweek]
+    return await _off_loop(final_at, gameweek)
+
+
+def mark_final(gameweek):
+    conn = _conn()
+    conn.execute('INSERT OR IGNORE INTO final_gameweeks (gameweek, final_at) VALUES (?, ?)', (gameweek, time.time()))
+    conn.commit()
+    return final_at(gameweek)
+
+
+async def mark_final_async(gameweek):
+    return await _off_loop(mark_final, gameweek)
+
+
+def prune(max_age_days=MAX_AGE_DAYS):
+    conn = _conn()
+    deleted = conn.execute('DELETE FROM responses WHERE stored_at < ?', (time.time() - max_age_days * 86400,)).rowcount
+    conn.commit()
+    return deleted
+
+
+def save_snapshot(league_id, gameweek, entries):
+    """
+    Queue a leaderboard snapshot for the writer thread. entries: iterable of
+    (sig, row dict) pairs, consumed (and encoded one at a time, so a big league
+    never has every row dict alive at once) on that thread — it must not change
+    after this call.
+    """
+    _queue_task(_write_snapshot, league_id, gameweek, entries, time.time())
+
+
+def _write_snapshot(league_id, gameweek, entries, stored_at, conn):
+    body = '[' + ','.join(
+        json.dumps({'sig': sig, 'row': row}, separators=(',', ':')) for sig, row in entries
+    ) + ']'
+    conn.execute(
+        'INSERT OR REPLACE INTO snapshots (league_id, gameweek, stored_at, body) VALUES (?, ?, ?, ?)',
+        (league_id, gameweek, stored_at, body),
+    )
+
+
+def load_snapshot(league_id, gameweek):
+    """Last saved snapshot as {team_id: {'sig': [...], 'row': {...}}}, or {} if none."""
+    row = _conn().execute(
+        'SELECT body FROM snapshots WHERE league_id = ? AND gameweek = ?', (league_id, gameweek)
+    ).fetchone()
+    if row is None:
+        return {}
+    return {entry['row']['team_id']: entry for entry in json.loads(row[0])}
+
+
+async def load_snapshot_async(league_id, gameweek):
+    return await _off_loop(load_snapshot, league_id, gameweek)
+
+
+def snapshot_totals(league_id, gameweek, stored_after, stored_before):
+    """{team_id: total_points} from the snapshot, if it was saved within the given window; else {}."""
+    row = _conn().execute(
+        'SELECT body FROM snapshots WHERE league_id = ? AND gameweek = ? AND stored_at >= ? AND stored_at < ?',
+        (league_id, gameweek, stored_after, stored_before),
+    ).fetchone()
+    if row is None:
+        return {}
+    return {entry['row']['team_id']: entry['row']['total_points'] for entry in json.loads(row[0])}
+
+
+async def snapshot_totals_async(league_id, gameweek, stored_after, stored_before):
+    return await _off_loop(snapshot_totals, league_id, gameweek, stored_after, stored_before)
+
+
+def league_pages(league_id):
+    """Standings page count seen on the last full pagination (1 if unknown)."""
+    row = _conn().execute('SELECT pages FROM league_pages WHERE league_id = ?', (league_id,)).fetchone()
+    return row[0] if row else 1
+
+
+async def league_pages_async(league_id):
+    return await _off_loop(league_pages, league_id)
+
+
+def save_league_pages(league_id, pages):
+    """Queued for the writer thread, like responses."""
+    _queue_task(_write_league_pages, league_id, pages)
+
+
+def _write_league_pages(league_id, pages, conn):
+    conn.execute('INSERT OR REPLACE INTO league_pages (league_id, pages) VALUES (?, ?)', (league_id, pages))
+
+
+def prefetched(key):
+    """Whether the background prefetcher already completed this work item."""
+    return _conn().execute('SELECT 1 FROM prefetched WHERE key = ?', (key,)).fetchone() is not None
+
+
+def mark_prefetched(key):
+    conn = _conn()
+    conn.execute('INSERT OR REPLACE INTO prefetched (key, done_at) VALUES (?, ?)', (key, time.time()))
+    conn.commit()
+
+
+atexit.register(flush)
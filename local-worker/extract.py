@@ -0,0 +1,176 @@
+"""
+CPU stage of the fetch pipeline.
+
+Fan-out coroutines used to json.loads every history and picks payload on the
+fetch loop, then keep one row of it. Here raw bodies are decoded (with orjson,
+about three times faster than json; the stdlib decoder if it is missing) and cut
+down to the few fields a build needs, so only those are held per manager.
+
+With PARSE_PROCESSES > 0 that work runs in a pool of processes instead, off
+the fetch loop and outside its GIL. Bodies are shipped in batches of up to
+PARSE_BATCH (or whatever arrived within a few milliseconds) so the pool's per-task
+cost is shared; a single 10 KB history decodes faster than one round trip
+to a process, so this only pays off with spare cores and big leagues. At most
+PARSE_QUEUE bodies are in the stage at once: when it is full, fan-out
+coroutines wait there instead of fetching their next manager, so memory stays
+flat however far the network gets ahead of the CPU.
+
+Everything the pool runs is a plain function of bytes. The pool is forked by
+start() while the worker is still single-threaded (the fetch loop, job runners
+and prefetcher all start later): spawned processes would re-run worker.py's
+module-level setup, so where fork isn't available parsing stays inline.
+"""
+import asyncio
+import atexit
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import orjson
+except ImportError:  # In requirements.txt; a bare install still works, just slower
+    orjson = None
+
+PROCESSES = int(os.getenv('PARSE_PROCESSES', '0'))  # 0 = parse on the fetch loop
+BATCH = int(os.getenv('PARSE_BATCH', '32'))
+QUEUE = int(os.getenv('PARSE_QUEUE', '256'))  # Max bodies waiting for or being parsed
+DELAY = 0.005  # Seconds a partial batch waits for company
+
+loads = orjson.loads if orjson is not None else json.loads
+
+_pool = None
+_slots = None  # asyncio.Semaphore(QUEUE), created on the fetch loop
+_pending = []  # (fn, args, future) waiting for the next batch
+_flush_handle = None
+_stats = {'batches': 0, 'items': 0, 'in_stage': 0}
+
+
+def history_points(body, gameweek):
+    """(points, transfer cost) from a history's row for gameweek; None if the manager has none."""
+    for row in loads(body).get('current', []):
+        if row.get('event') == gameweek:
+            return row['points'], row['event_transfers_cost']
+    return None
+
+
+def history_range(body, first_gameweek, last_gameweek):
+    """
+    The (event, points, transfer cost) triples of a history within the range, so the
+    full history payload can be dropped as soon as it has been fetched.
+    """
+    return [
+        (row['event'], row.get('points', 0), row.get('event_transfers_cost', 0))
+        for row in (loads(body) or {}).get('current', [])
+        if first_gameweek <= row.get('event', 0) <= last_gameweek
+    ]
+
+
+PICK_FIELDS = ('element', 'position', 'multiplier', 'is_captain', 'is_vice_captain', 'element_type')
+ENTRY_HISTORY_FIELDS = ('points', 'total_points', 'event_transfers_cost')
+
+
+def picks_fields(body):
+    """A picks payload with only what tiebreak.PicksMatrix and the rival diffs read."""
+    data = loads(body)
+    entry_history = data.get('entry_history') or {}
+    return {
+        'active_chip': data.get('active_chip'),
+        'entry_history': {field: entry_history.get(field) for field in ENTRY_HISTORY_FIELDS if field in entry_history},
+        'picks': [{field: pick.get(field) for field in PICK_FIELDS if field in pick} for pick in data.get('picks') or []],
+    }
+
+
+def _run_batch(tasks):
+    results = []
+    for fn, args in tasks:
+        try:
+            results.append((True, fn(*args)))
+        except Exception as e:
+            results.append((False, e))
+    return results
+
+
+def _noop():
+    return None
+
+
+def start():
+    """Fork the pool. Call before any thread starts; a no-op when PARSE_PROCESSES is 0."""
+    global _pool, PROCESSES
+    if not PROCESSES or _pool is not None:
+        return
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        print("PARSE_PROCESSES needs fork(); parsing on the fetch loop instead")
+        PROCESSES = 0
+        return
+    _pool = ProcessPoolExecutor(PROCESSES, mp_context=multiprocessing.get_context('fork'))
+    _pool.submit(_noop).result()  # A fork pool starts every process on its first task
+
+
+def _resolve(batch, done):
+    error = done.exception()
+    for i, (_, _, future) in enumerate(batch):
+        if future.done():
+            continue  # Its coroutine was cancelled
+        if error is not None:
+            future.set_exception(error)
+            continue
+        ok, value = done.result()[i]
+        if ok:
+            future.set_result(value)
+        else:
+            future.set_exception(value)
+
+
+def _flush():
+    global _flush_handle
+    if _flush_handle is not None:
+        _flush_handle.cancel()
+        _flush_handle = None
+    batch = _pending[:]
+    del _pending[:]
+    if not batch:
+        return
+    _stats['batches'] += 1
+    done = asyncio.get_running_loop().run_in_executor(_pool, _run_batch, [(fn, args) for fn, args, _ in batch])
+    done.add_done_callback(lambda done: _resolve(batch, done))
+
+
+async def run(fn, *args):
+    """fn(*args) through the CPU stage. Only ever awaited on the fetch loop."""
+    global _slots, _flush_handle
+    _stats['items'] += 1
+    if _pool is None:
+        return fn(*args)
+
+    if _slots is None:
+        _slots = asyncio.Semaphore(QUEUE)
+    async with _slots:
+        _stats['in_stage'] += 1
+        try:
+            future = asyncio.get_running_loop().create_future()
+            _pending.append((fn, args, future))
+            if len(_pending) >= BATCH:
+                _flush()
+            elif _flush_handle is None:
+                _flush_handle = asyncio.get_running_loop().call_later(DELAY, _flush)
+            return await future
+        finally:
+            _stats['in_stage'] -= 1
+
+
+def stats():
+    return {
+        'processes': PROCESSES if _pool is not None else 0,
+        'decoder': 'orjson' if orjson is not None else 'json',
+        **_stats,
+    }
+
+
+def close():
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+
+
+atexit.register(close)
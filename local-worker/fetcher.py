@@ -0,0 +1,191 @@
+"""
+Async fetch engine for the worker.
+
+One asyncio event loop runs on a daemon thread per process and owns a single
+aiohttp session, so every FPL call goes over pooled keep-alive connections
+instead of a fresh TCP/TLS handshake. Flask handlers stay synchronous: they
+hand coroutines to the loop with run() and block until the result is ready.
+
+Requests go through an adaptive limiter (see ratelimit.py) and are retried with
+jittered exponential backoff on 429/5xx/network errors. When retries run out
+UpstreamUnavailable is raised rather than pretending the data doesn't exist.
+"""
+import asyncio
+import atexit
+import os
+import threading
+import time
+
+import aiohttp
+
+from ratelimit import AdaptiveLimiter, backoff_delay
+
+CONCURRENCY = int(os.getenv('FETCH_CONCURRENCY', '50'))  # Max in-flight upstream requests
+RATE = float(os.getenv('FETCH_RATE', '0'))  # Optional ceiling on upstream requests per second (0 = none)
+MAX_RETRIES = int(os.getenv('FETCH_MAX_RETRIES', '5'))
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+KEEPALIVE_TIMEOUT = 30  # Seconds an idle pooled connection is kept open
+USER_AGENT = 'fpl-minileague-worker'
+
+_loop = None
+_session = None
+_limiter = None
+_lock = threading.Lock()
+_observers = []
+_retries = 0  # Upstream attempts repeated after a 429/5xx/network error
+_exhausted = 0  # Requests that raised UpstreamUnavailable
+
+
+class UpstreamUnavailable(Exception):
+    """FPL kept throttling or failing a request after every retry."""
+
+
+def _get_loop():
+    """Start the background event loop on first use (after any gunicorn fork)."""
+    global _loop
+    with _lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name='fetch-loop', daemon=True)
+            thread.start()
+            _loop = loop
+    return _loop
+
+
+def run(coro, timeout=None):
+    """
+    Run a coroutine on the fetch loop and block until it finishes.
+    Must not be called from the fetch loop itself (that would deadlock).
+    """
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop()).result(timeout)
+
+
+def submit(coro):
+    """Schedule a coroutine on the fetch loop without waiting. Returns a concurrent Future."""
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop())
+
+
+class FanOut:
+    """
+    Runs fn(item) for queued items on a fixed pool of coroutines. Only CONCURRENCY
+    requests are in flight anyway, so a 50k-manager league is held as 50k small
+    queue entries instead of 50k pending tasks, each with its own coroutine frame.
+    Must be created and used on the fetch loop; fn is expected to handle its own errors.
+    """
+
+    _DONE = object()
+
+    def __init__(self, fn, size=None):
+        self._queue = asyncio.Queue()
+        self._workers = [asyncio.ensure_future(self._work(fn)) for _ in range(size or CONCURRENCY)]
+        self.queued = 0
+
+    async def _work(self, fn):
+        while True:
+            item = await self._queue.get()
+            if item is self._DONE:
+                return
+            await fn(item)
+
+    def put(self, item):
+        self._queue.put_nowait(item)
+        self.queued += 1
+
+    async def join(self):
+        """Wait for every queued item to be processed."""
+        for _ in self._workers:
+            self._queue.put_nowait(self._DONE)
+        try:
+            await asyncio.gather(*self._workers)
+        finally:
+            self.cancel()
+
+    def cancel(self):
+        for worker in self._workers:
+            worker.cancel()
+
+
+def add_observer(fn):
+    """Register fn(url, status, latency), called after every upstream attempt (status None on network errors)."""
+    _observers.append(fn)
+
+
+def _notify(url, status, latency):
+    for fn in _observers:
+        fn(url, status, latency)
+
+
+def _get_session():
+    """Shared session + limiter. Only ever touched from the fetch loop."""
+    global _session, _limiter
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=CONCURRENCY,
+            keepalive_timeout=KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=300,
+        )
+        _session = aiohttp.ClientSession(connector=connector, headers={'User-Agent': USER_AGENT})
+        _limiter = AdaptiveLimiter(CONCURRENCY, RATE)
+    return _session
+
+
+async def get_bytes(url, timeout=10):
+    """
+    GET a URL and return the raw body. Returns None for a definitive non-200 answer
+    (e.g. 404), like fetch_data always has; throttling and transient failures are
+    retried and raise UpstreamUnavailable once MAX_RETRIES is exhausted.
+    """
+    global _retries, _exhausted
+    session = _get_session()
+    problem = None
+    for attempt in range(MAX_RETRIES + 1):
+        await _limiter.acquire()
+        started = time.monotonic()
+        retry_after = None
+        outcome = {}  # How the slot is released; left empty if the fetch is cancelled
+        try:
+            async with session.get(url, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                if response.status == 200:
+                    body = await response.read()
+                    latency = time.monotonic() - started
+                    outcome = {'latency': latency}
+                    _notify(url, 200, latency)
+                    return body
+                latency = time.monotonic() - started
+                _notify(url, response.status, latency)
+                if response.status not in RETRY_STATUSES:
+                    outcome = {'latency': latency}
+                    return None
+                problem = f"HTTP {response.status}"
+                retry_after = response.headers.get('Retry-After')
+                outcome = {'throttled': response.status == 429, 'failed': response.status != 429}
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            _notify(url, None, time.monotonic() - started)
+            problem = f"{type(e).__name__}: {e}"
+            outcome = {'failed': True}
+        finally:
+            _limiter.release(**outcome)
+
+        if attempt < MAX_RETRIES:
+            _retries += 1
+            delay = backoff_delay(attempt, retry_after=retry_after)
+            print(f"Retrying {url} in {delay:.1f}s ({problem})")
+            await asyncio.sleep(delay)
+
+    _exhausted += 1
+    print(f"Error fetching {url}: {problem}")
+    raise UpstreamUnavailable(f"{url}: {problem} after {MAX_RETRIES + 1} attempts")
+
+
+def limiter_stats():
+    stats = _limiter.stats() if _limiter else {}
+    return {**stats, 'retries': _retries, 'exhausted': _exhausted}
+
+
+def close():
+    """Close the shared session so pooled connections shut down cleanly on exit."""
+    if _loop is not None and _session is not None and not _session.closed:
+        run(_session.close(), timeout=5)
+
+
+atexit.register(close)
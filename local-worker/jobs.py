@@ -0,0 +1,230 @@
+"""
+Asynchronous leaderboard jobs for the worker.
+
+POST /jobs queues a (league_id, gameweek) job and returns its id straight away;
+clients then poll GET /jobs/<id> with short requests instead of holding one
+request open for minutes through the tunnel. Job state and rows live in the
+SQLite file next to the response cache, so a poll works whichever gunicorn
+process it lands on. Submitting a league/GW that already has a queued, running
+or recently finished job returns that job instead of starting another.
+
+A job can cover one manager-ID shard of a league (see worker.shard_of); the UI
+proxy uses that to split a big league across several workers.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+import cache
+
+QUEUE_SIZE = int(os.getenv('JOB_QUEUE_SIZE', '20'))  # Max jobs waiting to start
+RUNNERS = int(os.getenv('JOB_RUNNERS', '2'))  # Jobs computed at once per process
+RESULT_TTL = int(os.getenv('JOB_RESULT_TTL', '300'))  # Seconds a finished job is kept and reused
+STALE_AFTER = 120  # A running job with no progress for this long is presumed dead
+
+_local = threading.local()
+_lock = threading.Lock()
+_wake = threading.Event()
+_runner_fn = None
+_runner_threads = []
+
+
+class QueueFull(Exception):
+    pass
+
+
+def _conn():
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(cache.CACHE_PATH, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            'id TEXT PRIMARY KEY, league_id INTEGER NOT NULL, gameweek INTEGER NOT NULL, '
+            'incremental INTEGER NOT NULL, status TEXT NOT NULL, created_at REAL NOT NULL, '
+            'updated_at REAL NOT NULL, finished_at REAL, received INTEGER NOT NULL DEFAULT 0, '
+            'seen INTEGER NOT NULL DEFAULT 0, total INTEGER, error TEXT, '
+            'shard_index INTEGER NOT NULL DEFAULT 0, shard_count INTEGER NOT NULL DEFAULT 1)'
+        )
+        if 'shard_count' not in {column['name'] for column in conn.execute('PRAGMA table_info(jobs)')}:
+            try:  # Job tables created before sharding
+                conn.execute('ALTER TABLE jobs ADD COLUMN shard_index INTEGER NOT NULL DEFAULT 0')
+                conn.execute('ALTER TABLE jobs ADD COLUMN shard_count INTEGER NOT NULL DEFAULT 1')
+            except sqlite3.OperationalError:
+                pass  # Another process migrated it first
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS job_rows ('
+            'job_id TEXT NOT NULL, seq INTEGER NOT NULL, rows TEXT NOT NULL, PRIMARY KEY (job_id, seq))'
+        )
+        _local.conn = conn
+    return conn
+
+
+def configure(runner):
+    """
+    Register the function that computes a job. It is called with the job as a dict,
+    should report progress through add_rows(), and returns (leaderboard, error).
+    """
+    global _runner_fn
+    _runner_fn = runner
+
+
+def _ensure_runners():
+    """Runner threads start lazily in whichever process first takes a submission."""
+    with _lock:
+        if not _runner_threads:
+            for i in range(RUNNERS):
+                thread = threading.Thread(target=_run_forever, name=f'job-runner-{i}', daemon=True)
+                thread.start()
+                _runner_threads.append(thread)
+
+
+def _expire(conn):
+    now = time.time()
+    conn.execute(
+        "UPDATE jobs SET status = 'failed', error = 'Worker stopped while processing this job', finished_at = ? "
+        "WHERE status = 'running' AND updated_at < ?",
+        (now, now - STALE_AFTER),
+    )
+    conn.execute(
+        'DELETE FROM job_rows WHERE job_id IN (SELECT id FROM jobs WHERE finished_at < ?)', (now - RESULT_TTL,)
+    )
+    conn.execute('DELETE FROM jobs WHERE finished_at < ?', (now - RESULT_TTL,))
+
+
+def submit(league_id, gameweek, incremental=False, shard=(0, 1)):
+    """
+    Queue a job, or return the live/recent one for the same league, gameweek and
+    shard (index, count). Returns (job_id, created).
+    """
+    _ensure_runners()
+    conn = _conn()
+    now = time.time()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        _expire(conn)
+        existing = conn.execute(
+            "SELECT id FROM jobs WHERE league_id = ? AND gameweek = ? AND shard_index = ? AND shard_count = ? "
+            "AND status IN ('queued', 'running', 'completed') ORDER BY created_at DESC LIMIT 1",
+            (league_id, gameweek, *shard),
+        ).fetchone()
+        if existing:
+            conn.execute('COMMIT')
+            return existing['id'], False
+
+        queued = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+        if queued >= QUEUE_SIZE:
+            raise QueueFull(f'Job queue is full ({queued} waiting). Please try again shortly.')
+
+        job_id = uuid.uuid4().hex
+        conn.execute(
+            "INSERT INTO jobs (id, league_id, gameweek, incremental, status, created_at, updated_at, "
+            "shard_index, shard_count) VALUES (?, ?, ?, ?, 'queued', ?, ?, ?, ?)",
+            (job_id, league_id, gameweek, int(incremental), now, now, *shard),
+        )
+        conn.execute('COMMIT')
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+
+    _wake.set()
+    return job_id, True
+
+
+def _claim():
+    conn = _conn()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        row = conn.execute("SELECT * FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1").fetchone()
+        if row:
+            conn.execute("UPDATE jobs SET status = 'running', updated_at = ? WHERE id = ?", (time.time(), row['id']))
+        conn.execute('COMMIT')
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    return dict(row) if row else None
+
+
+def _run_forever():
+    while True:
+        job = _claim()
+        if job is None:
+            _wake.wait(timeout=1)
+            _wake.clear()
+            continue
+
+        try:
+            job['incremental'] = bool(job['incremental'])
+            leaderboard, error = _runner_fn(job)
+        except Exception as e:
+            leaderboard, error = None, str(e)
+        _finish(job['id'], leaderboard, error)
+
+
+def add_rows(job_id, rows, received, seen):
+    conn = _conn()
+    if rows:
+        seq = conn.execute('SELECT COALESCE(MAX(seq), 0) + 1 FROM job_rows WHERE job_id = ?', (job_id,)).fetchone()[0]
+        conn.execute(
+            'INSERT INTO job_rows (job_id, seq, rows) VALUES (?, ?, ?)',
+            (job_id, seq, json.dumps(rows, separators=(',', ':'))),
+        )
+    conn.execute(
+        'UPDATE jobs SET received = ?, seen = ?, updated_at = ? WHERE id = ?', (received, seen, time.time(), job_id)
+    )
+
+
+def _finish(job_id, leaderboard, error):
+    now = time.time()
+    if error:
+        print(f"Job {job_id} failed: {error}")
+        _conn().execute(
+            "UPDATE jobs SET status = 'failed', error = ?, updated_at = ?, finished_at = ? WHERE id = ?",
+            (error, now, now, job_id),
+        )
+    else:
+        print(f"Job {job_id} completed: {len(leaderboard)} managers")
+        _conn().execute(
+            "UPDATE jobs SET status = 'completed', total = ?, updated_at = ?, finished_at = ? WHERE id = ?",
+            (len(leaderboard), now, now, job_id),
+        )
+
+
+def active():
+    """Number of jobs queued or running, in any process."""
+    return _conn().execute("SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')").fetchone()[0]
+
+
+def describe(job_id, since=0):
+    """
+    Job status plus any rows recorded after batch `since`. Pass the returned
+    `next` back as `since` on the following poll. None if the job is unknown/expired.
+    """
+    conn = _conn()
+    job = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+    if job is None:
+        return None
+
+    batches = conn.execute(
+        'SELECT seq, rows FROM job_rows WHERE job_id = ? AND seq > ? ORDER BY seq', (job_id, since)
+    ).fetchall()
+    rows = [row for batch in batches for row in json.loads(batch['rows'])]
+
+    return {
+        'job_id': job_id,
+        'status': job['status'],
+        'league_id': job['league_id'],
+        'gameweek': job['gameweek'],
+        'shard': [job['shard_index'], job['shard_count']],
+        'received': job['received'],
+        'seen': job['seen'],
+        'total_managers': job['total'],
+        'error': job['error'],
+        'rows': rows,
+        'next': batches[-1]['seq'] if batches else since,
+    }
@@ -0,0 +1,98 @@
+"""
+Live gameweek scoring from picks and live player stats.
+
+FPL only updates entry histories (and league standings) in batches, so during a
+live gameweek they trail the real scores. Picks are fixed at the deadline, so
+scoring them against the shared live stats gives up-to-the-minute points for a
+whole league at the cost of one live-stats call per refresh.
+
+Rules applied, all vectorized across managers (tiebreak.PicksMatrix columns are
+squad positions: 0-10 the starting XI, 11 the bench goalkeeper, 12-14 the bench
+in priority order):
+  * Auto-subs: a starter with no minutes once their team's fixtures are done is
+    replaced by the first bench player (in bench order) who did play and keeps
+    the formation valid (1 GK, at least 3 DEF, 2 MID, 1 FWD; GK only for GK).
+  * Captain gets 2x (3x with Triple Captain). If the captain didn't play, the
+    vice-captain inherits the multiplier, provided the vice played.
+  * Bench Boost counts all 15 players and makes no auto-subs.
+  * Transfer costs come from the picks' entry_history.
+"""
+import numpy as np
+
+GOALKEEPER, DEFENDER, MIDFIELDER, FORWARD = 1, 2, 3, 4
+MIN_IN_FORMATION = {GOALKEEPER: 1, DEFENDER: 3, MIDFIELDER: 2, FORWARD: 1}
+STARTERS = 11
+
+
+def lineup(picks, stats):
+    """
+    Who counts for every manager in a PicksMatrix: (multipliers, armband, auto_subs).
+    multipliers (managers x picks) are the effective ones after auto-subs, Bench Boost
+    and captaincy (0 = not counting); armband marks the pick that got the captain's
+    multiplier (the vice-captain if the captain was absent); auto_subs counts the
+    substitutions made per manager.
+    """
+    managers, width = picks.elements.shape
+    index = stats.lookup(picks.elements)
+    played = stats.minutes[index] > 0
+    # Didn't play and can't any more: eligible to be subbed off, or to lose the captaincy.
+    absent = ~played & stats.fixtures_done[index]
+    types = np.where(picks.element_types > 0, picks.element_types, stats.element_type[index])
+
+    bench_boost = np.array([chip == 'bboost' for chip in picks.active_chips], dtype=bool)
+    triple_captain = np.array([chip == '3xc' for chip in picks.active_chips], dtype=bool)
+
+    counting = np.zeros((managers, width), dtype=bool)
+    counting[:, :STARTERS] = True
+    counting[bench_boost] = True
+
+    # Formation counts of the current XI, per manager and position type.
+    formation = {t: ((types == t) & counting).sum(axis=1) for t in MIN_IN_FORMATION}
+    auto_subs = np.zeros(managers, dtype=np.int32)
+    can_sub = ~bench_boost & picks.has_picks
+    bench_used = np.zeros((managers, width), dtype=bool)
+
+    for starter in range(min(STARTERS, width)):
+        needs_sub = can_sub & absent[:, starter]
+        out_type = types[:, starter]
+        for bench in range(STARTERS, width):
+            into_type = types[:, bench]
+            same_role = (out_type == GOALKEEPER) == (into_type == GOALKEEPER)
+            keeps_formation = np.ones(managers, dtype=bool)
+            for t, minimum in MIN_IN_FORMATION.items():
+                after = formation[t] - (out_type == t) + (into_type == t)
+                keeps_formation &= ~((out_type == t) & (after < minimum))
+            sub = needs_sub & played[:, bench] & ~bench_used[:, bench] & same_role & keeps_formation
+            if not sub.any():
+                continue
+            counting[sub, starter] = False
+            counting[sub, bench] = True
+            bench_used[sub, bench] = True
+            for t in MIN_IN_FORMATION:
+                formation[t] = formation[t] - (sub & (out_type == t)) + (sub & (into_type == t))
+            auto_subs += sub
+            needs_sub &= ~sub
+
+    multipliers = counting.astype(np.int32)
+    captain_multiplier = np.where(triple_captain, 3, 2)
+    captain_absent = (picks.captain & absent).any(axis=1)
+    vice_available = (picks.vice_captain & played).any(axis=1)
+    armband = np.where((captain_absent & vice_available)[:, None], picks.vice_captain, picks.captain)
+    multipliers = np.where(armband & counting, captain_multiplier[:, None], multipliers)
+    return multipliers, armband & counting, auto_subs
+
+
+def score(picks, stats):
+    """
+    Live scores for every manager in a PicksMatrix against a tiebreak.PlayerStats.
+    Returns int32 arrays gw_points, transfer_cost, net_points and auto_subs (count).
+    """
+    multipliers, _, auto_subs = lineup(picks, stats)
+    points = stats.total_points[stats.lookup(picks.elements)]
+    gw_points = (points * multipliers).sum(axis=1, dtype=np.int32)
+    return {
+        'gw_points': gw_points,
+        'transfer_cost': picks.transfer_costs,
+        'net_points': gw_points - picks.transfer_costs,
+        'auto_subs': auto_subs,
+    }
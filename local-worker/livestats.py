@@ -0,0 +1,141 @@
+"""
+Process-wide live player stats, one entry per gameweek.
+
+Every league and every user looking at a gameweek needs the same
+/event/{gw}/live/ data (plus the fixtures that say whose games are over), so
+it is fetched and parsed once per process into a tiebreak.PlayerStats and
+shared. While a gameweek is live a background task on the fetch loop refreshes
+it every LIVE_REFRESH seconds for as long as someone has asked for it in the
+last LIVE_IDLE seconds; once the gameweek is final the entry is frozen and
+never refetched. A live entry older than LIVE_REFRESH (its refresher stopped
+while nobody was asking) is reloaded before it is handed out again.
+
+Each entry carries a version (a digest of the stats arrays) that only changes
+when some player's stats do, so callers can tell cheaply whether anything moved.
+"""
+import asyncio
+import hashlib
+import os
+import time
+
+import fetcher
+
+LIVE_REFRESH = int(os.getenv('LIVE_REFRESH', '60'))  # Seconds between background refreshes of a live gameweek
+LIVE_IDLE = int(os.getenv('LIVE_IDLE', '900'))  # Stop refreshing a gameweek nobody has asked for in this long
+
+_entries = {}
+_loading = {}
+_refreshers = {}
+_loader = None
+
+
+class LiveStats:
+    def __init__(self, gameweek, stats, final):
+        self.gameweek = gameweek
+        self.stats = stats
+        self.final = final
+        self.version = version_of(stats)
+        self.fetched_at = time.time()
+        self.changed_at = self.fetched_at
+        self.last_used = time.monotonic()
+
+    def describe(self):
+        return {
+            'gameweek': self.gameweek,
+            'version': self.version,
+            'final': self.final,
+            'players': len(self.stats),
+            'fetched_at': self.fetched_at,
+            'changed_at': self.changed_at,
+        }
+
+
+def version_of(stats):
+    digest = hashlib.blake2b(digest_size=8)
+    for values in stats.arrays():
+        digest.update(values.tobytes())
+    return digest.hexdigest()
+
+
+def configure(loader):
+    """
+    Register the coroutine function that loads a gameweek: loader(gameweek) must
+    return (tiebreak.PlayerStats, final), bypassing any short-lived response cache.
+    """
+    global _loader
+    _loader = loader
+
+
+async def get_async(gameweek):
+    """The shared LiveStats for a gameweek. Must run on the fetch loop."""
+    entry = _entries.get(gameweek)
+    if entry is None:
+        entry = await _load_shared(gameweek)
+    elif not entry.final and time.time() - entry.fetched_at > LIVE_REFRESH:
+        try:
+            entry = await _load_shared(gameweek)
+        except Exception as e:
+            print(f"Live stats reload for GW{gameweek} failed, serving the last good stats: {e}")
+
+    entry.last_used = time.monotonic()
+    if not entry.final and gameweek not in _refreshers:
+        _refreshers[gameweek] = asyncio.ensure_future(_refresh_while_used(gameweek))
+    return entry
+
+
+def get(gameweek):
+    return fetcher.run(get_async(gameweek))
+
+
+def peek(gameweek):
+    """The entry if already loaded, without fetching or keeping it fresh."""
+    return _entries.get(gameweek)
+
+
+async def _load_shared(gameweek):
+    """_load, with concurrent callers (requests and the refresher) sharing one upstream call."""
+    task = _loading.get(gameweek)
+    if task is None:
+        task = asyncio.ensure_future(_load(gameweek))
+        _loading[gameweek] = task
+        task.add_done_callback(lambda _: _loading.pop(gameweek, None))
+    return await asyncio.shield(task)
+
+
+async def _load(gameweek):
+    stats, final = await _loader(gameweek)
+    entry = _entries.get(gameweek)
+
+    if entry is None or entry.version != version_of(stats):
+        fresh = LiveStats(gameweek, stats, final)
+        if entry is not None:
+            fresh.last_used = entry.last_used
+            print(f"Live stats for GW{gameweek} changed (version {entry.version} -> {fresh.version})")
+        entry = _entries[gameweek] = fresh
+    else:
+        entry.fetched_at = time.time()
+        entry.final = final
+    return entry
+
+
+async def _refresh_while_used(gameweek):
+    try:
+        while True:
+            await asyncio.sleep(LIVE_REFRESH)
+            entry = _entries.get(gameweek)
+            if entry is None or entry.final or time.monotonic() - entry.last_used > LIVE_IDLE:
+                return
+            try:
+                await _load_shared(gameweek)
+            except Exception as e:
+                # Keep serving the last good stats; the next tick tries again.
+                print(f"Live stats refresh for GW{gameweek} failed: {e}")
+    finally:
+        _refreshers.pop(gameweek, None)
+
+
+def stats():
+    return {
+        'gameweeks': {gw: entry.version for gw, entry in _entries.items()},
+        'refreshing': sorted(_refreshers),
+    }
@@ -0,0 +1,215 @@
+"""
+Hot-path instrumentation for the worker, exposed in Prometheus text format on
+/metrics and summarised in /health for the status page.
+
+  * Stage timings: how long a build spends paginating standings, waiting on the
+    per-manager fan-out, and computing tiebreakers. Pagination and fan-out
+    overlap, so "pagination" is the standings loop (with fetches already running
+    alongside) and "fan_out" is the wait for the remaining managers once the last
+    page is in; together they are the build's wall time.
+  * Upstream calls: a latency histogram and a status counter per FPL endpoint,
+    fed by fetcher.add_observer, so one call per attempt including retries.
+  * Cache lookups: hits and misses of the on-disk response cache per endpoint,
+    and of the ranking indexes.
+  * Values other modules already keep (in-flight upstream requests, limiter
+    window, retry counts, running computations...) are read when scraped, from
+    callbacks registered with collect().
+
+Everything is per process, like singleflight: with several gunicorn workers each
+one reports its own numbers.
+"""
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+STAGE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# name -> (type, help, buckets)
+METRICS = {
+    'fpl_stage_seconds': ('histogram', 'Time spent in each stage of a build', STAGE_BUCKETS),
+    'fpl_upstream_latency_seconds': ('histogram', 'FPL API response time per attempt', LATENCY_BUCKETS),
+    'fpl_upstream_requests_total': ('counter', 'FPL API attempts by endpoint and HTTP status (error = network)', None),
+    'fpl_cache_lookups_total': ('counter', 'On-disk response cache lookups by endpoint and result', None),
+    'fpl_ranking_lookups_total': ('counter', 'Ranking index lookups by result', None),
+}
+
+ENDPOINTS = (
+    ('standings', re.compile(r'/leagues-classic/\d+/standings/')),
+    ('picks', re.compile(r'/entry/\d+/event/\d+/picks/')),
+    ('history', re.compile(r'/entry/\d+/history/')),
+    ('live', re.compile(r'/event/\d+/live/')),
+    ('fixtures', re.compile(r'/fixtures/')),
+    ('bootstrap', re.compile(r'/bootstrap-static/')),
+)
+
+_counters = {}  # (name, labels) -> value
+_histograms = {}  # (name, labels) -> Histogram
+_collected = {}  # name -> (type, help, fn)
+_lock = threading.Lock()
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)  # Per bucket, not cumulative
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile; None past the last bucket or when empty."""
+        if not self.count:
+            return None
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= q * self.count:
+                return bound
+        return None
+
+
+def endpoint_of(url):
+    for name, pattern in ENDPOINTS:
+        if pattern.search(url):
+            return name
+    return 'other'
+
+
+def _key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def inc(name, value=1, **labels):
+    key = (name, _key(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, value, **labels):
+    key = (name, _key(labels))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = Histogram(METRICS[name][2])
+        histogram.observe(value)
+
+
+@contextmanager
+def stage(build, name):
+    """Time the enclosed block as fpl_stage_seconds{build, stage}. Works across awaits."""
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        observe('fpl_stage_seconds', time.monotonic() - started, build=build, stage=name)
+
+
+def collect(name, kind, help, fn):
+    """Register fn() -> number as a 'gauge' or 'counter', read on every scrape."""
+    _collected[name] = (kind, help, fn)
+
+
+def observe_upstream(url, status, latency):
+    """fetcher observer: one call per upstream attempt."""
+    endpoint = endpoint_of(url)
+    observe('fpl_upstream_latency_seconds', latency, endpoint=endpoint)
+    inc('fpl_upstream_requests_total', endpoint=endpoint, status=str(status) if status else 'error')
+
+
+def _format_labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', r'\\').replace('"', r'\"') for _, value in pairs)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def exposition():
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted(
+            ((key, list(h.counts), h.sum, h.count, h.buckets) for key, h in _histograms.items()),
+            key=lambda item: item[0],
+        )
+
+    lines = []
+    described = set()
+
+    def describe(name, kind, help):
+        if name not in described:
+            described.add(name)
+            lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} {kind}')
+
+    for (name, labels), value in counters:
+        describe(name, 'counter', METRICS[name][1])
+        lines.append(f'{name}{_format_labels(labels)} {_number(value)}')
+
+    for (name, labels), counts, total, count, buckets in histograms:
+        describe(name, 'histogram', METRICS[name][1])
+        cumulative = 0
+        for bound, bucket_count in zip(buckets, counts):
+            cumulative += bucket_count
+            lines.append(f'{name}_bucket{_format_labels(labels, le=bound)} {cumulative}')
+        lines.append(f'{name}_bucket{_format_labels(labels, le="+Inf")} {count}')
+        lines.append(f'{name}_sum{_format_labels(labels)} {_number(total)}')
+        lines.append(f'{name}_count{_format_labels(labels)} {count}')
+
+    for name, (kind, help, fn) in sorted(_collected.items()):
+        try:
+            value = fn()
+        except Exception as e:
+            print(f"Error reading metric {name}: {e}")
+            continue
+        describe(name, kind, help)
+        lines.append(f'{name} {_number(value)}')
+
+    return '\n'.join(lines) + '\n'
+
+
+def summary():
+    """Compact JSON view for /health and the status page."""
+    with _lock:
+        counters = dict(_counters)
+        histograms = {key: (h.count, h.sum, h.quantile(0.5), h.quantile(0.95)) for key, h in _histograms.items()}
+
+    def timing(count, total, p50, p95):
+        return {'count': count, 'mean': round(total / count, 3) if count else None, 'p50': p50, 'p95': p95}
+
+    stages, upstream, cache = {}, {}, {}
+    for (name, labels), values in histograms.items():
+        labels = dict(labels)
+        if name == 'fpl_stage_seconds':
+            stages[f"{labels['build']}.{labels['stage']}"] = timing(*values)
+        elif name == 'fpl_upstream_latency_seconds':
+            upstream[labels['endpoint']] = {**timing(*values), 'errors': 0}
+
+    for (name, labels), value in counters.items():
+        labels = dict(labels)
+        if name == 'fpl_upstream_requests_total' and labels['status'] != '200':
+            upstream.setdefault(labels['endpoint'], {'errors': 0})['errors'] += value
+        elif name in ('fpl_cache_lookups_total', 'fpl_ranking_lookups_total'):
+            endpoint = labels.get('endpoint', 'rankings')
+            entry = cache.setdefault(endpoint, {'hit': 0, 'miss': 0})
+            entry[labels['result']] += value
+
+    for entry in cache.values():
+        entry['hit_ratio'] = round(entry['hit'] / (entry['hit'] + entry['miss']), 3)
+
+    return {'stages': stages, 'upstream': upstream, 'cache': cache}
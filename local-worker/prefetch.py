@@ -0,0 +1,139 @@
+"""
+Background cache warming driven by the FPL gameweek calendar.
+
+Without it the first user after a gameweek ends pays for the whole cold fetch.
+Every PREFETCH_INTERVAL seconds the scheduler asks the worker's planner for work
+items (derived from the bootstrap events: deadlines, finished and data_checked
+flags) and runs the ones not done yet, one at a time with PREFETCH_PAUSE seconds
+between them so the warm-up trickles along under the rate limiter instead of
+bursting. Whenever user requests are in flight it waits for them first.
+
+Completed items are recorded in the cache file, so a restart doesn't redo them,
+and only one process (the one holding the lock file) prefetches, however many
+gunicorn workers there are.
+
+Leagues come from the same variables as the UI: DEFAULT_LEAGUE_ID and
+FAVORITE_LEAGUES ("208271:My League,123456:Friends League"). With neither set,
+nothing is prefetched. PREFETCH=0 turns it off.
+"""
+import os
+import threading
+import time
+
+import cache
+import jobs
+import singleflight
+
+try:
+    import fcntl
+except ImportError:  # Windows: single process, no lock needed
+    fcntl = None
+
+ENABLED = os.getenv('PREFETCH', '1') != '0'
+INTERVAL = int(os.getenv('PREFETCH_INTERVAL', '300'))  # Seconds between calendar checks
+PAUSE = float(os.getenv('PREFETCH_PAUSE', '5'))  # Seconds between work items
+STARTUP_DELAY = 30  # Let the worker finish starting before the first check
+BUSY_WAIT = 600  # Max seconds to wait for user requests to finish before going ahead anyway
+
+_planner = None
+_thread = None
+_lock_file = None
+_status = {'last_check': None, 'pending': 0, 'completed': 0, 'last_item': None, 'last_error': None}
+
+
+def configured_leagues():
+    """League ids from DEFAULT_LEAGUE_ID and FAVORITE_LEAGUES, without duplicates."""
+    ids = []
+    default = os.getenv('DEFAULT_LEAGUE_ID', '').strip()
+    if default:
+        ids.append(default)
+    for league in os.getenv('FAVORITE_LEAGUES', '').split(','):
+        league_id = league.split(':', 1)[0].strip()
+        if league_id:
+            ids.append(league_id)
+
+    leagues = []
+    for league_id in ids:
+        try:
+            leagues.append(int(league_id))
+        except ValueError:
+            print(f"Prefetch: ignoring league id {league_id!r}")
+    return list(dict.fromkeys(leagues))
+
+
+LEAGUES = configured_leagues()
+
+
+def configure(planner):
+    """
+    Register the planner: planner(leagues) returns a list of (key, fn, args) work
+    items. An item whose key is already recorded is skipped; fn(*args) raising
+    leaves it to be retried on the next check.
+    """
+    global _planner
+    _planner = planner
+
+
+def start():
+    """Start the scheduler thread if prefetching is configured and no other process runs it."""
+    global _thread, _lock_file
+    if not ENABLED or not LEAGUES or _thread is not None:
+        return False
+
+    if fcntl is not None:
+        lock_file = open(cache.CACHE_PATH + '.prefetch.lock', 'w')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        _lock_file = lock_file  # Held for the life of the process
+
+    _thread = threading.Thread(target=_run_forever, name='prefetch', daemon=True)
+    _thread.start()
+    print(f"Prefetch scheduler started for leagues {LEAGUES}")
+    return True
+
+
+def _run_forever():
+    time.sleep(STARTUP_DELAY)
+    while True:
+        try:
+            _check()
+        except Exception as e:
+            _status['last_error'] = str(e)
+            print(f"Prefetch check failed: {e}")
+        time.sleep(INTERVAL)
+
+
+def _check():
+    _status['last_check'] = time.time()
+    items = [item for item in _planner(LEAGUES) if not cache.prefetched(item[0])]
+    _status['pending'] = len(items)
+
+    for key, fn, args in items:
+        _wait_until_idle()
+        try:
+            fn(*args)
+        except Exception as e:
+            _status['last_error'] = f"{key}: {e}"
+            print(f"Prefetch {key} failed: {e}")
+        else:
+            cache.mark_prefetched(key)
+            _status['completed'] += 1
+            _status['last_item'] = key
+            print(f"Prefetched {key}")
+        _status['pending'] -= 1
+        time.sleep(PAUSE)
+
+
+def _wait_until_idle():
+    """User requests go first: hold off while any leaderboard is being computed."""
+    waited = 0
+    while (singleflight.in_flight() or jobs.active()) and waited < BUSY_WAIT:
+        time.sleep(1)
+        waited += 1
+
+
+def stats():
+    return {'enabled': _thread is not None, 'leagues': LEAGUES, **_status}
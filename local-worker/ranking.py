@@ -0,0 +1,218 @@
+"""
+Per-(league, gameweek) ranking indexes.
+
+Every leaderboard the worker builds is indexed once: for each sortable column
+the index holds the row order (descending, stable), each row's competition
+rank ("1224", ties share the best rank) and the size of its tie group. Sorted
+pages, top-N lists and "where is team X" lookups are then slices of arrays
+that already exist, so a phone asking for 50 rows of a 20k-manager league
+gets 50 rows instead of downloading and sorting the lot.
+
+Indexes are rebuilt once they are older than RANKING_MAX_AGE seconds, or
+RANKING_FINAL_MAX_AGE for finished gameweeks: their points never change, but
+season totals, overall ranks and league members do, and a rebuild takes the
+points from the archive (see archive.py) and only pages the standings. At
+most RANKING_INDEXES are kept, least recently used first out.
+
+The "tiebreak" sort is the full tiebreaker cascade (see tiebreak.py) over a
+whole league. It needs every manager's picks, so it is built on first request
+into a TiebreakIndex alongside the leaderboard's index and expires with it.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+import tiebreak
+from season import competition_ranks
+
+SORT_FIELDS = ('net_points', 'gw_points', 'total_points')
+TIEBREAK = 'tiebreak'
+MAX_INDEXES = int(os.getenv('RANKING_INDEXES', '64'))
+MAX_AGE = int(os.getenv('RANKING_MAX_AGE', '60'))  # Seconds a live-gameweek index is served before a rebuild
+FINAL_MAX_AGE = int(os.getenv('RANKING_FINAL_MAX_AGE', '900'))  # Same for a finished gameweek
+MAX_PAGE_SIZE = 500
+
+_indexes = OrderedDict()
+_tiebreaks = OrderedDict()
+_lock = threading.Lock()
+
+
+class RankingIndex:
+    def __init__(self, league_id, gameweek, rows, final):
+        """rows: records.ManagerRow list; their order breaks ties in every sort."""
+        self.league_id = league_id
+        self.gameweek = gameweek
+        self.rows = list(rows)
+        self.final = final
+        self.built_at = time.time()
+        self.position = {row.team_id: i for i, row in enumerate(self.rows)}
+
+        self.orders, self.places, self.ranks, self.tied = {}, {}, {}, {}
+        for field in SORT_FIELDS:
+            values = np.fromiter((getattr(row, field) for row in self.rows), dtype=np.int64, count=len(self.rows))
+            self.orders[field] = np.argsort(-values, kind='stable')
+            self.places[field] = np.empty(len(self.rows), dtype=np.int64)
+            self.places[field][self.orders[field]] = np.arange(len(self.rows))
+            self.ranks[field] = competition_ranks(values[:, None])[:, 0]
+            _, inverse, counts = np.unique(values, return_inverse=True, return_counts=True)
+            self.tied[field] = counts[inverse.reshape(-1)]
+
+    def __len__(self):
+        return len(self.rows)
+
+    def fresh(self):
+        return time.time() - self.built_at < (FINAL_MAX_AGE if self.final else MAX_AGE)
+
+    def manager_rows(self):
+        return self.rows
+
+    def _entry(self, i, field):
+        row = self.rows[i].to_dict()
+        row['rank'] = int(self.ranks[field][i])
+        row['tied'] = int(self.tied[field][i])
+        return row
+
+    def page(self, field, page=1, page_size=50):
+        """One page of rows in `field` order, each with its rank and tie group size."""
+        start = (page - 1) * page_size
+        return [self._entry(int(i), field) for i in self.orders[field][start:start + page_size]]
+
+    def rank_of(self, team_id, page_size=50):
+        """A team's row plus its rank, tie group size and page in every sort; None if not in the league."""
+        i = self.position.get(team_id)
+        if i is None:
+            return None
+        ranks = {}
+        for field in SORT_FIELDS:
+            place = int(self.places[field][i])
+            ranks[field] = {
+                'rank': int(self.ranks[field][i]),
+                'tied': int(self.tied[field][i]),
+                'position': place + 1,
+                'page': place // page_size + 1,
+            }
+        return {'row': self.rows[i].to_dict(), 'ranks': ranks}
+
+    def describe(self):
+        return {
+            'league_id': self.league_id,
+            'gameweek': self.gameweek,
+            'total_managers': len(self.rows),
+            'final': self.final,
+            'built_at': self.built_at,
+        }
+
+
+class TiebreakIndex:
+    """
+    A leaderboard in full tiebreaker-cascade order. Rows carry their tiebreaker
+    fields; ties share a rank only when every cascade field is level.
+    """
+
+    def __init__(self, index, fields_by_team):
+        """index: the leaderboard's RankingIndex or archive; fields_by_team: enrich_with_tiebreaker's result."""
+        self.built_for = index.describe()['built_at']
+        self.final = index.final
+        self.built_at = time.time()
+        self.rows = []
+        for row in index.manager_rows():
+            entry = row.to_dict()
+            entry.update(fields_by_team.get(row.team_id, tiebreak.DEFAULT_FIELDS))
+            self.rows.append(entry)
+        self.position = {row['team_id']: i for i, row in enumerate(self.rows)}
+
+        self.order = tiebreak.cascade_order(self.rows)
+        self.places = np.empty(len(self.rows), dtype=np.int64)
+        self.places[self.order] = np.arange(len(self.rows))
+        keys = np.array([[self.rows[i][field] for field in tiebreak.CASCADE] for i in self.order],
+                        dtype=np.int64).reshape(len(self.rows), len(tiebreak.CASCADE))
+
+        # A rank starts wherever any cascade field changes down the sorted rows.
+        starts = np.ones(len(self.rows), dtype=bool)
+        starts[1:] = (keys[1:] != keys[:-1]).any(axis=1)
+        groups = np.cumsum(starts) - 1
+        sizes = np.bincount(groups)
+        first = np.flatnonzero(starts)
+        self.ranks = np.empty(len(self.rows), dtype=np.int64)
+        self.tied = np.empty(len(self.rows), dtype=np.int64)
+        self.ranks[self.order] = first[groups] + 1
+        self.tied[self.order] = sizes[groups]
+
+    def __len__(self):
+        return len(self.rows)
+
+    def fresh(self):
+        return time.time() - self.built_at < (FINAL_MAX_AGE if self.final else MAX_AGE)
+
+    def _entry(self, i):
+        return {**self.rows[i], 'rank': int(self.ranks[i]), 'tied': int(self.tied[i])}
+
+    def page(self, page=1, page_size=50):
+        """One page of rows in cascade order, with their tiebreaker fields, rank and tie group size."""
+        start = (page - 1) * page_size
+        return [self._entry(int(i)) for i in self.order[start:start + page_size]]
+
+    def rank_of(self, team_id, page_size=50):
+        """A team's rank, tie group size, position and page in cascade order; None if not in the league."""
+        i = self.position.get(team_id)
+        if i is None:
+            return None
+        place = int(self.places[i])
+        return {
+            'rank': int(self.ranks[i]),
+            'tied': int(self.tied[i]),
+            'position': place + 1,
+            'page': place // page_size + 1,
+        }
+
+
+def put(league_id, gameweek, rows, final):
+    """Index a freshly built leaderboard, replacing any older index for it."""
+    index = RankingIndex(league_id, gameweek, rows, final)
+    with _lock:
+        _indexes[(league_id, gameweek)] = index
+        _indexes.move_to_end((league_id, gameweek))
+        while len(_indexes) > MAX_INDEXES:
+            _indexes.popitem(last=False)
+    return index
+
+
+def get(league_id, gameweek):
+    """The index if there is a fresh one, else None."""
+    with _lock:
+        index = _indexes.get((league_id, gameweek))
+        if index is None or not index.fresh():
+            return None
+        _indexes.move_to_end((league_id, gameweek))
+        return index
+
+
+def put_tiebreak(index, fields_by_team):
+    """Cascade-order a leaderboard's index (or archive) with its managers' tiebreaker fields."""
+    tiebroken = TiebreakIndex(index, fields_by_team)
+    key = (index.league_id, index.gameweek)
+    with _lock:
+        _tiebreaks[key] = tiebroken
+        _tiebreaks.move_to_end(key)
+        while len(_tiebreaks) > MAX_INDEXES:
+            _tiebreaks.popitem(last=False)
+    return tiebroken
+
+
+def get_tiebreak(index):
+    """The fresh TiebreakIndex built from this very index, else None."""
+    key = (index.league_id, index.gameweek)
+    with _lock:
+        tiebroken = _tiebreaks.get(key)
+        if tiebroken is None or not tiebroken.fresh() or tiebroken.built_for != index.describe()['built_at']:
+            return None
+        _tiebreaks.move_to_end(key)
+        return tiebroken
+
+
+def stats():
+    with _lock:
+        return {'indexes': len(_indexes), 'rows': sum(len(index) for index in _indexes.values())}
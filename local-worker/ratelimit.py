@@ -0,0 +1,166 @@
+"""
+Adaptive rate limiting for upstream FPL requests.
+
+Every fetch passes through one AdaptiveLimiter per process. A token bucket caps
+the request rate and an AIMD window caps how many requests are in flight:
+
+  * 429s halve both the window and the rate (at most once per BACKOFF_COOLDOWN,
+    since one overload shows up as a burst of 429s). 5xx and network errors only
+    halve the window — they say FPL is struggling, not that we are over its rate.
+  * Healthy responses grow them back — quickly at first (slow start), then by
+    roughly one request per window once we have been throttled. The rate starts
+    at INITIAL_RATE and keeps growing additively for as long as requests are
+    actually waiting on it, so it probes upwards instead of sitting at a fixed cap.
+  * Responses much slower than the best latency seen recently shrink the window
+    gently, and a sustained rise in (smoothed) latency cuts the rate, so we ease
+    off before FPL starts refusing us.
+
+Throughput therefore settles near the highest rate the API tolerates. The window
+never exceeds FETCH_CONCURRENCY; FETCH_RATE is an optional ceiling on the rate.
+Only ever used from the fetch loop.
+"""
+import asyncio
+import collections
+import random
+import time
+
+MIN_CONCURRENCY = 2
+MIN_RATE = 1.0  # Requests per second
+LATENCY_TOLERANCE = 3.0  # Shrink the window when latency exceeds this multiple of the baseline
+BACKOFF_COOLDOWN = 1.0  # Seconds after a backoff during which further failures don't cut again
+RATE_STEP = 0.25  # Requests/second gained per healthy response while the rate is the bottleneck
+INITIAL_RATE = 20.0  # Requests per second before anything has been learned
+LATENCY_SMOOTHING = 0.1  # Weight of each response in the smoothed latency the rate reacts to
+
+
+class AdaptiveLimiter:
+    def __init__(self, max_concurrency, max_rate=None, initial_concurrency=8, initial_rate=INITIAL_RATE):
+        """max_rate: optional ceiling in requests per second (None or 0 = none)."""
+        self.max_concurrency = max_concurrency
+        self.max_rate = float(max_rate) if max_rate else float('inf')
+        self.limit = float(min(initial_concurrency, max_concurrency))
+        self.rate = min(float(initial_rate), self.max_rate)
+        self.rate_bound = False  # Some request waited for a token since the rate last grew
+        self.in_flight = 0
+        self.slow_start = True
+        self.base_latency = None
+        self.avg_latency = None  # Smoothed latency, and the lowest it has been recently
+        self.base_avg_latency = None
+        self.throttled = 0
+        self.failed = 0
+        self._last_backoff = 0.0
+        self._last_slowdown = 0.0
+        self._tokens = 1.0
+        self._updated = time.monotonic()
+        self._waiters = collections.deque()
+
+    async def acquire(self):
+        """Wait for a free slot in the concurrency window, then for a rate token."""
+        while self.in_flight >= int(self.limit):
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                # We may have been handed a slot just before being cancelled; pass it on.
+                if waiter.done() and not waiter.cancelled():
+                    self._wake()
+                raise
+        self.in_flight += 1
+
+        try:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(max(self.rate, 1.0), self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                self.rate_bound = True
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+        except asyncio.CancelledError:
+            self.in_flight -= 1
+            self._wake()
+            raise
+
+    def release(self, latency=None, throttled=False, failed=False):
+        """
+        Give the slot back and adapt: throttled=True for a 429, failed=True for 5xx/network
+        errors. With no latency or failure (a cancelled request) it only frees the slot.
+        """
+        self.in_flight -= 1
+        if throttled or failed:
+            self.throttled += throttled
+            self.failed += failed
+            now = time.monotonic()
+            if now - self._last_backoff > BACKOFF_COOLDOWN:
+                self._last_backoff = now
+                self.slow_start = False
+                self.limit = max(MIN_CONCURRENCY, self.limit / 2)
+                if throttled:
+                    self.rate = max(MIN_RATE, self.rate / 2)
+        elif latency is not None:
+            self._observe(latency)
+        self._wake()
+
+    def _observe(self, latency):
+        if self.base_latency is None or latency < self.base_latency:
+            self.base_latency = latency
+        else:
+            # Let the baseline drift up slowly so a permanently slower network is accepted.
+            self.base_latency += (latency - self.base_latency) * 0.01
+
+        if latency > self.base_latency * LATENCY_TOLERANCE:
+            self.limit = max(MIN_CONCURRENCY, self.limit * 0.95)
+        elif self.slow_start:
+            self.limit = min(self.max_concurrency, self.limit + 1)
+        else:
+            self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+
+        # The rate follows smoothed latency, so single outliers (or one lucky fast
+        # response setting the baseline) don't move it.
+        if self.avg_latency is None:
+            self.avg_latency = self.base_avg_latency = latency
+        self.avg_latency += (latency - self.avg_latency) * LATENCY_SMOOTHING
+        if self.avg_latency < self.base_avg_latency:
+            self.base_avg_latency = self.avg_latency
+        else:
+            self.base_avg_latency += (self.avg_latency - self.base_avg_latency) * 0.01
+        if self.avg_latency > self.base_avg_latency * LATENCY_TOLERANCE:
+            now = time.monotonic()
+            if now - self._last_slowdown > BACKOFF_COOLDOWN:
+                self._last_slowdown = now
+                self.rate = max(MIN_RATE, self.rate * 0.9)
+        # Only probe upwards while the rate is what holds requests back; otherwise an
+        # idle or window-bound stretch would inflate it into one huge burst later.
+        elif self.rate_bound:
+            self.rate_bound = False
+            self.rate = min(self.max_rate, self.rate + RATE_STEP)
+
+    def _wake(self):
+        free = int(self.limit) - self.in_flight
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+    def stats(self):
+        return {
+            'concurrency_limit': int(self.limit),
+            'rate_limit': round(self.rate, 1),
+            'in_flight': self.in_flight,
+            'throttled_responses': self.throttled,
+            'failed_responses': self.failed,
+        }
+
+
+def backoff_delay(attempt, base=0.5, cap=30.0, retry_after=None):
+    """Full-jitter exponential backoff, never shorter than a Retry-After header asks for."""
+    delay = random.uniform(0, min(cap, base * 2 ** attempt))
+    if retry_after:
+        try:
+            delay = max(delay, float(retry_after))
+        except ValueError:
+            pass
+    return delay
@@ -0,0 +1,60 @@
+"""
+Compact in-memory records for leaderboard rows.
+
+A 50k-manager league means 50k rows alive for the whole request, plus copies
+in snapshots and job batches. A slotted object takes a fraction of the memory
+of an 8-key dict. Rows stay ManagerRow objects all the way through the worker
+and only become dicts at the JSON boundary (Flask responses, NDJSON lines, the
+SQLite snapshot and job tables) via to_dict() / json_default.
+"""
+
+FIELDS = ('manager_name', 'player_name', 'team_id', 'gw_points', 'transfer_cost',
+          'net_points', 'total_points', 'overall_rank')
+
+
+class ManagerRow:
+    __slots__ = FIELDS + ('auto_subs',)
+
+    def __init__(self, manager_name, player_name, team_id, gw_points=0, transfer_cost=0,
+                 total_points=0, overall_rank=None, auto_subs=None):
+        self.manager_name = manager_name
+        self.player_name = player_name
+        self.team_id = team_id
+        self.gw_points = gw_points
+        self.transfer_cost = transfer_cost
+        self.net_points = gw_points - transfer_cost
+        self.total_points = total_points
+        self.overall_rank = overall_rank
+        self.auto_subs = auto_subs
+
+    @classmethod
+    def from_standings(cls, manager, gw_points=0, transfer_cost=0):
+        """Row for a standings entry; the standings dict itself need not be kept."""
+        return cls(manager['entry_name'], manager['player_name'], manager['entry'],
+                   gw_points, transfer_cost, manager['total'], manager['rank'])
+
+    @classmethod
+    def from_dict(cls, row):
+        return cls(row['manager_name'], row['player_name'], row['team_id'], row['gw_points'],
+                   row['transfer_cost'], row['total_points'], row['overall_rank'], row.get('auto_subs'))
+
+    def set_points(self, gw_points, transfer_cost):
+        self.gw_points = gw_points
+        self.transfer_cost = transfer_cost
+        self.net_points = gw_points - transfer_cost
+
+    def to_dict(self):
+        row = {field: getattr(self, field) for field in FIELDS}
+        if self.auto_subs is not None:
+            row['auto_subs'] = self.auto_subs
+        return row
+
+    def __repr__(self):
+        return f"ManagerRow({self.to_dict()!r})"
+
+
+def json_default(obj):
+    """json.dumps(default=...) hook serializing ManagerRow objects."""
+    if isinstance(obj, ManagerRow):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
@@ -0,0 +1,102 @@
+"""
+Head-to-head comparison of a handful of managers in one gameweek.
+
+Everything comes from the same two inputs as live scoring: each manager's picks
+(fixed at the deadline and cached from then on) and the shared live player
+stats (see livestats.py), so a comparison costs one cached picks lookup per
+manager and no league fetch at all.
+
+Each manager's points are split so that the difference between two managers
+adds up exactly:
+  * xi_points: every counting player at 1x, leaving out Bench Boost's bench;
+  * captain_points: the armband's extra 1x (the vice's, if they inherited it);
+  * chip_points: the Bench Boost bench, or Triple Captain's third 1x;
+  * gw_points = xi + captain + chip, net_points = gw_points - transfer_cost.
+Players both managers have in their XI cancel out of the xi difference, so the
+gap in net points is differentials + captaincy + chips - transfer costs.
+"""
+import numpy as np
+
+import livepoints
+
+
+def compare(picks, stats):
+    """
+    Compare every manager in a tiebreak.PicksMatrix against a tiebreak.PlayerStats.
+    The first manager is "you": head_to_head has one entry per other manager.
+    """
+    managers, width = picks.elements.shape
+    index = stats.lookup(picks.elements)
+    points = stats.total_points[index]
+    minutes = stats.minutes[index]
+    multipliers, armband, auto_subs = livepoints.lineup(picks, stats)
+
+    counting = multipliers > 0
+    bench_boost = np.array([chip == 'bboost' for chip in picks.active_chips], dtype=bool)
+    triple_captain = np.array([chip == '3xc' for chip in picks.active_chips], dtype=bool)
+    boosted = counting & bench_boost[:, None] & (np.arange(width) >= livepoints.STARTERS)
+    xi = counting & ~boosted
+
+    xi_points = np.where(xi, points, 0).sum(axis=1, dtype=np.int32)
+    captain_points = np.where(armband, points, 0).sum(axis=1, dtype=np.int32)
+    chip_points = (np.where(boosted, points, 0).sum(axis=1, dtype=np.int32)
+                   + np.where(triple_captain, captain_points, 0))
+    gw_points = xi_points + captain_points + chip_points
+    net_points = gw_points - picks.transfer_costs
+
+    def player(i, j):
+        return {'element': int(picks.elements[i, j]), 'name': stats.names.get(int(picks.elements[i, j])),
+                'points': int(points[i, j])}
+
+    entries = []
+    for i, team_id in enumerate(picks.team_ids):
+        captain = None
+        if armband[i].any():
+            j = int(armband[i].argmax())
+            captain = {**player(i, j), 'multiplier': int(multipliers[i, j]),
+                       'vice_used': bool(picks.vice_captain[i, j])}
+        entries.append({
+            'team_id': team_id,
+            'has_picks': bool(picks.has_picks[i]),
+            'gw_points': int(gw_points[i]),
+            'transfer_cost': int(picks.transfer_costs[i]),
+            'net_points': int(net_points[i]),
+            'active_chip': picks.active_chips[i],
+            'auto_subs': int(auto_subs[i]),
+            'captain': captain,
+            'breakdown': {'xi_points': int(xi_points[i]), 'captain_points': int(captain_points[i]),
+                          'chip_points': int(chip_points[i])},
+        })
+
+    # Players that count for some of the managers with picks but not all of them.
+    with_picks = [i for i in range(managers) if picks.has_picks[i]]
+    picked_by = {}
+    for i in with_picks:
+        for j in np.flatnonzero(counting[i]):
+            element = int(picks.elements[i, j])
+            if element not in picked_by:
+                picked_by[element] = (i, j, {})
+            picked_by[element][2][picks.team_ids[i]] = int(multipliers[i, j])
+    differentials = [
+        {**player(i, j), 'minutes': int(minutes[i, j]), 'picked_by': owners}
+        for i, j, owners in picked_by.values() if len(owners) < len(with_picks)
+    ]
+    differentials.sort(key=lambda d: (-d['points'], d['element']))
+
+    xi_sets = [{int(e): int(points[i, j]) for j, e in enumerate(picks.elements[i]) if xi[i, j]} for i in range(managers)]
+    head_to_head = []
+    for r in range(1, managers):
+        yours = sorted(set(xi_sets[0]) - set(xi_sets[r]))
+        theirs = sorted(set(xi_sets[r]) - set(xi_sets[0]))
+        head_to_head.append({
+            'team_id': picks.team_ids[r],
+            'net_points': int(net_points[0] - net_points[r]),
+            'differentials': int(xi_points[0] - xi_points[r]),
+            'captaincy': int(captain_points[0] - captain_points[r]),
+            'chips': int(chip_points[0] - chip_points[r]),
+            'transfers': int(picks.transfer_costs[r] - picks.transfer_costs[0]),
+            'your_differentials': yours,
+            'their_differentials': theirs,
+        })
+
+    return {'managers': entries, 'differentials': differentials, 'head_to_head': head_to_head}
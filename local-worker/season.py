@@ -0,0 +1,162 @@
+"""
+Season-wide leaderboards from one history fetch per manager.
+
+A manager's /entry/{id}/history/ response already holds every gameweek played
+so far, so a whole range of gameweek tables is one fan-out plus some array
+work: the histories are packed into a manager x gameweek matrix of points and
+transfer costs, and every gameweek is ranked in one vectorized pass.
+"""
+import numpy as np
+
+MISSING = np.iinfo(np.int32).min  # Net points for gameweeks a manager hadn't joined yet
+
+
+def competition_ranks(values):
+    """
+    Rank each column of a 2-D array descending, with ties sharing the best rank
+    ("1224" ranking, like the FPL standings). Returns an int32 array of ranks.
+    """
+    rows = values.shape[0]
+    if rows == 0:
+        return np.zeros(values.shape, dtype=np.int32)
+    order = np.argsort(-values.astype(np.int64), axis=0, kind='stable')
+    ordered = np.take_along_axis(values, order, axis=0)
+
+    # A rank starts wherever the value changes down a column; ties inherit it.
+    position = np.broadcast_to(np.arange(rows)[:, None], values.shape)
+    starts = np.ones(values.shape, dtype=bool)
+    starts[1:] = ordered[1:] != ordered[:-1]
+    ranks_in_order = np.maximum.accumulate(np.where(starts, position, 0), axis=0) + 1
+
+    ranks = np.empty(values.shape, dtype=np.int32)
+    np.put_along_axis(ranks, order, ranks_in_order, axis=0)
+    return ranks
+
+
+class SeasonMatrix:
+    """Points and transfer costs for a league, one row per manager, one column per gameweek."""
+
+    def __init__(self, managers, rows_by_team, gameweeks):
+        """
+        managers: records.ManagerRow per manager; rows_by_team: {team_id: extract.history_range(...)};
+        gameweeks: non-empty sorted list.
+        """
+        self.managers = managers
+        self.gameweeks = list(gameweeks)
+
+        shape = (len(managers), len(self.gameweeks))
+        self.points = np.zeros(shape, dtype=np.int32)
+        self.costs = np.zeros(shape, dtype=np.int32)
+        self.played = np.zeros(shape, dtype=bool)
+        self.fill(rows_by_team)
+
+    def fill(self, rows_by_team):
+        """Set the rows of the managers in rows_by_team ({team_id: extract.history_range(...)})."""
+        column = {gw: i for i, gw in enumerate(self.gameweeks)}
+        for i, manager in enumerate(self.managers):
+            for event, points, cost in rows_by_team.get(manager.team_id) or ():
+                j = column.get(event)
+                if j is not None:
+                    self.points[i, j] = points
+                    self.costs[i, j] = cost
+                    self.played[i, j] = True
+
+    @classmethod
+    def from_arrays(cls, managers, gameweeks, points, costs, played):
+        """A matrix over arrays that already exist, e.g. views of an archive file (see archive.py)."""
+        matrix = cls.__new__(cls)
+        matrix.managers = managers
+        matrix.gameweeks = list(gameweeks)
+        matrix.points, matrix.costs, matrix.played = points, costs, played
+        return matrix
+
+    def reindexed(self, managers):
+        """
+        (matrix, missing): this matrix's points for `managers` (e.g. today's standings,
+        whose names and totals it takes), in their order, and the team_ids it has no
+        row for. Their rows are empty until filled.
+        """
+        position = {manager.team_id: i for i, manager in enumerate(self.managers)}
+        index = np.array([position.get(manager.team_id, -1) for manager in managers], dtype=np.int64)
+        found = index >= 0
+
+        def take(values):
+            out = np.zeros((len(managers), len(self.gameweeks)), dtype=values.dtype)
+            out[found] = values[index[found]]
+            return out
+
+        matrix = SeasonMatrix.from_arrays(managers, self.gameweeks, take(self.points), take(self.costs), take(self.played))
+        return matrix, [manager.team_id for manager, known in zip(managers, found) if not known]
+
+    @property
+    def net(self):
+        return self.points - self.costs
+
+    def ranks(self):
+        """Per-gameweek league rank by net points; 0 where the manager hadn't joined."""
+        ranks = competition_ranks(np.where(self.played, self.net, MISSING))
+        return np.where(self.played, ranks, 0)
+
+    def range_totals(self):
+        return np.where(self.played, self.net, 0).sum(axis=1)
+
+    def best_gameweeks(self):
+        """(gameweek index, net points) of each manager's best gameweek, earliest on ties."""
+        masked = np.where(self.played, self.net, MISSING)
+        best = masked.argmax(axis=1)
+        return best, masked[np.arange(len(self.managers)), best]
+
+    def to_dict(self):
+        """
+        Columnar payload: manager metadata plus manager x gameweek matrices (lists of
+        rows in manager order, null where the manager hadn't joined), per-gameweek
+        summaries and per-manager totals over the range.
+        """
+        played = self.played
+        net = self.net
+        ranks = self.ranks()
+        totals = self.range_totals()
+        range_ranks = competition_ranks(totals[:, None])[:, 0]
+        best_index, best_net = self.best_gameweeks()
+
+        def matrix(values):
+            return [
+                [int(v) if p else None for v, p in zip(row, mask)]
+                for row, mask in zip(values.tolist(), played.tolist())
+            ]
+
+        per_gameweek = []
+        for j, gw in enumerate(self.gameweeks):
+            column = net[played[:, j], j]
+            if column.size == 0:
+                per_gameweek.append({'gameweek': gw, 'managers': 0, 'average_net': None,
+                                     'top_net': None, 'top_team_ids': []})
+                continue
+            top = int(column.max())
+            per_gameweek.append({
+                'gameweek': gw,
+                'managers': int(column.size),
+                'average_net': round(float(column.mean()), 2),
+                'top_net': top,
+                'top_team_ids': [self.managers[i].team_id for i in np.flatnonzero(played[:, j] & (net[:, j] == top))],
+            })
+
+        return {
+            'gameweeks': self.gameweeks,
+            'managers': [{
+                'team_id': m.team_id,
+                'manager_name': m.manager_name,
+                'player_name': m.player_name,
+                'total_points': m.total_points,
+                'overall_rank': m.overall_rank,
+                'range_net_points': int(totals[i]),
+                'range_rank': int(range_ranks[i]),
+                'best_gameweek': self.gameweeks[best_index[i]] if played[i].any() else None,
+                'best_net_points': int(best_net[i]) if played[i].any() else None,
+            } for i, m in enumerate(self.managers)],
+            'gw_points': matrix(self.points),
+            'transfer_cost': matrix(self.costs),
+            'net_points': matrix(net),
+            'gw_rank': matrix(ranks),
+            'per_gameweek': per_gameweek,
+        }
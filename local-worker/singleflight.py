@@ -0,0 +1,47 @@
+"""
+Request coalescing for the worker.
+
+When several users hit "Fetch" for the same league and gameweek at once, only the
+first request does the work; the others wait on it and get the same result.
+Coalescing is per process (each gunicorn worker has its own table).
+"""
+import threading
+from concurrent.futures import Future
+
+_inflight = {}
+_lock = threading.Lock()
+
+
+def do(key, fn, *args):
+    """
+    Call fn(*args) unless a call with the same key is already running, in which
+    case wait for that call and return its result (or re-raise its exception).
+    Results are shared between callers, so they must be treated as read-only.
+    """
+    with _lock:
+        future = _inflight.get(key)
+        leader = future is None
+        if leader:
+            future = Future()
+            _inflight[key] = future
+
+    if not leader:
+        print(f"Joining in-flight computation for {key}")
+        return future.result()
+
+    try:
+        result = fn(*args)
+        future.set_result(result)
+        return result
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _lock:
+            _inflight.pop(key, None)
+
+
+def in_flight():
+    """Number of distinct computations currently running."""
+    with _lock:
+        return len(_inflight)
@@ -0,0 +1,114 @@
+"""Archive files read back as written, by the worker and by the UI proxy's standard-library reader."""
+import importlib.util
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+import archive  # noqa: E402
+import ranking  # noqa: E402
+import season  # noqa: E402
+from records import ManagerRow  # noqa: E402
+
+_spec = importlib.util.spec_from_file_location('ui_archive', os.path.join(HERE, '..', '..', 'archive.py'))
+ui_archive = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(ui_archive)
+
+
+def use_temp_dir():
+    archive.ARCHIVE_DIR = ui_archive.ARCHIVE_DIR = tempfile.mkdtemp(prefix='fpl-archive-test-')
+
+
+def league_index():
+    rows = [
+        ManagerRow('Ünïcode FC', 'Zoë', 11, 70, 4, 900, 3),
+        ManagerRow('Second', 'B', 12, 66, 0, 950, 1),
+        ManagerRow('Third', 'C', 13, 50, 0, 800, None),
+        ManagerRow('Fourth', 'D', 14, 66, 0, 820, 4),
+    ]
+    rows.sort(key=lambda row: row.net_points, reverse=True)
+    return ranking.RankingIndex(5, 12, rows, final=True)
+
+
+def test_leaderboard_round_trip():
+    use_temp_dir()
+    index = league_index()
+    archive.save_leaderboard(index)
+
+    archived = archive.leaderboard(5, 12)
+    assert [row.to_dict() for row in archived.manager_rows()] == [row.to_dict() for row in index.rows]
+    for field in ranking.SORT_FIELDS:
+        assert archived.page(field, 1, 3) == index.page(field, 1, 3)
+        assert archived.page(field, 2, 3) == index.page(field, 2, 3)
+    assert archived.rank_of(13, 2) == index.rank_of(13, 2)
+    assert archived.rank_of(99) is None
+
+
+def test_ui_reader_matches_the_worker():
+    use_temp_dir()
+    index = league_index()
+    archive.save_leaderboard(index)
+
+    archived = ui_archive.leaderboard(5, 12)
+    assert archived.entries(range(len(index))) == [row.to_dict() for row in index.rows]
+    for field in ui_archive.SORT_FIELDS:
+        result = archived.rankings(field, 1, 3)
+        assert result['rows'] == index.page(field, 1, 3)
+        assert (result['pages'], result['total_managers'], result['archived']) == (2, 4, True)
+    found = archived.rankings('gw_points', 1, 2, team_id=13, explicit_page=False)
+    assert found['team'] == index.rank_of(13, 2) and found['page'] == 2
+    assert ui_archive.leaderboard(5, 13) is None
+
+
+def season_matrix(gameweeks):
+    managers = [ManagerRow('A', 'a', 1, total_points=300), ManagerRow('B', 'b', 2, total_points=280, overall_rank=7)]
+    histories = {
+        1: [(gw, 50 + gw, 4 if gw % 3 == 0 else 0) for gw in gameweeks],
+        2: [(gw, 40 + gw, 0) for gw in gameweeks if gw > gameweeks[0]],  # Joined a week late
+    }
+    return season.SeasonMatrix(managers, histories, gameweeks)
+
+
+def test_season_round_trip_and_ranges_kept_side_by_side():
+    use_temp_dir()
+    early, late = season_matrix(range(1, 11)), season_matrix(range(5, 20))
+    assert archive.save_season(5, early)
+    assert archive.save_season(5, late)  # Doesn't replace 1-10
+    assert archive.save_season(5, season_matrix(range(2, 8))) is None  # Covered by 1-10
+    assert sorted(os.listdir(archive.ARCHIVE_DIR)) == ['season-5-gw1-10.fplarc', 'season-5-gw5-19.fplarc']
+
+    read = archive.season_matrix(5, 1, 10)
+    for name in ('points', 'costs', 'played'):
+        assert np.array_equal(getattr(read, name), getattr(early, name))
+    assert [m.to_dict() for m in read.managers] == [m.to_dict() for m in early.managers]
+    assert read.to_dict() == early.to_dict()
+
+    narrow = archive.season_matrix(5, 6, 9)  # Both files cover 6-9; 1-10 is the narrower one
+    assert narrow.gameweeks == [6, 7, 8, 9] and np.array_equal(narrow.points, early.points[:, 5:9])
+    assert np.array_equal(archive.season_matrix(5, 12, 19).costs, late.costs[:, 7:])
+    assert archive.season_matrix(5, 1, 19) is None
+
+
+def test_archived_points_follow_todays_standings():
+    use_temp_dir()
+    archive.save_leaderboard(league_index())
+    assert archive.leaderboard(5, 12).points_by_team() == {11: (70, 4), 12: (66, 0), 13: (50, 0), 14: (66, 0)}
+
+    built = season_matrix(range(1, 6))
+    archive.save_season(5, built)
+    # Today: B's total moved on, A left the league and C joined.
+    today = [ManagerRow('B', 'b', 2, total_points=350), ManagerRow('C', 'c', 3, total_points=10)]
+    matrix, missing = archive.season_matrix(5, 1, 5).reindexed(today)
+    assert missing == [3]
+    assert [m.total_points for m in matrix.managers] == [350, 10]
+    assert np.array_equal(matrix.points[0], built.points[1]) and not matrix.played[1].any()
+
+    matrix.fill({3: [(4, 61, 0), (5, 62, 4)]})
+    assert matrix.points[1].tolist() == [0, 0, 0, 61, 62] and matrix.costs[1, 4] == 4
+    assert archive.save_season(5, matrix) is None
+    assert archive.save_season(5, matrix, replace=True)
+    assert [m.team_id for m in archive.season_matrix(5, 1, 5).managers] == [2, 3]
@@ -0,0 +1,62 @@
+"""Cache reads and writes happen off the fetch loop but stay consistent."""
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cache  # noqa: E402
+
+cache.CACHE_PATH = os.path.join(tempfile.mkdtemp(prefix='fpl-cache-test-'), 'cache.sqlite3')
+
+
+def test_queued_writes_are_visible_before_they_land():
+    for i in range(50):
+        cache.put(f'u{i}', f'body{i}'.encode(), ttl=60)
+    assert cache.get('u7') == b'body7'  # Before or after the writer got to it
+
+    cache.flush()
+    rows = sqlite3.connect(cache.CACHE_PATH).execute("SELECT COUNT(*) FROM responses WHERE url LIKE 'u%'").fetchone()
+    assert rows[0] == 50
+
+    cache.delete('u7')
+    assert cache.get('u7') is None
+    cache.flush()
+    assert cache.get('u7') is None
+
+
+def test_async_reads_match_sync_ones():
+    for i in range(20):
+        cache.put(f'a{i}', b'x', ttl=60)
+    cache.put('expired', b'x', ttl=-1)
+    cache.flush()
+
+    async def read_all():
+        return await asyncio.gather(*(cache.get_async(f'a{i}') for i in range(20)),
+                                    cache.get_async('expired'), cache.get_async('expired', valid_after=0),
+                                    cache.get_async('missing'))
+
+    *bodies, expired, permanent, missing = asyncio.run(read_all())
+    assert bodies == [b'x'] * 20
+    assert (expired, permanent, missing) == (None, b'x', None)
+
+
+def test_snapshots_and_league_pages_are_written_by_the_writer_thread():
+    rows = [{'team_id': i, 'gw_points': i} for i in range(3)]
+    cache.save_snapshot(7, 12, ((['sig', row['team_id']], row) for row in rows))
+    cache.save_league_pages(7, 4)
+    cache.save_snapshot(8, 12, [(['bad'], {'team_id': 1, 'oops': object()})])  # Unencodable: dropped alone
+    cache.flush()
+
+    async def read_back():
+        return (await cache.load_snapshot_async(7, 12), await cache.league_pages_async(7),
+                await cache.load_snapshot_async(8, 12), await cache.final_at_async(12))
+
+    snapshot, pages, dropped, final_at = asyncio.run(read_back())
+    assert snapshot[2] == {'sig': ['sig', 2], 'row': {'team_id': 2, 'gw_points': 2}}
+    assert (pages, dropped, final_at) == (4, {}, None)
+
+    marked = asyncio.run(cache.mark_final_async(12))
+    assert asyncio.run(cache.final_at_async(12)) == marked == cache.final_at(12)
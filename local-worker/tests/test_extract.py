@@ -0,0 +1,50 @@
+"""fetch_parsed_async answers the same with the parse pool on (PARSE_PROCESSES=1) as inline."""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+WORKER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Run in a fresh interpreter: the pool is forked when worker.py is imported, before any thread starts.
+SCRIPT = '''
+import asyncio, json
+import cache, extract, fetcher, worker
+
+history = {'current': [{'event': gw, 'points': 40 + gw, 'event_transfers_cost': 4 * (gw % 2)} for gw in range(1, 6)]}
+for team_id in range(1, 201):
+    cache.put(worker.manager_history_url(team_id), json.dumps(history).encode(), 60)
+
+async def scenario():
+    points = await asyncio.gather(*(
+        worker.fetch_parsed_async(worker.manager_history_url(team_id), extract.history_points, 3, ttl=60)
+        for team_id in range(1, 201)
+    ))
+    rows = await worker.fetch_parsed_async(worker.manager_history_url(7), extract.history_range, 2, 4, ttl=60)
+    try:
+        await extract.run(extract.history_points, b'{not json', 3)
+        corrupt = None
+    except ValueError as e:
+        corrupt = type(e).__name__
+    return {'points': [list(p) for p in set(points)], 'rows': [list(r) for r in rows], 'corrupt': corrupt,
+            'stats': extract.stats()}
+
+print(json.dumps(fetcher.run(scenario())))
+'''
+
+
+def test_fetch_parsed_async_through_the_parse_pool():
+    env = {**os.environ, 'PARSE_PROCESSES': '1', 'PREFETCH': '0',
+           'FPL_CACHE_PATH': os.path.join(tempfile.mkdtemp(prefix='fpl-extract-test-'), 'cache.sqlite3')}
+    done = subprocess.run([sys.executable, '-c', SCRIPT], cwd=WORKER_DIR, env=env,
+                          capture_output=True, text=True, timeout=120)
+    assert done.returncode == 0, done.stderr
+    result = json.loads(done.stdout.strip().splitlines()[-1])
+
+    assert result['points'] == [[43, 4]]
+    assert result['rows'] == [[2, 42, 0], [3, 43, 4], [4, 44, 0]]
+    assert result['corrupt'] is not None  # A decode error in the pool reaches the caller
+    stats = result['stats']
+    assert stats['processes'] == 1 and stats['items'] == 202
+    assert 1 <= stats['batches'] < 202  # Shipped to the pool in batches, not one by one
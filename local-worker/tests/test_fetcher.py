@@ -0,0 +1,77 @@
+"""Cancelled fetches must give their limiter slot back."""
+import asyncio
+import os
+import sys
+
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fetcher  # noqa: E402
+from ratelimit import AdaptiveLimiter  # noqa: E402
+
+
+async def _slow_headers(request):
+    await asyncio.sleep(2)
+    return web.Response(body=b'{}')
+
+
+async def _slow_body(request):
+    response = web.StreamResponse()
+    await response.prepare(request)
+    await response.write(b'{')
+    await asyncio.sleep(2)
+    return response
+
+
+async def _cancel_mid_request(path):
+    app = web.Application()
+    app.router.add_get('/headers', _slow_headers)
+    app.router.add_get('/body', _slow_body)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    fetcher._session = None  # A session on this test's loop
+    try:
+        tasks = [asyncio.ensure_future(fetcher.get_bytes(f'http://127.0.0.1:{port}{path}')) for _ in range(3)]
+        await asyncio.sleep(0.3)
+        assert fetcher._limiter.in_flight == 3
+        limit, rate = fetcher._limiter.limit, fetcher._limiter.rate
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        assert fetcher._limiter.in_flight == 0
+        assert (fetcher._limiter.limit, fetcher._limiter.rate) == (limit, rate)  # No AIMD step
+    finally:
+        await fetcher._session.close()
+        fetcher._session = None
+        await runner.cleanup()
+
+
+def test_cancel_while_waiting_for_headers():
+    asyncio.run(_cancel_mid_request('/headers'))
+
+
+def test_cancel_while_reading_body():
+    asyncio.run(_cancel_mid_request('/body'))
+
+
+def test_cancel_while_waiting_for_rate_token():
+    async def scenario():
+        limiter = AdaptiveLimiter(max_concurrency=4, max_rate=1, initial_concurrency=1)
+        await limiter.acquire()  # Takes the only token and the only slot
+        queued = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0.05)
+        limiter.release()
+        await asyncio.sleep(0.05)
+        assert limiter.in_flight == 1  # queued has the slot and is waiting for a token
+        queued.cancel()
+        await asyncio.gather(queued, return_exceptions=True)
+        assert limiter.in_flight == 0
+        await asyncio.wait_for(limiter.acquire(), 2)  # The slot is usable again
+        assert limiter.in_flight == 1
+
+    asyncio.run(scenario())
@@ -0,0 +1,89 @@
+"""Jobs move queued -> running -> completed/failed, and polls page their rows with `since`."""
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('FPL_CACHE_PATH', os.path.join(tempfile.mkdtemp(prefix='fpl-jobs-test-'), 'cache.sqlite3'))
+
+import jobs  # noqa: E402
+
+
+def wait_for(job_id, status):
+    for _ in range(200):
+        job = jobs.describe(job_id)
+        if job['status'] == status:
+            return job
+        time.sleep(0.025)
+    raise AssertionError(f"job {job_id} stuck in {jobs.describe(job_id)['status']}")
+
+
+def test_job_states_and_since_paging():
+    first_batch, release = threading.Event(), threading.Event()
+
+    def runner(job):
+        jobs.add_rows(job['id'], [{'team_id': 1}, {'team_id': 2}], 2, 3)
+        first_batch.set()
+        release.wait(5)
+        jobs.add_rows(job['id'], [{'team_id': 3}], 3, 3)
+        return [1, 2, 3], None
+
+    jobs.configure(runner)
+    job_id, created = jobs.submit(901, 12)
+    assert created and jobs.submit(901, 12) == (job_id, False)
+    assert jobs.submit(901, 12, shard=(1, 2))[1]  # Another shard is another job
+
+    assert first_batch.wait(5)
+    poll = wait_for(job_id, 'running')
+    assert (poll['rows'], poll['received'], poll['seen']) == ([{'team_id': 1}, {'team_id': 2}], 2, 3)
+    assert jobs.describe(job_id, since=poll['next'])['rows'] == []  # Nothing new yet
+
+    release.set()
+    done = wait_for(job_id, 'completed')
+    assert done['total_managers'] == 3 and done['error'] is None
+    assert jobs.describe(job_id, since=poll['next'])['rows'] == [{'team_id': 3}]
+    assert [row['team_id'] for row in done['rows']] == [1, 2, 3]
+    assert jobs.submit(901, 12) == (job_id, False)  # Finished recently: reused
+    assert jobs.describe('no-such-job') is None
+
+
+def test_failed_jobs_report_why_and_are_not_reused():
+    def runner(job):
+        if job['league_id'] == 902:
+            return None, 'Failed to fetch league data'
+        raise RuntimeError('boom')
+
+    jobs.configure(runner)
+    failed, _ = jobs.submit(902, 12)
+    crashed, _ = jobs.submit(903, 12)
+    assert wait_for(failed, 'failed')['error'] == 'Failed to fetch league data'
+    assert wait_for(crashed, 'failed')['error'] == 'boom'
+    assert jobs.submit(902, 12)[0] != failed
+
+
+def test_full_queue_refuses_new_jobs():
+    release = threading.Event()
+    jobs.configure(lambda job: (release.wait(5), ([], None))[1])
+    queue_size = jobs.QUEUE_SIZE
+    jobs.QUEUE_SIZE = 1
+    try:
+        running = [jobs.submit(910 + i, 12)[0] for i in range(len(jobs._runner_threads))]
+        for job_id in running:
+            wait_for(job_id, 'running')
+        queued, _ = jobs.submit(920, 12)
+        assert jobs.describe(queued)['status'] == 'queued'
+        try:
+            jobs.submit(921, 12)
+            raise AssertionError('queue should be full')
+        except jobs.QueueFull:
+            pass
+        release.set()
+        for job_id in running + [queued]:
+            wait_for(job_id, 'completed')
+        assert jobs.active() == 0
+    finally:
+        jobs.QUEUE_SIZE = queue_size
+        release.set()
@@ -0,0 +1,94 @@
+"""Live scoring applies FPL's auto-sub, captaincy and chip rules."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import livepoints  # noqa: E402
+from livepoints import DEFENDER, FORWARD, GOALKEEPER, MIDFIELDER  # noqa: E402
+from tiebreak import PicksMatrix, PlayerStats  # noqa: E402
+
+G, D, M, F = GOALKEEPER, DEFENDER, MIDFIELDER, FORWARD
+FOUR_FOUR_TWO = [G, D, D, D, D, M, M, M, M, F, F] + [G, D, M, F]
+
+
+def picks(types=FOUR_FOUR_TWO, captain=6, vice=7, chip=None, cost=0):
+    """One manager's picks: player n (1-15) in squad position n, each on their own team n."""
+    return {
+        'active_chip': chip,
+        'entry_history': {'event_transfers_cost': cost},
+        'picks': [{'element': n, 'position': n, 'element_type': t, 'multiplier': 1 if n <= 11 else 0,
+                   'is_captain': n == captain, 'is_vice_captain': n == vice}
+                  for n, t in enumerate(types, start=1)],
+    }
+
+
+def stats(types=FOUR_FOUR_TWO, benched=(), pending=(), double=()):
+    """Player n plays and scores n points unless benched; teams in pending still have a fixture to play."""
+    live = {'elements': [{'id': n, 'stats': {'total_points': 0, 'minutes': 0} if n in benched
+                          else {'total_points': n, 'minutes': 90}} for n in range(1, 16)]}
+    bootstrap = {'elements': [{'id': n, 'element_type': t, 'team': n} for n, t in enumerate(types, start=1)]}
+    fixtures = [{'team_h': n, 'team_a': 100 + n, 'finished': n not in pending} for n in range(1, 16)]
+    fixtures += [{'team_h': n, 'team_a': 200 + n, 'finished': False} for n in double]  # Second fixture, not played yet
+    return PlayerStats(live, bootstrap, fixtures)
+
+
+def counting(squad, player_stats):
+    """{player: multiplier} of the players who count, and the number of auto-subs."""
+    multipliers, _, auto_subs = livepoints.lineup(PicksMatrix({1: squad}), player_stats)
+    return {n: int(m) for n, m in enumerate(multipliers[0], start=1) if m}, int(auto_subs[0])
+
+
+def test_absent_starter_is_replaced_by_the_first_bench_player_who_played():
+    # 8 didn't play; bench: 12 is a goalkeeper, 13 didn't play either, so 14 comes on.
+    lineup, subs = counting(picks(), stats(benched=(8, 13)))
+    assert subs == 1
+    assert sorted(lineup) == [1, 2, 3, 4, 5, 6, 7, 9, 10, 11, 14]
+    assert lineup[6] == 2
+
+    result = livepoints.score(PicksMatrix({1: picks(cost=4)}), stats(benched=(8, 13)))
+    assert int(result['gw_points'][0]) == sum(lineup) + 6 and int(result['net_points'][0]) == sum(lineup) + 2
+
+
+def test_goalkeepers_only_replace_goalkeepers():
+    lineup, subs = counting(picks(), stats(benched=(1,)))
+    assert subs == 1 and 12 in lineup and 1 not in lineup
+
+    lineup, subs = counting(picks(), stats(benched=(2, 13, 14, 15)))  # Only the bench goalkeeper played
+    assert subs == 0 and 12 not in lineup
+
+
+def test_subs_keep_three_defenders_and_a_forward():
+    three_five_two = [G, D, D, D, M, M, M, M, M, F, F] + [G, M, D, F]
+    lineup, _ = counting(picks(three_five_two), stats(three_five_two, benched=(2,)))
+    assert 13 not in lineup and 14 in lineup  # 13 would leave two defenders
+
+    four_five_one = [G, D, D, D, D, M, M, M, M, M, F] + [G, D, M, F]
+    lineup, _ = counting(picks(four_five_one), stats(four_five_one, benched=(11,)))
+    assert 13 not in lineup and 14 not in lineup and 15 in lineup
+
+    lineup, subs = counting(picks(four_five_one), stats(four_five_one, benched=(11, 15)))
+    assert subs == 0 and 11 in lineup and 13 not in lineup  # No forward on the bench played: 11 stays, on 0
+
+
+def test_vice_captain_is_doubled_when_the_captain_is_absent():
+    lineup, _ = counting(picks(captain=6, vice=7), stats(benched=(6,)))
+    assert lineup[7] == 2 and 6 not in lineup
+
+    lineup, _ = counting(picks(captain=6, vice=7), stats(benched=(6,), pending=(6,)))  # Might still play
+    assert lineup[6] == 2 and lineup[7] == 1
+
+
+def test_triple_captain_and_bench_boost():
+    lineup, _ = counting(picks(chip='3xc'), stats())
+    assert lineup[6] == 3
+
+    lineup, subs = counting(picks(chip='bboost'), stats(benched=(8,)))
+    assert subs == 0 and sorted(lineup) == list(range(1, 16)) and lineup[6] == 2
+    result = livepoints.score(PicksMatrix({1: picks(chip='bboost')}), stats(benched=(8,)))
+    assert int(result['gw_points'][0]) == sum(range(1, 16)) - 8 + 6
+
+
+def test_no_sub_while_a_double_gameweek_fixture_is_still_to_play():
+    lineup, subs = counting(picks(), stats(benched=(8,), double=(8,)))
+    assert subs == 0 and 8 in lineup and 14 not in lineup
@@ -0,0 +1,65 @@
+"""A live gameweek's stats are reloaded once they are older than LIVE_REFRESH, even with no refresher running."""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import livestats  # noqa: E402
+from tiebreak import PlayerStats  # noqa: E402
+
+
+def stats_with(points):
+    return PlayerStats({'elements': [{'id': 1, 'stats': {'total_points': points}}]})
+
+
+def test_stale_live_entry_is_reloaded_once_for_concurrent_callers():
+    calls = []
+    upstream = {'points': 2, 'final': False}
+
+    async def loader(gameweek):
+        calls.append(gameweek)
+        await asyncio.sleep(0.01)
+        return stats_with(upstream['points']), upstream['final']
+
+    livestats.configure(loader)
+
+    async def scenario():
+        first = await livestats.get_async(30)
+        assert await livestats.get_async(30) is first  # Fresh: served as-is
+        assert len(calls) == 1
+
+        # The worker sat idle past LIVE_REFRESH and the gameweek finished meanwhile.
+        first.fetched_at = time.time() - livestats.LIVE_REFRESH - 1
+        upstream.update(points=9, final=True)
+        reloaded = await asyncio.gather(*(livestats.get_async(30) for _ in range(5)))
+        for task in list(livestats._refreshers.values()):
+            task.cancel()
+        return first, reloaded
+
+    first, reloaded = asyncio.run(scenario())
+    assert len(calls) == 2
+    assert all(entry is reloaded[0] for entry in reloaded)
+    assert reloaded[0].final and reloaded[0].version != first.version
+    assert int(reloaded[0].stats.total_points[1]) == 9
+
+
+def test_failed_reload_serves_the_last_good_stats():
+    async def loader(gameweek):
+        if livestats.peek(gameweek) is None:
+            return stats_with(4), False
+        raise OSError('upstream down')
+
+    livestats.configure(loader)
+
+    async def scenario():
+        entry = await livestats.get_async(31)
+        entry.fetched_at = time.time() - livestats.LIVE_REFRESH - 1
+        again = await livestats.get_async(31)
+        for task in list(livestats._refreshers.values()):
+            task.cancel()
+        return entry, again
+
+    entry, again = asyncio.run(scenario())
+    assert again is entry and not again.final
@@ -0,0 +1,76 @@
+"""Recorded timings, upstream calls and cache lookups add up in both the summary and /metrics."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import metrics  # noqa: E402
+
+HISTORY = 'https://fantasy.premierleague.com/api/entry/42/history/'
+STANDINGS = 'https://fantasy.premierleague.com/api/leagues-classic/7/standings/?page_standings=2'
+
+
+def record():
+    """A small made-up workload; clears whatever earlier tests recorded first."""
+    metrics._counters.clear()
+    metrics._histograms.clear()
+    for seconds in (0.2, 0.2, 0.4, 3.0):
+        metrics.observe('fpl_stage_seconds', seconds, build='leaderboard', stage='fan_out')
+    with metrics.stage('leaderboard', 'pagination'):
+        pass
+    for status, latency in ((200, 0.02), (200, 0.04), (429, 0.3), (None, 1.5)):
+        metrics.observe_upstream(HISTORY, status, latency)
+    metrics.observe_upstream(STANDINGS, 200, 0.08)
+    metrics.inc('fpl_cache_lookups_total', endpoint='history', result='hit')
+    metrics.inc('fpl_cache_lookups_total', 3, endpoint='history', result='miss')
+    metrics.inc('fpl_ranking_lookups_total', result='hit')
+
+
+def test_histogram_quantiles_are_bucket_bounds():
+    histogram = metrics.Histogram((1, 2, 5))
+    assert histogram.quantile(0.5) is None
+    for value in (0.5, 1.5, 1.5, 4, 9):
+        histogram.observe(value)
+    assert histogram.counts == [1, 2, 1] and histogram.count == 5 and histogram.sum == 16.5
+    assert (histogram.quantile(0.5), histogram.quantile(0.8), histogram.quantile(0.95)) == (2, 5, None)
+    assert metrics.endpoint_of(HISTORY) == 'history' and metrics.endpoint_of('https://example.com/') == 'other'
+
+
+def test_summary():
+    record()
+    summary = metrics.summary()
+
+    fan_out = summary['stages']['leaderboard.fan_out']
+    assert fan_out == {'count': 4, 'mean': 0.95, 'p50': 0.25, 'p95': 5}
+    assert summary['stages']['leaderboard.pagination']['count'] == 1
+
+    history = summary['upstream']['history']
+    assert (history['count'], history['errors'], history['p50']) == (4, 2, 0.05)  # The 429 and the network error
+    assert summary['upstream']['standings']['errors'] == 0
+
+    assert summary['cache']['history'] == {'hit': 1, 'miss': 3, 'hit_ratio': 0.25}
+    assert summary['cache']['rankings'] == {'hit': 1, 'miss': 0, 'hit_ratio': 1.0}
+
+
+def test_exposition():
+    record()
+    metrics.collect('fpl_test_in_flight', 'gauge', 'Made up for the test', lambda: 7)
+    metrics.collect('fpl_test_broken', 'gauge', 'Raises when read', lambda: 1 / 0)
+    try:
+        lines = metrics.exposition().splitlines()
+    finally:
+        del metrics._collected['fpl_test_in_flight'], metrics._collected['fpl_test_broken']
+
+    assert lines.count('# TYPE fpl_stage_seconds histogram') == 1
+    assert 'fpl_upstream_requests_total{endpoint="history",status="error"} 1' in lines
+    assert 'fpl_upstream_requests_total{endpoint="history",status="429"} 1' in lines
+    assert 'fpl_cache_lookups_total{endpoint="history",result="miss"} 3' in lines
+
+    labels = 'build="leaderboard",stage="fan_out"'
+    assert f'fpl_stage_seconds_bucket{{{labels},le="0.25"}} 2' in lines  # Cumulative
+    assert f'fpl_stage_seconds_bucket{{{labels},le="2.5"}} 3' in lines
+    assert f'fpl_stage_seconds_bucket{{{labels},le="+Inf"}} 4' in lines
+    assert f'fpl_stage_seconds_count{{{labels}}} 4' in lines
+
+    assert 'fpl_test_in_flight 7' in lines
+    assert not any(line.startswith('fpl_test_broken') for line in lines)  # Skipped, not fatal
@@ -0,0 +1,34 @@
+"""Tiebroken pages rank by the whole cascade, sharing a rank only when every field is level."""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ranking  # noqa: E402
+from records import ManagerRow  # noqa: E402
+
+
+def test_tiebreak_pages_follow_the_cascade():
+    rows = [ManagerRow(f'Team {i}', f'Player {i}', i, 60, 0, 500, None) for i in range(1, 6)]
+    rows.append(ManagerRow('Team 6', 'Player 6', 6, 70, 4, 500, None))  # 66 net, alone on top
+    index = ranking.put(1, 12, rows, final=True)
+    fields = {
+        1: {'no_chip_bonus': 1, 'starters_goals': 1, 'captain_points': 2},
+        2: {'no_chip_bonus': 1, 'starters_goals': 3, 'captain_points': 2},
+        3: {'no_chip_bonus': 0, 'starters_goals': 9, 'captain_points': 9, 'active_chip': 'bboost'},
+        4: {'no_chip_bonus': 1, 'starters_goals': 1, 'captain_points': 2},
+        # 5 has no picks: default fields
+    }
+    fields = {team_id: {'starters_assists': 0, 'vice_captain_points': 0, **f} for team_id, f in fields.items()}
+    tiebroken = ranking.put_tiebreak(index, fields)
+
+    page = tiebroken.page(1, 4)
+    assert [(row['team_id'], row['rank'], row['tied']) for row in page] == [(6, 1, 1), (2, 2, 1), (1, 3, 2), (4, 3, 2)]
+    assert [row['team_id'] for row in tiebroken.page(2, 4)] == [5, 3]
+    assert tiebroken.page(2, 4)[1]['active_chip'] == 'bboost'
+    assert tiebroken.rank_of(3, page_size=4) == {'rank': 6, 'tied': 1, 'position': 6, 'page': 2}
+
+    assert ranking.get_tiebreak(index) is tiebroken
+    time.sleep(0.05)
+    assert ranking.get_tiebreak(ranking.put(1, 12, rows, final=True)) is None  # Rebuilt leaderboard
@@ -0,0 +1,71 @@
+"""Head-to-head breakdowns add up: net gap = differentials + captaincy + chips + transfers."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rivals  # noqa: E402
+from livepoints import DEFENDER, FORWARD, GOALKEEPER, MIDFIELDER  # noqa: E402
+from tiebreak import PicksMatrix, PlayerStats  # noqa: E402
+
+G, D, M, F = GOALKEEPER, DEFENDER, MIDFIELDER, FORWARD
+TYPES = {1: G, 2: D, 3: D, 4: D, 5: D, 6: M, 7: M, 8: M, 9: M, 10: F, 11: F,
+         12: G, 13: D, 14: M, 15: F, 17: M, 18: F, 20: G}
+YOU = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15]
+RIVAL = [1, 2, 3, 4, 5, 6, 7, 8, 17, 10, 18, 20, 13, 14, 15]  # 9 and 11 swapped for 17 and 18
+
+
+def picks(squad, captain, vice, chip=None, cost=0):
+    return {
+        'active_chip': chip,
+        'entry_history': {'event_transfers_cost': cost},
+        'picks': [{'element': e, 'position': n, 'element_type': TYPES[e], 'multiplier': 1 if n <= 11 else 0,
+                   'is_captain': e == captain, 'is_vice_captain': e == vice}
+                  for n, e in enumerate(squad, start=1)],
+    }
+
+
+def stats():
+    """Everyone plays and player n scores n points."""
+    live = {'elements': [{'id': e, 'stats': {'total_points': e, 'minutes': 90}} for e in TYPES]}
+    bootstrap = {'elements': [{'id': e, 'element_type': t, 'team': e, 'web_name': f'P{e}'} for e, t in TYPES.items()]}
+    return PlayerStats(live, bootstrap, [{'team_h': e, 'team_a': 100 + e, 'finished': True} for e in TYPES])
+
+
+def compare(you, rival):
+    return rivals.compare(PicksMatrix({1: you, 2: rival}), stats())
+
+
+def test_shared_players_cancel_and_differentials_decide():
+    # Both own 6 and 7; you captain 6, your rival captains 7.
+    result = compare(picks(YOU, captain=6, vice=7), picks(RIVAL, captain=7, vice=6))
+    you, rival = result['managers']
+    assert (you['gw_points'], rival['gw_points']) == (66 + 6, 81 + 7)
+    assert you['captain']['element'] == 6 and rival['captain']['element'] == 7
+
+    h2h, = result['head_to_head']
+    assert (h2h['your_differentials'], h2h['their_differentials']) == ([9, 11], [17, 18])
+    assert (h2h['differentials'], h2h['captaincy'], h2h['chips'], h2h['transfers']) == (-15, -1, 0, 0)
+    assert h2h['net_points'] == you['net_points'] - rival['net_points'] == -16
+
+    # The shared captaincy pick is no differential; only players one side fields are.
+    assert [d['element'] for d in result['differentials']] == [18, 17, 11, 9]
+    assert result['differentials'][0]['picked_by'] == {2: 1}
+
+
+def test_chip_and_hit_on_one_side():
+    result = compare(picks(YOU, captain=6, vice=7), picks(RIVAL, captain=7, vice=6, chip='bboost', cost=4))
+    you, rival = result['managers']
+    assert rival['breakdown'] == {'xi_points': 81, 'captain_points': 7, 'chip_points': 20 + 13 + 14 + 15}
+    assert rival['net_points'] == 81 + 7 + 62 - 4
+
+    h2h, = result['head_to_head']
+    assert (h2h['differentials'], h2h['captaincy'], h2h['chips'], h2h['transfers']) == (-15, -1, -62, 4)
+    assert h2h['net_points'] == h2h['differentials'] + h2h['captaincy'] + h2h['chips'] + h2h['transfers'] == -74
+    # The boosted bench isn't part of the XI comparison, but it is what separates you.
+    assert h2h['their_differentials'] == [17, 18]
+    assert {13, 14, 15, 20} <= {d['element'] for d in result['differentials']}
+
+    result = compare(picks(YOU, captain=6, vice=7, chip='3xc'), picks(RIVAL, captain=7, vice=6))
+    assert result['managers'][0]['breakdown'] == {'xi_points': 66, 'captain_points': 6, 'chip_points': 6}
+    assert result['head_to_head'][0]['chips'] == 6
@@ -0,0 +1,36 @@
+"""Season tables rank like the FPL standings and total up like the entry histories."""
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import season  # noqa: E402
+from records import ManagerRow  # noqa: E402
+
+
+def test_competition_ranks_share_the_best_rank():
+    values = np.array([[70, 5], [80, 5], [70, 5], [60, 9]])
+    assert season.competition_ranks(values).tolist() == [[2, 2], [1, 2], [2, 2], [4, 1]]
+    assert season.competition_ranks(np.array([[9], [7], [7], [3]]))[:, 0].tolist() == [1, 2, 2, 4]  # "1224"
+    assert season.competition_ranks(np.zeros((0, 3), dtype=np.int32)).shape == (0, 3)
+
+
+def test_totals_are_points_minus_transfer_costs():
+    managers = [ManagerRow('A', 'a', 1), ManagerRow('B', 'b', 2), ManagerRow('C', 'c', 3)]
+    histories = {
+        1: [(3, 60, 4), (4, 50, 0), (5, 71, 8), (6, 40, 0)],
+        2: [(4, 66, 0), (5, 59, 4)],  # Joined in gameweek 4
+        3: [(3, 56, 0), (4, 54, 4), (5, 59, 0)],
+    }
+    matrix = season.SeasonMatrix(managers, histories, range(3, 6))  # GW6 is outside the range
+    table = matrix.to_dict()
+
+    for i, team_id in enumerate((1, 2, 3)):
+        in_range = [(points, cost) for gw, points, cost in histories[team_id] if 3 <= gw <= 5]
+        assert table['managers'][i]['range_net_points'] == sum(points - cost for points, cost in in_range)
+    assert table['net_points'][1] == [None, 66, 55]
+    assert table['gw_rank'] == [[1, 2, 1], [None, 1, 3], [1, 2, 2]]  # A and C level in GW3 and GW4
+    assert [m['range_rank'] for m in table['managers']] == [1, 3, 2]
+    assert (table['managers'][0]['best_gameweek'], table['managers'][0]['best_net_points']) == (5, 63)
@@ -0,0 +1,77 @@
+"""Concurrent calls with the same key share one computation, its result or its exception."""
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import singleflight  # noqa: E402
+
+
+def run_together(key, fn, callers=8):
+    """Call singleflight.do(key, fn) from several threads at once; [(result, error)] per caller."""
+    outcomes = [None] * callers
+
+    def call(i):
+        try:
+            outcomes[i] = (singleflight.do(key, fn), None)
+        except Exception as e:
+            outcomes[i] = (None, e)
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(callers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return outcomes
+
+
+def test_concurrent_callers_share_one_result():
+    calls = []
+
+    def build():
+        calls.append(1)
+        time.sleep(0.2)  # Long enough for every caller to join
+        return {'rows': [1, 2, 3]}
+
+    outcomes = run_together(('process', 1, 12, False), build)
+    assert len(calls) == 1
+    assert all(result is outcomes[0][0] and error is None for result, error in outcomes)
+    assert singleflight.in_flight() == 0
+
+    run_together(('process', 1, 12, False), build, callers=1)  # Done: the next call runs again
+    assert len(calls) == 2
+
+
+def test_an_exception_reaches_every_caller_and_is_not_kept():
+    calls = []
+
+    def fail():
+        calls.append(1)
+        time.sleep(0.2)
+        raise RuntimeError('upstream down')
+
+    outcomes = run_together(('tiebreaker', 12, frozenset({1, 2})), fail)
+    assert len(calls) == 1
+    errors = {id(error) for _, error in outcomes}
+    assert len(errors) == 1 and isinstance(outcomes[0][1], RuntimeError)
+
+    assert singleflight.do(('tiebreaker', 12, frozenset({1, 2})), lambda: 'ok') == 'ok'
+
+
+def test_different_keys_run_separately():
+    started = threading.Barrier(2, timeout=5)
+
+    def build():
+        started.wait()  # Only returns once both keys are running at the same time
+        return threading.get_ident()
+
+    results = {}
+    threads = [threading.Thread(target=lambda k=k: results.update({k: singleflight.do(('process', 1, 12, k), build)}))
+               for k in (False, True)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results[False] != results[True]
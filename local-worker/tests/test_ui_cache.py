@@ -0,0 +1,130 @@
+"""The UI proxy answers revalidations with 304 and serves an expired entry when the worker fails."""
+import gzip
+import importlib.util
+import io
+import json
+import os
+import sys
+
+import requests
+import urllib3
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(HERE, '..', '..')
+
+
+def load(name, filename):
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# app.py imports the UI's archive.py, not the worker's module of the same name.
+_worker_archive = sys.modules.pop('archive', None)
+sys.modules['archive'] = load('ui_archive', 'archive.py')
+sys.path.insert(0, ROOT)
+try:
+    ui_app = load('ui_app', 'app.py')
+finally:
+    sys.path.remove(ROOT)
+    if _worker_archive is not None:
+        sys.modules['archive'] = _worker_archive
+    else:
+        del sys.modules['archive']
+
+PAYLOAD = {'status': 'completed', 'gameweek': 12, 'league_id': 501, 'leaderboard': [{'team_id': 1}] * 50}
+FORM = {'gameweek': '12', 'league_id': '501'}
+
+
+class WorkerAnswer:
+    """Stands in for the streamed requests.Response pool.request hands back."""
+
+    def __init__(self, status_code, body, content_type='application/json', final=False):
+        headers = {'Content-Type': content_type, 'X-Gameweek-Final': 'true' if final else 'false'}
+        if content_type == 'application/json':
+            body, headers['Content-Encoding'] = gzip.compress(body), 'gzip'
+        self.status_code = status_code
+        self.headers = requests.structures.CaseInsensitiveDict(headers)
+        self.raw = urllib3.HTTPResponse(io.BytesIO(body), headers=headers, status=status_code, preload_content=False)
+
+    @property
+    def content(self):
+        return self.raw.read(decode_content=True)
+
+    def close(self):
+        pass
+
+
+def answering(*answers):
+    """Replace the pool's request with one that gives these answers (or raises them) in turn."""
+    answers = list(answers)
+
+    def request(method, path, key=None, **kwargs):
+        answer = answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return None, answer
+    ui_app.pool.request = request
+
+
+def expire_all():
+    for entry in ui_app.ui_cache._entries.values():
+        entry.expires = 0
+
+
+def fresh_cache():
+    ui_app.ui_cache = ui_app.ResponseCache()
+    return ui_app.app.test_client()
+
+
+def test_revalidation_gets_304():
+    client = fresh_cache()
+    answering(WorkerAnswer(200, json.dumps(PAYLOAD).encode(), final=True))
+    first = client.post('/leaderboard', data=FORM, headers={'Accept-Encoding': 'gzip'})
+    assert first.status_code == 200 and first.headers['X-Cache'] == 'MISS'
+    assert first.headers['Content-Encoding'] == 'gzip'  # The worker's bytes, untouched
+    assert json.loads(gzip.decompress(first.data)) == PAYLOAD
+    assert first.headers['ETag'].startswith('W/') and first.cache_control.max_age == ui_app.FINAL_MAX_AGE
+
+    etag = first.headers['ETag']
+    again = client.post('/leaderboard', data=FORM, headers={'If-None-Match': etag})
+    assert again.status_code == 304 and again.data == b'' and again.headers['X-Cache'] == 'HIT'
+    assert again.headers['ETag'] == etag
+
+    since = client.post('/leaderboard', data=FORM, headers={'If-Modified-Since': first.headers['Last-Modified']})
+    assert since.status_code == 304
+
+    changed = client.post('/leaderboard', data=FORM, headers={'If-None-Match': 'W/"something-else"'})
+    assert changed.status_code == 200 and changed.get_json() == PAYLOAD  # No gzip asked for: decompressed
+    assert 'Content-Encoding' not in changed.headers
+    assert ui_app.ui_cache.stats()['hits'] == 3 and ui_app.ui_cache.stats()['misses'] == 1
+
+
+def test_expired_entry_is_served_while_the_worker_fails():
+    client = fresh_cache()
+    answering(WorkerAnswer(200, json.dumps(PAYLOAD).encode()))
+    first = client.post('/leaderboard', data=FORM)
+    assert first.headers['X-Cache'] == 'MISS' and first.cache_control.no_cache  # Live: always revalidated
+    expire_all()
+
+    answering(WorkerAnswer(502, b'<html>tunnel offline</html>', content_type='text/html'),
+              WorkerAnswer(500, json.dumps({'error': 'boom'}).encode()),
+              requests.exceptions.ConnectionError('unreachable'),
+              requests.exceptions.ConnectionError('unreachable'))
+    for _ in range(3):
+        stale = client.post('/leaderboard', data=FORM, headers={'If-None-Match': first.headers['ETag']})
+        assert stale.status_code == 304 and stale.headers['X-Cache'] == 'STALE'
+    stale = client.post('/leaderboard', data=FORM)
+    assert stale.status_code == 200 and stale.get_json() == PAYLOAD and stale.headers['X-Cache'] == 'STALE'
+    assert ui_app.ui_cache.stats()['stale'] == 4
+
+    # A client error is the worker's answer, not an outage: passed through.
+    answering(WorkerAnswer(400, json.dumps({'error': 'Invalid league'}).encode()))
+    refused = client.post('/leaderboard', data=FORM)
+    assert refused.status_code == 400 and refused.get_json() == {'error': 'Invalid league'}
+
+    # Nothing cached to fall back on: the failure reaches the browser.
+    client = fresh_cache()
+    answering(WorkerAnswer(500, json.dumps({'error': 'boom'}).encode()))
+    assert client.post('/leaderboard', data=FORM).status_code == 500
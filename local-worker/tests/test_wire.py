@@ -0,0 +1,88 @@
+"""Responses negotiate zstd/gzip from Accept-Encoding, and columnar rows round-trip to row dicts."""
+import gzip
+import json
+import os
+import sys
+
+from flask import Flask, Response, jsonify, request
+from werkzeug.http import parse_accept_header
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import wire  # noqa: E402
+from records import ManagerRow  # noqa: E402
+
+ROWS = [{'team_id': n, 'manager_name': f'Manager {n}', 'gw_points': 40 + n % 30} for n in range(200)]
+
+
+def make_client():
+    app = Flask(__name__)
+
+    @app.route('/rows')
+    def rows():
+        return jsonify(ROWS[:int(request.args.get('n', len(ROWS)))])
+
+    @app.route('/stream')
+    def stream():
+        return Response((json.dumps(row) for row in ROWS), mimetype='application/json')
+
+    app.after_request(lambda response: wire.compress_response(response, request.accept_encodings))
+    return app.test_client()
+
+
+def test_choose_encoding_prefers_zstd_then_gzip():
+    encodings = wire.ENCODINGS
+    wire.ENCODINGS = ('zstd', 'gzip')  # As with zstandard installed
+    try:
+        assert wire.choose_encoding(parse_accept_header('gzip, deflate, br, zstd')) == 'zstd'
+        assert wire.choose_encoding(parse_accept_header('gzip, zstd;q=0')) == 'gzip'
+        assert wire.choose_encoding(parse_accept_header('br, deflate')) is None
+        assert wire.choose_encoding(parse_accept_header('')) is None
+    finally:
+        wire.ENCODINGS = encodings
+
+    wire.ENCODINGS = ('gzip',)  # zstandard missing: zstd is never offered
+    try:
+        assert wire.choose_encoding(parse_accept_header('zstd, gzip')) == 'gzip'
+        assert wire.choose_encoding(parse_accept_header('zstd')) is None
+    finally:
+        wire.ENCODINGS = encodings
+
+
+def test_only_large_json_bodies_are_compressed():
+    encodings = wire.ENCODINGS
+    wire.ENCODINGS = ('gzip',)
+    client = make_client()
+    try:
+        response = client.get('/rows', headers={'Accept-Encoding': 'gzip'})
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert 'Accept-Encoding' in response.headers['Vary']
+        assert json.loads(gzip.decompress(response.data)) == ROWS
+
+        plain = client.get('/rows')
+        assert 'Content-Encoding' not in plain.headers and plain.get_json() == ROWS
+        assert 'Accept-Encoding' in plain.headers['Vary']  # Caches must still key on it
+
+        small = client.get('/rows?n=2', headers={'Accept-Encoding': 'gzip'})
+        assert len(small.data) < wire.MIN_SIZE
+        assert 'Content-Encoding' not in small.headers and small.get_json() == ROWS[:2]
+
+        streamed = client.get('/stream', headers={'Accept-Encoding': 'gzip'})
+        assert 'Content-Encoding' not in streamed.headers
+    finally:
+        wire.ENCODINGS = encodings
+
+
+def test_columnar_rows_round_trip():
+    rows = [ManagerRow('Ann', 'A team', 1, gw_points=70), {'team_id': 2, 'manager_name': 'Bob', 'extra': True}]
+    table = wire.columnar(rows)
+    assert table['length'] == 2
+    assert all(len(values) == table['length'] for values in table['columns'].values())
+
+    back = [{field: values[i] for field, values in table['columns'].items()} for i in range(table['length'])]
+    assert back[0] == {**rows[0].to_dict(), 'extra': None}  # Absent fields come back null
+    assert {k: v for k, v in back[1].items() if v is not None} == rows[1]
+    assert wire.columnar([]) == {'columns': {}, 'length': 0}
+
+    assert wire.wants_columnar({wire.ROW_FORMAT_HEADER: ' Columnar '})
+    assert not wire.wants_columnar({})
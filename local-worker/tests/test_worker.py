@@ -0,0 +1,197 @@
+"""Leaderboards built against the mock FPL API (see benchmarks/mock_fpl.py), and the standings pager."""
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import sys
+import tempfile
+import time
+import urllib.request
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, os.path.join(os.path.dirname(HERE), 'benchmarks'))
+
+# Read at import time; a throwaway cache, and no prefetching behind the tests' back.
+os.environ.setdefault('FPL_CACHE_PATH', os.path.join(tempfile.mkdtemp(prefix='fpl-worker-test-'), 'cache.sqlite3'))
+os.environ['PREFETCH'] = '0'
+
+import archive  # noqa: E402
+import cache  # noqa: E402
+import mock_fpl  # noqa: E402
+import ranking  # noqa: E402
+import worker  # noqa: E402
+from records import ManagerRow  # noqa: E402
+
+_mock = None
+
+
+def mock_port():
+    """Start the mock FPL API once (current gameweek 20) and point the worker at it, with no archive files."""
+    global _mock
+    if _mock is None:
+        with socket.socket() as s:
+            s.bind(('127.0.0.1', 0))
+            port = s.getsockname()[1]
+        process = multiprocessing.Process(target=mock_fpl.serve, args=(port,), daemon=True)
+        process.start()
+        for _ in range(100):
+            try:
+                mock_request(port, '/__stats')
+                break
+            except OSError:
+                time.sleep(0.05)
+        worker.BASE_URL = f'http://127.0.0.1:{port}/api/'
+        archive.ARCHIVE_DIR = tempfile.mkdtemp(prefix='fpl-archive-test-')
+        _mock = port
+    return _mock
+
+
+def mock_request(port, path, method='GET'):
+    req = urllib.request.Request(f'http://127.0.0.1:{port}{path}', method=method)
+    with urllib.request.urlopen(req, timeout=5) as response:
+        return json.loads(response.read())
+
+
+def forget_histories():
+    cache.flush()
+    conn = cache._conn()
+    conn.execute("DELETE FROM responses WHERE url LIKE '%/history/'")
+    conn.commit()
+
+
+def test_current_gameweek_needs_no_history_calls_after_the_previous_one():
+    port = mock_port()
+    archive.ARCHIVE_DIR = tempfile.mkdtemp(prefix='fpl-archive-test-')
+    assert worker.gameweek_final_at(19) is not None
+    # Gameweek 19 as archived once it went final (the mock's standings are already at 20).
+    mock = mock_fpl.MockFPL()
+    rows = []
+    for team_id, _, _ in mock.league(120):
+        week = mock.totals(team_id, 19)[-1]
+        rows.append(ManagerRow(f'Team {team_id}', 'M', team_id, week['points'], week['event_transfers_cost'],
+                               week['total_points']))
+    archive.save_leaderboard(ranking.RankingIndex(120, 19, rows, final=True))
+
+    # As if that was before gameweek 20's deadline.
+    deadline_async = worker.gameweek_deadline_async
+
+    async def next_week(gameweek):
+        return time.time() + 3600
+
+    worker.gameweek_deadline_async = next_week
+    try:
+        forget_histories()
+        mock_request(port, '/__reset', method='POST')
+        leaderboard, error = worker.get_gw_leaderboard(120, 20)
+        assert error is None
+        assert mock_request(port, '/__stats').get('history', 0) == 0
+        assert len(leaderboard) == 120
+        for row in leaderboard:
+            assert (row.gw_points, row.transfer_cost) == (mock_fpl.gw_points(row.team_id, 20),
+                                                         mock_fpl.transfer_cost(row.team_id, 20))
+
+        # The same from the previous gameweek's snapshot when it isn't archived.
+        os.remove(archive.leaderboard(120, 19).path)
+        cache.save_snapshot(120, 19, (([], row.to_dict()) for row in rows))
+        forget_histories()
+        mock_request(port, '/__reset', method='POST')
+        again, _ = worker.get_gw_leaderboard(120, 20)
+        assert {row.team_id: row.to_dict() for row in again} == {row.team_id: row.to_dict() for row in leaderboard}
+        assert mock_request(port, '/__stats').get('history', 0) == 0
+
+        # No previous leaderboard for this league: histories it is.
+        forget_histories()
+        mock_request(port, '/__reset', method='POST')
+        _, error = worker.get_gw_leaderboard(60, 20)
+        assert error is None and mock_request(port, '/__stats')['history'] == 60
+    finally:
+        worker.gameweek_deadline_async = deadline_async
+
+
+def paginate(pages, expected_pages):
+    """(pages yielded, error) from iter_league_pages_async over {page: data}, later pages answering sooner."""
+    async def fake_fetch(url, **kwargs):
+        page = int(url.rsplit('=', 1)[1])
+        await asyncio.sleep(0.01 * (10 - page))
+        return pages.get(page)
+
+    async def scenario():
+        seen = []
+        try:
+            async for page, _ in worker.iter_league_pages_async(7, expected_pages=expected_pages):
+                seen.append(page)
+        except worker.StandingsIncomplete as e:
+            return seen, e
+        return seen, None
+
+    fetch_data_async = worker.fetch_data_async
+    worker.fetch_data_async = fake_fetch
+    try:
+        return asyncio.run(scenario())
+    finally:
+        worker.fetch_data_async = fetch_data_async
+
+
+def standings_page(page, has_next):
+    return {'standings': {'has_next': has_next, 'page': page, 'results': [{'entry': page}]}}
+
+
+def test_standings_pages_are_yielded_in_order_without_gaps():
+    pages = {page: standings_page(page, page < 5) for page in range(1, 6)}
+    assert paginate(pages, expected_pages=5) == ([1, 2, 3, 4, 5], None)
+    cache.flush()
+    assert cache.league_pages(7) == 5
+
+    del pages[3]  # Failed, while 4 and 5 arrived before it
+    seen, error = paginate(pages, expected_pages=5)
+    assert seen == [1, 2] and 'page 3' in str(error)
+
+    pages[3] = {'standings': {'has_next': False, 'results': []}}
+    assert paginate(pages, expected_pages=5)[0] == [1, 2]
+
+    assert paginate({2: standings_page(2, False)}, expected_pages=2) == ([], None)  # Page 1 failed: nothing
+
+
+def test_incremental_refresh_refetches_only_managers_whose_standings_moved():
+    port = mock_port()
+    first, error = worker.get_gw_leaderboard(60, 20, incremental=True)
+    assert error is None
+    cache.flush()
+
+    # Unchanged standings: every row comes from the snapshot.
+    forget_histories()
+    mock_request(port, '/__reset', method='POST')
+    again, error = worker.get_gw_leaderboard(60, 20, incremental=True)
+    assert error is None and mock_request(port, '/__stats').get('history', 0) == 0
+    assert {row.team_id: row.to_dict() for row in again} == {row.team_id: row.to_dict() for row in first}
+
+    # One manager's total moved since the snapshot: only they are fetched again.
+    cache.flush()
+    snapshot = cache.load_snapshot(60, 20)
+    moved = next(iter(snapshot))
+    snapshot[moved]['sig'][0] -= 5
+    cache.save_snapshot(60, 20, ((entry['sig'], entry['row']) for entry in snapshot.values()))
+    cache.flush()
+    forget_histories()
+    mock_request(port, '/__reset', method='POST')
+    refreshed, error = worker.get_gw_leaderboard(60, 20, incremental=True)
+    assert error is None and mock_request(port, '/__stats')['history'] == 1
+    row = next(row for row in refreshed if row.team_id == moved)
+    assert (row.gw_points, row.transfer_cost) == (mock_fpl.gw_points(moved, 20), mock_fpl.transfer_cost(moved, 20))
+
+
+def test_shards_split_the_league_by_team_id():
+    mock_port()
+    whole, error = worker.get_gw_leaderboard(60, 20)
+    assert error is None
+    rows, listed = {}, 0
+    for index in range(3):
+        shard, error = worker.get_gw_leaderboard(60, 20, shard=(index, 3))
+        assert error is None and shard
+        assert all(row.team_id % 3 == index for row in shard)
+        rows.update((row.team_id, row.to_dict()) for row in shard)
+        listed += len(shard)
+    assert listed == len(whole)  # Every manager in exactly one shard, with the same row as in the whole league
+    assert rows == {row.team_id: row.to_dict() for row in whole}
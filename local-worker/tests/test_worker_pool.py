@@ -0,0 +1,57 @@
+"""The UI proxy's worker pool keeps a league on one worker and spreads its shards across the others."""
+import importlib.util
+import os
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+_spec = importlib.util.spec_from_file_location('worker_pool', os.path.join(HERE, '..', '..', 'worker_pool.py'))
+worker_pool = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(worker_pool)
+
+URLS = ['http://home-a:5001', 'http://home-b:5001', 'http://home-c:5001']
+LEAGUES = range(1000, 1300)
+
+
+def owners(pool):
+    return {league_id: pool.ranked(league_id)[0].url for league_id in LEAGUES}
+
+
+def test_rendezvous_keeps_leagues_in_place():
+    pool = worker_pool.WorkerPool(URLS)
+    placed = owners(pool)
+    assert placed == owners(worker_pool.WorkerPool(list(reversed(URLS))))  # Order of WORKER_URLS doesn't matter
+    assert set(placed.values()) == set(URLS)
+    assert all(list(placed.values()).count(url) > len(LEAGUES) // 6 for url in URLS)  # Roughly even
+
+    # A new worker only takes leagues for itself; nothing moves between the old ones.
+    grown = owners(worker_pool.WorkerPool(URLS + ['http://home-d:5001']))
+    moved = [league_id for league_id in LEAGUES if grown[league_id] != placed[league_id]]
+    assert moved and all(grown[league_id] == 'http://home-d:5001' for league_id in moved)
+
+    # A benched worker's leagues go to their second choice, and it is tried last.
+    benched = pool.workers[0]
+    benched.down_until = time.time() + 60
+    for league_id, url in owners(pool).items():
+        assert url != benched.url
+        assert url == placed[league_id] or placed[league_id] == benched.url
+        assert pool.ranked(league_id)[-1] is benched
+    assert pool.shard_workers(1000, 0)[-1] is benched
+
+
+def test_shards_start_on_different_workers():
+    pool = worker_pool.WorkerPool(URLS)
+    for league_id in (1000, 1001, 1002):
+        firsts = [pool.shard_workers(league_id, index)[0] for index in range(3)]
+        assert len(set(firsts)) == 3
+        assert firsts[0] is pool.ranked(league_id)[0]  # Shard 0 stays with the league's own worker
+        assert all(sorted(w.url for w in pool.shard_workers(league_id, index)) == sorted(URLS) for index in range(3))
+
+
+def test_merged_shards_rank_by_net_points_then_standings():
+    shards = [
+        [{'team_id': 3, 'net_points': 60, 'overall_rank': 9}, {'team_id': 6, 'net_points': 41, 'overall_rank': 2}],
+        [{'team_id': 1, 'net_points': 60, 'overall_rank': 4}, {'team_id': 4, 'net_points': 75, 'overall_rank': None}],
+    ]
+    merged = worker_pool.merge_rows(row for rows in shards for row in rows)
+    assert [row['team_id'] for row in merged] == [4, 1, 3, 6]
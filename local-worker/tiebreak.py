@@ -0,0 +1,167 @@
+"""
+Bulk tiebreaker evaluation.
+
+Live player stats for a gameweek become arrays indexed by element id, and every
+manager's picks are packed into (managers x picks) arrays, so the tiebreaker
+fields for a whole league are a handful of numpy gathers and row sums instead
+of a Python loop per pick.
+
+The cascade, all descending (higher = better):
+  net_points → no_chip_bonus → starters_goals → starters_assists
+             → captain_points → vice_captain_points
+"""
+import numpy as np
+
+CASCADE = ('net_points', 'no_chip_bonus', 'starters_goals', 'starters_assists',
+           'captain_points', 'vice_captain_points')
+
+DEFAULT_FIELDS = {
+    'chip_played': False,
+    'no_chip_bonus': 1,
+    'starters_goals': 0,
+    'starters_assists': 0,
+    'captain_points': 0,
+    'vice_captain_points': 0,
+    'active_chip': None,
+}
+
+
+class PlayerStats:
+    """
+    Per-player stats for a gameweek from /event/{gw}/live/, indexed by element id:
+    total_points, goals_scored, assists and minutes. With the bootstrap and the
+    gameweek's fixtures it also knows each player's element_type and whether the
+    player's team has finished all its fixtures (fixtures_done), which auto-subs need,
+    plus names ({element id: web_name}) for responses that list players.
+    """
+
+    def __init__(self, event_live_data, bootstrap=None, fixtures=None):
+        elements = (event_live_data or {}).get('elements') or []
+        players = (bootstrap or {}).get('elements') or []
+        size = max([e.get('id') or 0 for e in elements] + [p.get('id') or 0 for p in players] + [0]) + 1
+        self.total_points = np.zeros(size, dtype=np.int32)
+        self.goals_scored = np.zeros(size, dtype=np.int32)
+        self.assists = np.zeros(size, dtype=np.int32)
+        self.minutes = np.zeros(size, dtype=np.int32)
+        self.element_type = np.zeros(size, dtype=np.int8)
+        self.fixtures_done = np.zeros(size, dtype=bool)
+        self.names = {}
+        self.players = len(elements)
+
+        for element in elements:
+            player_id = element.get('id')
+            stats = element.get('stats', {}) or {}
+            self.total_points[player_id] = stats.get('total_points', 0)
+            self.goals_scored[player_id] = stats.get('goals_scored', 0)
+            self.assists[player_id] = stats.get('assists', 0)
+            self.minutes[player_id] = stats.get('minutes', 0)
+
+        # A team is done once every fixture it has this gameweek is over (a blank is done too).
+        # Without fixtures nobody counts as done, so no auto-subs are made.
+        unfinished = {
+            team
+            for fixture in fixtures or []
+            if not (fixture.get('finished') or fixture.get('finished_provisional'))
+            for team in (fixture.get('team_h'), fixture.get('team_a'))
+        }
+        for player in players:
+            self.element_type[player['id']] = player.get('element_type', 0)
+            self.fixtures_done[player['id']] = fixtures is not None and player.get('team') not in unfinished
+            self.names[player['id']] = player.get('web_name')
+
+    def __len__(self):
+        return self.players
+
+    def arrays(self):
+        return (self.total_points, self.goals_scored, self.assists, self.minutes,
+                self.element_type, self.fixtures_done)
+
+    def lookup(self, element_ids):
+        """Index arrays for element_ids; unknown ids map to slot 0, which is always zero."""
+        return np.where((element_ids > 0) & (element_ids < len(self.total_points)), element_ids, 0)
+
+
+class PicksMatrix:
+    """Every manager's picks for one gameweek as (managers x picks) arrays."""
+
+    def __init__(self, picks_by_team):
+        """picks_by_team: {team_id: /entry/{id}/event/{gw}/picks/ response or None}."""
+        self.team_ids = list(picks_by_team)
+        width = max((len((p or {}).get('picks') or []) for p in picks_by_team.values()), default=0)
+        shape = (len(self.team_ids), width)
+        self.elements = np.zeros(shape, dtype=np.int64)
+        self.multipliers = np.zeros(shape, dtype=np.int8)
+        self.captain = np.zeros(shape, dtype=bool)
+        self.vice_captain = np.zeros(shape, dtype=bool)
+        self.element_types = np.zeros(shape, dtype=np.int8)
+        self.has_picks = np.zeros(len(self.team_ids), dtype=bool)
+        self.transfer_costs = np.zeros(len(self.team_ids), dtype=np.int32)
+        self.active_chips = []
+
+        for i, team_id in enumerate(self.team_ids):
+            picks_data = picks_by_team[team_id]
+            chip = None
+            if picks_data and 'picks' in picks_data:
+                self.has_picks[i] = True
+                chip = picks_data.get('active_chip')
+                self.transfer_costs[i] = (picks_data.get('entry_history') or {}).get('event_transfers_cost', 0)
+                # Columns follow squad position: 0-10 the starting XI, then the bench in order.
+                for j, pick in enumerate(sorted(picks_data['picks'], key=lambda p: p.get('position', 0))):
+                    self.elements[i, j] = pick.get('element') or 0
+                    self.multipliers[i, j] = pick.get('multiplier', 0)
+                    self.captain[i, j] = bool(pick.get('is_captain'))
+                    self.vice_captain[i, j] = bool(pick.get('is_vice_captain'))
+                    self.element_types[i, j] = pick.get('element_type', 0)
+            self.active_chips.append(chip)
+
+
+def evaluate(picks, stats):
+    """
+    Tiebreaker columns for every manager in a PicksMatrix, as int32 arrays:
+    no_chip_bonus (1 = no chip), starters_goals, starters_assists,
+    captain_points (base 1x, whatever the multiplier), vice_captain_points.
+    Bench Boost gives the bench multiplier 1, so the bench counts as starters.
+    """
+    index = stats.lookup(picks.elements)
+    starters = picks.multipliers > 0
+    points = stats.total_points[index]
+    chip_played = np.array([chip is not None for chip in picks.active_chips], dtype=bool)
+
+    return {
+        'no_chip_bonus': (~chip_played).astype(np.int32),
+        'starters_goals': np.where(starters, stats.goals_scored[index], 0).sum(axis=1, dtype=np.int32),
+        'starters_assists': np.where(starters, stats.assists[index], 0).sum(axis=1, dtype=np.int32),
+        'captain_points': np.where(picks.captain, points, 0).sum(axis=1, dtype=np.int32),
+        'vice_captain_points': np.where(picks.vice_captain, points, 0).sum(axis=1, dtype=np.int32),
+    }
+
+
+def fields_by_team(picks, columns):
+    """Per-manager dicts in the /tiebreaker response shape. Managers without picks get DEFAULT_FIELDS."""
+    as_lists = {name: values.tolist() for name, values in columns.items()}
+    enriched = {}
+    for i, team_id in enumerate(picks.team_ids):
+        if not picks.has_picks[i]:
+            enriched[team_id] = dict(DEFAULT_FIELDS)
+            continue
+        chip = picks.active_chips[i]
+        enriched[team_id] = {
+            'chip_played': chip is not None,
+            'active_chip': chip,
+            **{name: values[i] for name, values in as_lists.items()},
+        }
+    return enriched
+
+
+def cascade_order(rows):
+    """
+    Indices that sort rows (dicts holding the CASCADE fields) best-first.
+    Stable, so managers tied on every field keep their incoming order.
+    """
+    defaults = {**DEFAULT_FIELDS, 'net_points': 0}
+    keys = [
+        -np.fromiter((row.get(field, defaults[field]) for row in rows), dtype=np.int64, count=len(rows))
+        for field in CASCADE
+    ]
+    # lexsort treats the last key as primary.
+    return np.lexsort(keys[::-1]) if rows else np.zeros(0, dtype=np.intp)
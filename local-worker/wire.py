@@ -0,0 +1,74 @@
+"""
+Compact wire format for worker responses.
+
+Responses cross ngrok to the UI proxy, so two things are negotiated per request:
+
+  * Content-Encoding: JSON bodies over MIN_SIZE bytes are compressed with zstd
+    (when the optional zstandard package is installed) or gzip, whichever the
+    client lists in Accept-Encoding. Streamed responses are left alone.
+  * Row layout: with "X-Row-Format: columnar" row lists (leaderboards, job
+    rows, ranking pages) are sent as {"columns": {field: [values...]}, "length": n}
+    instead of one object per row, so field names aren't repeated per manager.
+
+Clients that ask for neither get exactly what they got before.
+"""
+import gzip
+import os
+
+try:
+    import zstandard
+except ImportError:  # Optional: gzip only
+    zstandard = None
+
+ROW_FORMAT_HEADER = 'X-Row-Format'
+MIN_SIZE = 1024  # Bytes; smaller bodies aren't worth a compression frame
+GZIP_LEVEL = int(os.getenv('GZIP_LEVEL', '5'))
+ZSTD_LEVEL = int(os.getenv('ZSTD_LEVEL', '3'))
+
+ENCODINGS = ('zstd', 'gzip') if zstandard is not None else ('gzip',)
+
+
+def wants_columnar(headers):
+    return headers.get(ROW_FORMAT_HEADER, '').strip().lower() == 'columnar'
+
+
+def columnar(rows):
+    """Column-per-field layout of ManagerRow objects or row dicts; absent fields are null."""
+    dicts = [row if isinstance(row, dict) else row.to_dict() for row in rows]
+    fields = list(dict.fromkeys(field for row in dicts for field in row))
+    return {
+        'columns': {field: [row.get(field) for row in dicts] for field in fields},
+        'length': len(dicts),
+    }
+
+
+def choose_encoding(accept_encodings):
+    """Best encoding we support from a werkzeug Accept-Encoding header, or None."""
+    for encoding in ENCODINGS:
+        if accept_encodings[encoding] > 0:
+            return encoding
+    return None
+
+
+def compress(body, encoding):
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+def compress_response(response, accept_encodings):
+    """Flask after_request hook body: compress a finished JSON response if the client allows it."""
+    response.vary.add('Accept-Encoding')
+    if (response.is_streamed or response.direct_passthrough
+            or response.mimetype != 'application/json'
+            or 'Content-Encoding' in response.headers):
+        return response
+
+    encoding = choose_encoding(accept_encodings)
+    body = response.get_data()
+    if encoding is None or len(body) < MIN_SIZE:
+        return response
+
+    response.set_data(compress(body, encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
@@ -1,293 +1,1561 @@
+import asyncio
 import json
-import requests
-from flask import Flask, request, jsonify
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import os
+import threading
+import time
+from flask import Flask, Response, request, jsonify, send_from_directory, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from datetime import datetime
 
+import archive
+import cache
+import extract
+import fetcher
+import jobs
+import livepoints
+import livestats
+import metrics
+import prefetch
+import ranking
+import records
+import rivals
+import season
+import singleflight
+import tiebreak
+import wire
+
+
+class JSONProvider(DefaultJSONProvider):
+    """Rows stay ManagerRow objects until a response serializes them."""
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, records.ManagerRow):
+            return o.to_dict()
+        return DefaultJSONProvider.default(o)
+
+
 app = Flask(__name__)
+app.json = JSONProvider(app)
 
 BASE_URL = "https://fantasy.premierleague.com/api/"
-MAX_WORKERS = 20  # More workers since running locally
+STANDINGS_PAGE_SIZE = 50  # Managers per FPL standings page
+PAGE_WINDOW = 8  # Standings pages requested ahead of the furthest known page
+STREAM_BATCH = 200  # Max rows per NDJSON line when streaming /process
+STREAM_INTERVAL = 0.25  # Seconds to gather rows before flushing a streamed line
+MAX_RIVALS = 20  # Managers one /rivals comparison may include
+
 
+async def fetch_data_async(url, timeout=10, ttl=None, valid_after=None, refresh=False):
+    """
+    Fetch and decode a JSON URL. With a ttl the response goes through the on-disk
+    cache; valid_after makes finished-gameweek entries permanent (see cache.py).
+    refresh skips the cache read but still stores the fresh response.
+    """
+    if ttl is not None and not refresh:
+        body = await cache.get_async(url, valid_after)
+        metrics.inc('fpl_cache_lookups_total', endpoint=metrics.endpoint_of(url),
+                    result='miss' if body is None else 'hit')
+        if body is not None:
+            try:
+                return extract.loads(body)
+            except ValueError as e:
+                print(f"Dropping corrupt cache entry for {url}: {e}")
+                cache.delete(url)
 
-def fetch_data(url, timeout=10):
+    body = await fetcher.get_bytes(url, timeout)
+    if body is None:
+        return None
     try:
-        response = requests.get(url, timeout=timeout)
-        if response.status_code != 200:
-            return None
-        return response.json()
-    except Exception as e:
-        print(f"Error fetching {url}: {e}")
+        data = extract.loads(body)
+    except ValueError as e:
+        print(f"Error decoding {url}: {e}")
+        return None
+
+    if ttl is not None:
+        cache.put(url, body, ttl)
+    return data
+
+
+def fetch_data(url, timeout=10, ttl=None, valid_after=None, refresh=False):
+    return fetcher.run(fetch_data_async(url, timeout, ttl, valid_after, refresh))
+
+
+async def fetch_parsed_async(url, parse, *args, ttl, valid_after=None, refresh=False, timeout=10):
+    """
+    Like fetch_data_async, but the body goes through the CPU stage as parse(body, *args)
+    (see extract.py) and only its result is returned, so fan-outs never hold or decode
+    whole payloads on the fetch loop. None when the body is missing or doesn't parse.
+    """
+    if not refresh:
+        body = await cache.get_async(url, valid_after)
+        metrics.inc('fpl_cache_lookups_total', endpoint=metrics.endpoint_of(url),
+                    result='miss' if body is None else 'hit')
+        if body is not None:
+            try:
+                return await extract.run(parse, body, *args)
+            except ValueError as e:
+                print(f"Dropping corrupt cache entry for {url}: {e}")
+                cache.delete(url)
+
+    body = await fetcher.get_bytes(url, timeout)
+    if body is None:
+        return None
+    try:
+        result = await extract.run(parse, body, *args)
+    except ValueError as e:
+        print(f"Error decoding {url}: {e}")
         return None
 
+    cache.put(url, body, ttl)
+    return result
+
+
+async def fetch_bootstrap_async():
+    """Season calendar, teams and players. Large, so it is cached for a few minutes."""
+    return await fetch_data_async(BASE_URL + "bootstrap-static/", ttl=cache.TTL_BOOTSTRAP)
 
-def fetch_league_data(league_id):
-    """Fetch all teams from the league by handling pagination"""
-    all_results = []
-    page = 1
 
-    while True:
-        url = BASE_URL + f"leagues-classic/{league_id}/standings/?page_standings={page}"
-        data = fetch_data(url)
+async def gameweek_final_at_async(gameweek):
+    """
+    Timestamp from which cached data for this gameweek is final, or None while it can
+    still change. A gameweek is final once FPL marks it finished and data_checked
+    (bonus points confirmed).
+    """
+    final_at = await cache.final_at_async(gameweek)
+    if final_at is not None:
+        return final_at
+
+    bootstrap = await fetch_bootstrap_async()
+    for event in (bootstrap or {}).get('events', []):
+        if event.get('id') == gameweek and event.get('finished') and event.get('data_checked'):
+            return await cache.mark_final_async(gameweek)
+    return None
 
-        if not data or 'standings' not in data:
-            break
 
-        results = data['standings']['results']
-        if not results:
-            break
+def gameweek_final_at(gameweek):
+    return fetcher.run(gameweek_final_at_async(gameweek))
 
-        all_results.extend(results)
-        print(f"Fetched page {page}: {len(results)} teams")
 
-        if not data['standings'].get('has_next', False):
-            break
+async def current_gameweek_async():
+    """Id of the gameweek FPL flags as current (None before the season starts)."""
+    bootstrap = await fetch_bootstrap_async()
+    for event in (bootstrap or {}).get('events', []):
+        if event.get('is_current'):
+            return event['id']
+    return None
+
+
+def current_gameweek():
+    return fetcher.run(current_gameweek_async())
+
+
+def deadline_timestamp(event):
+    """Unix time of a bootstrap event's deadline, or None."""
+    if not event.get('deadline_time'):
+        return None
+    return datetime.fromisoformat(event['deadline_time'].replace('Z', '+00:00')).timestamp()
 
-        page += 1
 
-    if all_results:
-        data['standings']['results'] = all_results
+async def gameweek_deadline_async(gameweek):
+    """Unix time of the gameweek's deadline (None if unknown). Picks can't change after it."""
+    bootstrap = await fetch_bootstrap_async()
+    for event in (bootstrap or {}).get('events', []):
+        if event.get('id') == gameweek:
+            return deadline_timestamp(event)
+    return None
+
+
+def standings_url(league_id, page):
+    return BASE_URL + f"leagues-classic/{league_id}/standings/?page_standings={page}"
+
+
+class StandingsIncomplete(Exception):
+    """A standings page inside the league failed or came back empty, so the league can't be listed whole."""
+
+
+async def iter_league_pages_async(league_id, refresh=False, expected_pages=1):
+    """
+    Yield (page, data) for every standings page, in page order. Pages are requested
+    up to PAGE_WINDOW ahead of each page known to have a next one, so big leagues
+    paginate concurrently instead of one has_next at a time; one that arrives early
+    is held until the pages before it have been yielded. expected_pages (from the
+    last run) puts the whole known range in flight at once.
+    Pagination stops at the first page that reports has_next=False; speculative
+    requests past it are discarded. A page that fails or comes back empty after one
+    reporting has_next=True raises StandingsIncomplete, since the league would be
+    listed with a gap; if that is page 1, nothing is yielded.
+    """
+    pending = set()
+    arrived = {}  # page -> data, until every page before it has been yielded
+    next_page = 1
+    next_yield = 1
+    last_page = None
+
+    async def fetch_page(page):
+        return page, await fetch_data_async(standings_url(league_id, page), ttl=cache.TTL_STANDINGS, refresh=refresh)
+
+    def schedule(up_to):
+        nonlocal next_page
+        while next_page <= up_to and (last_page is None or next_page <= last_page):
+            pending.add(asyncio.ensure_future(fetch_page(next_page)))
+            next_page += 1
+
+    schedule(max(expected_pages, 1))
+    try:
+        while pending and (last_page is None or next_yield <= last_page):
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                pending.discard(task)
+                page, data = task.result()
+                arrived[page] = data
+                if (data or {}).get('standings', {}).get('has_next', False):
+                    # Ramp the look-ahead up (1, 2, 4, ...) so small leagues don't overfetch.
+                    schedule(page + min(page, PAGE_WINDOW))
+
+            while next_yield in arrived and (last_page is None or next_yield <= last_page):
+                page, data = next_yield, arrived.pop(next_yield)
+                results = (data or {}).get('standings', {}).get('results')
+                if not results:
+                    if page > 1:
+                        raise StandingsIncomplete(
+                            f"Standings page {page} of league {league_id} {'came back empty' if data else 'failed'} "
+                            f"after page {page - 1} reported more. Please try again in a minute."
+                        )
+                    if not data:
+                        print(f"Failed to fetch standings page {page}")
+                    last_page = 0
+                    break
+                if not data['standings'].get('has_next', False):
+                    last_page = page
+
+                print(f"Fetched page {page}: {len(results)} teams")
+                yield page, data
+                next_yield += 1
+    finally:
+        for task in pending:
+            task.cancel()
+
+    if last_page:
+        cache.save_league_pages(league_id, last_page)
+
+
+async def fetch_league_data_async(league_id, refresh=False):
+    """Fetch all teams from the league, paginating concurrently"""
+    pages = {}
+    async for page, data in iter_league_pages_async(league_id, refresh, await cache.league_pages_async(league_id)):
+        pages[page] = data
+
+    if not pages:
+        return None
 
+    data = pages[max(pages)]
+    data['standings']['results'] = [m for page in sorted(pages) for m in pages[page]['standings']['results']]
     return data
 
 
-def fetch_manager_history(team_id):
-    url = BASE_URL + f"entry/{team_id}/history/"
-    return fetch_data(url)
+def fetch_league_data(league_id, refresh=False):
+    return fetcher.run(fetch_league_data_async(league_id, refresh))
 
 
-def fetch_manager_picks(team_id, gameweek):
+def manager_history_url(team_id):
+    return BASE_URL + f"entry/{team_id}/history/"
+
+
+async def fetch_manager_history_async(team_id, valid_after=None, refresh=False):
+    """Pass valid_after=gameweek_final_at(gw) when only rows up to a finished gw are needed."""
+    url = manager_history_url(team_id)
+    return await fetch_data_async(url, ttl=cache.TTL_HISTORY, valid_after=valid_after, refresh=refresh)
+
+
+def fetch_manager_history(team_id, valid_after=None, refresh=False):
+    return fetcher.run(fetch_manager_history_async(team_id, valid_after, refresh))
+
+
+async def fetch_history_points_async(team_id, gameweek, valid_after=None, refresh=False):
+    """(points, transfer cost) for one gameweek of a manager's history, or None."""
+    return await fetch_parsed_async(manager_history_url(team_id), extract.history_points, gameweek,
+                                    ttl=cache.TTL_HISTORY, valid_after=valid_after, refresh=refresh)
+
+
+async def fetch_manager_picks_async(team_id, gameweek, valid_after=None):
     """Fetch a manager's squad for a given gameweek."""
     url = BASE_URL + f"entry/{team_id}/event/{gameweek}/picks/"
-    return fetch_data(url)
+    return await fetch_data_async(url, ttl=cache.TTL_PICKS, valid_after=valid_after)
+
 
+def fetch_manager_picks(team_id, gameweek, valid_after=None):
+    return fetcher.run(fetch_manager_picks_async(team_id, gameweek, valid_after))
 
-def fetch_event_live(gameweek):
+
+async def fetch_picks_fields_async(team_id, gameweek, valid_after=None):
+    """A manager's squad for a gameweek, cut down to extract.picks_fields."""
+    url = BASE_URL + f"entry/{team_id}/event/{gameweek}/picks/"
+    return await fetch_parsed_async(url, extract.picks_fields, ttl=cache.TTL_PICKS, valid_after=valid_after)
+
+
+async def fetch_event_live_async(gameweek, valid_after=None, refresh=False):
     """Fetch live stats for every player in a given gameweek. One call covers all players."""
     url = BASE_URL + f"event/{gameweek}/live/"
-    return fetch_data(url)
+    return await fetch_data_async(url, ttl=cache.TTL_LIVE, valid_after=valid_after, refresh=refresh)
+
+
+def fetch_event_live(gameweek, valid_after=None, refresh=False):
+    return fetcher.run(fetch_event_live_async(gameweek, valid_after, refresh))
+
+
+async def fetch_fixtures_async(gameweek, valid_after=None, refresh=False):
+    """All fixtures of a gameweek, with their started/finished flags."""
+    url = BASE_URL + f"fixtures/?event={gameweek}"
+    return await fetch_data_async(url, ttl=cache.TTL_LIVE, valid_after=valid_after, refresh=refresh)
+
+
+async def load_event_live_async(gameweek):
+    """Loader for the shared live-stats store: (PlayerStats, final). Live gameweeks skip the cache."""
+    final_at = await gameweek_final_at_async(gameweek)
+    live = final_at is None
+    event_live, fixtures, bootstrap = await asyncio.gather(
+        fetch_event_live_async(gameweek, valid_after=final_at, refresh=live),
+        fetch_fixtures_async(gameweek, valid_after=final_at, refresh=live),
+        fetch_bootstrap_async(),
+    )
+    return tiebreak.PlayerStats(event_live, bootstrap, fixtures), not live
+
+
+def history_event_row(history, gameweek):
+    """The history['current'] row for a gameweek (managers who joined late have fewer rows)."""
+    for row in history.get('current', []):
+        if row.get('event') == gameweek:
+            return row
+    return None
 
 
-def build_live_stats_map(event_live_data):
+async def rows_from_standings_async(managers, gameweek, previous_final_at, previous_totals):
     """
-    Turn the /event/{gw}/live/ response into a dict keyed by player id.
-    Each value holds total_points, goals_scored, assists for that player.
+    Current-gameweek fast path for a page of managers: row_from_totals where
+    previous_totals (see previous_totals_async) has the manager, otherwise
+    row_from_standings_async, whose cache lookups share one read (see
+    cache.get_async). Returns {team_id: row} for the managers it could answer.
     """
-    stats_map = {}
-    if not event_live_data or 'elements' not in event_live_data:
-        return stats_map
+    rows, rest = {}, []
+    for manager in managers:
+        previous_total = 0 if gameweek == 1 else previous_totals.get(manager['entry'])
+        row = row_from_totals(manager, previous_total) if previous_total is not None else None
+        if row is None:
+            rest.append(manager)
+        else:
+            rows[manager['entry']] = row
+    found = await asyncio.gather(*(row_from_standings_async(m, gameweek, previous_final_at) for m in rest))
+    rows.update((manager['entry'], row) for manager, row in zip(rest, found) if row is not None)
+    return rows
+
+
+async def previous_totals_async(league_id, gameweek, previous_final_at):
+    """
+    {team_id: season total after the previous gameweek} from that gameweek's archive
+    file or leaderboard snapshot, for row_from_totals. Only one built after the
+    previous gameweek went final and before this gameweek's deadline counts, since no
+    total moves in between; {} if there is none.
+    """
+    deadline = await gameweek_deadline_async(gameweek)
+    if gameweek == 1 or deadline is None or previous_final_at >= deadline:
+        return {}
+    archived = archive.leaderboard(league_id, gameweek - 1)
+    if archived is not None and previous_final_at <= archived.meta['created_at'] < deadline:
+        return dict(zip(archived.team_ids.tolist(), archived.column('total_points').tolist()))
+    return await cache.snapshot_totals_async(league_id, gameweek - 1, previous_final_at, deadline)
 
-    for element in event_live_data['elements']:
-        player_id = element.get('id')
-        stats = element.get('stats', {}) or {}
-        stats_map[player_id] = {
-            'total_points': stats.get('total_points', 0),
-            'goals_scored': stats.get('goals_scored', 0),
-            'assists': stats.get('assists', 0),
-        }
-    return stats_map
-
-
-def compute_tiebreaker_fields(picks_data, live_stats_map):
-    """
-    From a manager's picks + the gameweek live-stats map, compute:
-      - chip_played (bool): any chip active this GW
-      - no_chip_bonus (int): 1 if no chip, 0 if chip (so higher = better, fits reverse=True sort)
-      - starters_goals (int): goals by the 11 starters (multiplier > 0)
-      - starters_assists (int): assists by the 11 starters
-      - captain_points (int): base 1x points of the captain
-      - vice_captain_points (int): base 1x points of the vice
-      - active_chip (str|None): raw chip name for display
-    """
-    result = {
-        'chip_played': False,
-        'no_chip_bonus': 1,
-        'starters_goals': 0,
-        'starters_assists': 0,
-        'captain_points': 0,
-        'vice_captain_points': 0,
-        'active_chip': None,
-    }
 
-    if not picks_data or 'picks' not in picks_data:
-        return result
-
-    active_chip = picks_data.get('active_chip')
-    result['active_chip'] = active_chip
-    result['chip_played'] = active_chip is not None
-    result['no_chip_bonus'] = 0 if result['chip_played'] else 1
-
-    for pick in picks_data['picks']:
-        player_id = pick.get('element')
-        multiplier = pick.get('multiplier', 0)
-        stats = live_stats_map.get(player_id, {})
-        base_points = stats.get('total_points', 0)
-        goals = stats.get('goals_scored', 0)
-        assists = stats.get('assists', 0)
-
-        # Starters contribute to goals/assists (bench has multiplier 0).
-        # Bench Boost sets bench multipliers to 1, which is exactly what we want —
-        # if BB is played, the bench counts as "starters" for this GW.
-        if multiplier > 0:
-            result['starters_goals'] += goals
-            result['starters_assists'] += assists
-
-        if pick.get('is_captain'):
-            result['captain_points'] = base_points  # always 1x, regardless of 2x/3x multiplier
-        if pick.get('is_vice_captain'):
-            result['vice_captain_points'] = base_points  # always 1x
+def row_from_totals(manager, previous_total):
+    """
+    A current-gameweek row from the standings entry alone: event_total is the
+    gameweek's points before hits and total minus previous_total the points after
+    them, so the difference is the transfer cost. None if they don't add up.
+    """
+    event_total = manager.get('event_total')
+    if event_total is None:
+        return None
+    transfer_cost = event_total - (manager['total'] - previous_total)
+    if transfer_cost < 0:
+        return None
+    return leaderboard_row(manager, event_total, transfer_cost)
 
-    return result
 
+def leaderboard_row(manager, gw_points, transfer_cost):
+    return records.ManagerRow.from_standings(manager, gw_points, transfer_cost)
 
-def get_gw_leaderboard(league_id, gameweek):
-    """Fetch league data and create leaderboard with parallel processing"""
-    print(f"\n{'='*80}")
-    print(f"Processing League {league_id}, Gameweek {gameweek}")
-    print(f"{'='*80}\n")
 
-    league_data = fetch_league_data(league_id)
+async def row_from_standings_async(manager, gameweek, previous_final_at):
+    """
+    Current-gameweek fast path: build a row from the standings entry plus a history
+    that is already cached, without calling FPL. Net points are the standings total
+    minus the total after the previous gameweek; the transfer cost is fixed at the
+    deadline, so any cached history holding this gameweek's row carries it.
+    Returns None when the cache can't answer for this manager.
+    """
+    body = await cache.get_stored_after_async(manager_history_url(manager['entry']), previous_final_at)
+    if body is None:
+        return None
+    try:
+        history = extract.loads(body)
+    except ValueError:
+        return None  # Corrupt: the history fetch drops and refetches it
+
+    row = history_event_row(history, gameweek)
+    if row is None:
+        return None
+    previous = history_event_row(history, gameweek - 1)
+    if previous is not None:
+        previous_total = previous['total_points']
+    elif all(r.get('event', 0) >= gameweek for r in history['current']):
+        previous_total = 0  # Joined this gameweek
+    else:
+        return None
 
-    if not league_data:
-        return None, "Failed to fetch league data"
+    transfer_cost = row['event_transfers_cost']
+    net_points = manager['total'] - previous_total
+    return leaderboard_row(manager, net_points + transfer_cost, transfer_cost)
 
-    managers = league_data['standings']['results']
-    total_managers = len(managers)
 
-    print(f"Total managers: {total_managers}")
-    print(f"Starting parallel processing with {MAX_WORKERS} workers...\n")
+def standings_signature(manager):
+    """The standings fields that move whenever a manager's points change."""
+    return [manager['total'], manager['rank'], manager.get('event_total')]
 
-    leaderboard = []
+
+def shard_of(team_id, shard):
+    """Whether a manager is in shard (index, count). Leagues are split by team_id modulo count."""
+    return team_id % shard[1] == shard[0]
+
+
+def get_gw_leaderboard(league_id, gameweek, incremental=False, shard=(0, 1)):
+    """
+    Fetch league data and create leaderboard. Standings pages are paginated
+    concurrently and each page's managers go straight into the history fan-out,
+    so both stages overlap on the fetch loop.
+
+    With incremental=True, fresh standings are compared against the last snapshot for
+    this league/GW and only managers whose total, rank or event_total moved get their
+    history refetched; everyone else is reused from the snapshot.
+
+    For the live current gameweek, rows are derived from the standings pages: from
+    each manager's total after the previous gameweek, read from that gameweek's
+    archive file or snapshot (see previous_totals_async), or else from a cached
+    history holding the transfer cost (see row_from_standings_async). Only managers
+    neither can answer for need a history call.
+
+    With shard=(index, count) only that shard's managers are built (see shard_of), for
+    the UI proxy to merge with the other shards. A shard is never snapshotted or
+    indexed, since it isn't the whole league.
+    """
+    print(f"\n{'='*80}")
+    print(f"Processing League {league_id}, Gameweek {gameweek}{' (incremental)' if incremental else ''}"
+          f"{f' (shard {shard[0] + 1}/{shard[1]})' if shard[1] > 1 else ''}")
+    print(f"{'='*80}\n")
+    build = join_build(league_id, gameweek, incremental, shard)
+    try:
+        return build.wait()
+    finally:
+        build.leave()
+
+
+async def _build_leaderboard_async(league_id, gameweek, incremental, on_rows=None, shard=(0, 1)):
+    """
+    on_rows(rows, seen), if given, is called on the fetch loop whenever rows are ready,
+    with the number of managers (in the shard) discovered in the standings so far.
+    """
+    # A finished leaderboard's points come from its archive file (see archive.py);
+    # today's standings still supply the managers, their totals and ranks.
+    archived = archive.leaderboard(league_id, gameweek)
+    archived_points = archived.points_by_team() if archived is not None else {}
+
+    # Finished gameweeks are served straight from the on-disk cache.
+    final_at = await gameweek_final_at_async(gameweek)
+    refresh = incremental and final_at is None
+
+    # The standings fast path needs the previous gameweek's final totals.
+    previous_final_at = None
+    if final_at is None and await current_gameweek_async() == gameweek:
+        previous_final_at = 0 if gameweek == 1 else await gameweek_final_at_async(gameweek - 1)
+
+    previous_totals = {}
+    if previous_final_at is not None:
+        previous_totals = await previous_totals_async(league_id, gameweek, previous_final_at)
+
+    snapshot = await cache.load_snapshot_async(league_id, gameweek) if incremental else {}
+    sharded = shard[1] > 1
+    listed = 0  # Standings entries, in any shard
+    signatures = {}
+    reused = []
+    from_standings = []
+    from_archive = []
+    fetched = []
     processed_count = 0
+    unavailable = []
 
-    def fetch_manager_gw_data(manager):
+    # Runs on the single fetch-loop thread, so the shared counters need no lock.
+    async def fetch_manager_gw_data(row):
         nonlocal processed_count
         try:
-            team_id = manager['entry']
-            history = fetch_manager_history(team_id)
-
-            if history and len(history['current']) >= gameweek:
-                gw_points = history['current'][gameweek - 1]['points']
-                transfer_cost = history['current'][gameweek - 1]['event_transfers_cost']
-                net_points = gw_points - transfer_cost
-
-                result = {
-                    'manager_name': manager['entry_name'],
-                    'player_name': manager['player_name'],
-                    'team_id': manager['entry'],
-                    'gw_points': gw_points,
-                    'transfer_cost': transfer_cost,
-                    'net_points': net_points,
-                    'total_points': manager['total'],
-                    'overall_rank': manager['rank']
-                }
+            event = await fetch_history_points_async(row.team_id, gameweek, valid_after=final_at, refresh=refresh)
+            if event:
+                row.set_points(*event)
+                fetched.append(row)
+                if on_rows:
+                    on_rows([row], len(signatures))
+        except fetcher.UpstreamUnavailable:
+            unavailable.append(row.team_id)
+        except Exception as e:
+            print(f"Error processing manager {row.team_id}: {e}")
+
+        processed_count += 1
+        if processed_count % 50 == 0:
+            print(f"Progress: {processed_count}/{fan_out.queued} managers processed so far")
+
+    print(f"Starting async processing (adaptive, up to {fetcher.CONCURRENCY} concurrent requests)...\n")
 
-                processed_count += 1
-                if processed_count % 50 == 0:
-                    print(f"Progress: {processed_count}/{total_managers} managers processed ({int(processed_count/total_managers*100)}%)")
+    fan_out = fetcher.FanOut(fetch_manager_gw_data)
+    try:
+        with metrics.stage('leaderboard', 'pagination'):
+            async for _, page_data in iter_league_pages_async(league_id, incremental, await cache.league_pages_async(league_id)):
+                page_rows = []
+                results = page_data['standings']['results']
+                fast = {}
+                if previous_final_at is not None:
+                    fast = await rows_from_standings_async(
+                        [m for m in results if not sharded or shard_of(m['entry'], shard)],
+                        gameweek, previous_final_at, previous_totals,
+                    )
+                for manager in results:
+                    listed += 1
+                    if sharded and not shard_of(manager['entry'], shard):
+                        continue
+                    signatures[manager['entry']] = standings_signature(manager)
+                    previous = snapshot.pop(manager['entry'], None)
+                    if previous and previous['sig'] == signatures[manager['entry']]:
+                        row = records.ManagerRow.from_dict(previous['row'])
+                        reused.append(row)
+                        page_rows.append(row)
+                        continue
+                    points = archived_points.get(manager['entry'])
+                    if points is not None:
+                        row = leaderboard_row(manager, *points)
+                        from_archive.append(row)
+                        page_rows.append(row)
+                        continue
+                    row = fast.get(manager['entry'])
+                    if row:
+                        from_standings.append(row)
+                        page_rows.append(row)
+                        continue
+                    fan_out.put(leaderboard_row(manager, 0, 0))
+                if on_rows:
+                    on_rows(page_rows, len(signatures))
+
+        if not listed and archived is not None:
+            # Standings unavailable: the archive as built beats no leaderboard at all.
+            leaderboard = [row for row in archived.manager_rows() if shard_of(row.team_id, shard)]
+            print(f"Standings unavailable; served {len(leaderboard)} managers from {os.path.basename(archived.path)} as built")
+            if on_rows:
+                on_rows(leaderboard, len(leaderboard))
+            return leaderboard, None
+        if not listed:
+            return None, "Failed to fetch league data"
+
+        if incremental:
+            print(f"Incremental refresh: {len(reused)} unchanged")
+        if archived is not None:
+            print(f"Archived points for {len(from_archive)} managers from {os.path.basename(archived.path)}")
+        if previous_final_at is not None:
+            print(f"Current-GW fast path: {len(from_standings)} managers built from standings")
+        print(f"Managers to fetch: {fan_out.queued} of {len(signatures)}")
+
+        with metrics.stage('leaderboard', 'fan_out'):
+            await fan_out.join()
+    except StandingsIncomplete as e:
+        return None, str(e)
+    finally:
+        fan_out.cancel()
+    del snapshot
+
+    # Leaving throttled managers out would silently produce a wrong leaderboard.
+    # Everything fetched so far is cached, so a retry only asks for the missing ones.
+    if unavailable:
+        return None, (f"FPL API kept refusing requests for {len(unavailable)} managers. "
+                      f"Please try again in a minute.")
+
+    fetched.sort(key=lambda x: x.overall_rank or 0)  # Completion order -> standings order, for stable ties
+    leaderboard = reused + from_standings + from_archive + fetched
+
+    print(f"\nCompleted! Processed {processed_count}/{fan_out.queued} managers")
+
+    if not sharded:
+        # Encoded on the cache's writer thread; the copy keeps the sort below out of its way.
+        cache.save_snapshot(league_id, gameweek, (
+            (signatures[row.team_id], row.to_dict()) for row in leaderboard[:]
+        ))
+
+    # Default sort: by net points (descending). Ties are broken later on demand
+    # via /tiebreaker.
+    leaderboard.sort(key=lambda x: x.net_points, reverse=True)
+    if not sharded:
+        index = ranking.put(league_id, gameweek, leaderboard, final_at is not None)
+        if index.final and archive_outdated(archived, leaderboard):
+            await archive_leaderboard_async(index)
+
+    return leaderboard, None
 
-                return result
+
+def archive_outdated(archived, leaderboard):
+    """Whether a final leaderboard needs (re)writing: no archive yet, or the league's members changed."""
+    return archived is None or set(archived.team_ids.tolist()) != {row.team_id for row in leaderboard}
+
+
+def archive_leaderboard(index):
+    """Write a final leaderboard's archive file; a failed write only costs a rebuild next time."""
+    try:
+        print(f"Archived {archive.save_leaderboard(index)}")
+    except OSError as e:
+        print(f"Error archiving League {index.league_id}, GW{index.gameweek}: {e}")
+
+
+async def archive_leaderboard_async(index):
+    """archive_leaderboard from the fetch loop, writing the file on a thread."""
+    await asyncio.get_running_loop().run_in_executor(None, archive_leaderboard, index)
+
+
+def get_batch_leaderboards(league_ids, gameweek):
+    """
+    Leaderboards for several leagues at once. Standings for all leagues are paginated
+    together and every manager's history is fetched once, however many of the leagues
+    they are in. Returns ({league_id: leaderboard}, {league_id: error}, unique_managers).
+    """
+    print(f"\n{'='*80}")
+    print(f"Batch: Leagues {', '.join(map(str, league_ids))}, Gameweek {gameweek}")
+    print(f"{'='*80}\n")
+    return fetcher.run(_build_batch_async(league_ids, gameweek))
+
+
+async def _build_batch_async(league_ids, gameweek):
+    final_at = await gameweek_final_at_async(gameweek)
+    previous_final_at = None
+    if final_at is None and await current_gameweek_async() == gameweek:
+        previous_final_at = 0 if gameweek == 1 else await gameweek_final_at_async(gameweek - 1)
+
+    entries = {league_id: [] for league_id in league_ids}  # (row, points known)
+    queued = set()  # team_ids whose history is fetched once for every league
+    fetched = {}  # team_id -> (points, transfer_cost)
+    unavailable = set()
+    archives = {}  # league_id -> archive file holding its points (see archive.py)
+    incomplete = {}  # league_id -> why its standings couldn't be listed whole
+
+    async def fetch_points(team_id):
+        try:
+            event = await fetch_history_points_async(team_id, gameweek, valid_after=final_at)
+            if event:
+                fetched[team_id] = event
+        except fetcher.UpstreamUnavailable:
+            unavailable.add(team_id)
         except Exception as e:
-            print(f"Error processing manager {manager.get('entry')}: {e}")
+            print(f"Error processing manager {team_id}: {e}")
+
+    async def collect(league_id):
+        archived = archive.leaderboard(league_id, gameweek)
+        archived_points = {}
+        if archived is not None:
+            archives[league_id] = archived
+            archived_points = archived.points_by_team()
+        previous_totals = {}
+        if previous_final_at is not None:
+            previous_totals = await previous_totals_async(league_id, gameweek, previous_final_at)
+        try:
+            async for _, page_data in iter_league_pages_async(league_id, False, await cache.league_pages_async(league_id)):
+                results = page_data['standings']['results']
+                fast = {}
+                if previous_final_at is not None:
+                    fast = await rows_from_standings_async(
+                        [m for m in results if m['entry'] not in queued], gameweek, previous_final_at, previous_totals
+                    )
+                for manager in results:
+                    team_id = manager['entry']
+                    points = archived_points.get(team_id)
+                    row = leaderboard_row(manager, *points) if points is not None else fast.get(team_id)
+                    if row is not None:
+                        entries[league_id].append((row, True))
+                        continue
+                    if team_id not in queued:
+                        queued.add(team_id)
+                        fan_out.put(team_id)
+                    entries[league_id].append((records.ManagerRow.from_standings(manager), False))
+        except StandingsIncomplete as e:
+            incomplete[league_id] = str(e)
+
+    fan_out = fetcher.FanOut(fetch_points)
+    try:
+        with metrics.stage('batch', 'pagination'):
+            await asyncio.gather(*(collect(league_id) for league_id in league_ids))
+        total = sum(len(league_entries) for league_entries in entries.values())
+        print(f"Managers to fetch: {len(queued)} unique across {total} league entries")
+
+        with metrics.stage('batch', 'fan_out'):
+            await fan_out.join()
+    finally:
+        fan_out.cancel()
+
+    leaderboards, errors = {}, {}
+    for league_id, league_entries in entries.items():
+        if league_id in incomplete:
+            errors[league_id] = incomplete[league_id]
+            continue
+        if not league_entries and league_id in archives:
+            # Standings unavailable: the archive as built beats no leaderboard at all.
+            leaderboards[league_id] = archives[league_id].manager_rows()
+            continue
+        if not league_entries:
+            errors[league_id] = "Failed to fetch league data"
+            continue
+        missing = sum(1 for row, _ in league_entries if row.team_id in unavailable)
+        if missing:
+            errors[league_id] = (f"FPL API kept refusing requests for {missing} managers. "
+                                 f"Please try again in a minute.")
+            continue
+
+        leaderboard = []
+        for row, known in league_entries:
+            if not known:
+                points = fetched.get(row.team_id)
+                if points is None:
+                    continue
+                row.set_points(*points)
+            leaderboard.append(row)
+        leaderboards[league_id] = leaderboard
+        leaderboard.sort(key=lambda x: x.net_points, reverse=True)
+        index = ranking.put(league_id, gameweek, leaderboard, final_at is not None)
+        if index.final and archive_outdated(archives.get(league_id), leaderboard):
+            await archive_leaderboard_async(index)
+
+    unique = len({row.team_id for league_entries in entries.values() for row, _ in league_entries})
+    return leaderboards, errors, unique
+
+
+def get_live_leaderboard(league_id, gameweek):
+    """
+    Leaderboard for a gameweek in progress, scored locally from picks and the shared
+    live stats (see livepoints.py) instead of the lagging entry histories. Picks are
+    fixed at the deadline and cached from then on, so after the first run a refresh
+    costs the standings pages plus one live-stats call for the whole league.
+    """
+    print(f"\n{'='*80}")
+    print(f"Live scoring: League {league_id}, Gameweek {gameweek}")
+    print(f"{'='*80}\n")
+    return fetcher.run(_build_live_leaderboard_async(league_id, gameweek))
 
-        processed_count += 1
-        return None
 
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        futures = [executor.submit(fetch_manager_gw_data, mgr) for mgr in managers]
+async def _build_live_leaderboard_async(league_id, gameweek):
+    deadline = await gameweek_deadline_async(gameweek)
+    if deadline is None or deadline > time.time():
+        return None, f"Gameweek {gameweek} hasn't started yet"
 
-        for future in as_completed(futures):
-            result = future.result()
-            if result:
-                leaderboard.append(result)
+    live = await livestats.get_async(gameweek)
+    managers = []
+    picks_by_team = {}
+    unavailable = []
 
-    print(f"\nCompleted! Processed {processed_count}/{total_managers} managers")
+    async def fetch_picks(team_id):
+        try:
+            picks_by_team[team_id] = await fetch_picks_fields_async(team_id, gameweek, valid_after=deadline)
+        except fetcher.UpstreamUnavailable:
+            unavailable.append(team_id)
+        except Exception as e:
+            print(f"Error fetching picks for {team_id}: {e}")
 
-    # Default sort: by net points (descending). Ties are broken later on demand
-    # via /tiebreaker for the top 15.
-    leaderboard.sort(key=lambda x: x['net_points'], reverse=True)
+    fan_out = fetcher.FanOut(fetch_picks)
+    try:
+        with metrics.stage('live', 'pagination'):
+            async for _, page_data in iter_league_pages_async(league_id, True, await cache.league_pages_async(league_id)):
+                for manager in page_data['standings']['results']:
+                    managers.append(leaderboard_row(manager, 0, 0))
+                    fan_out.put(manager['entry'])
+
+        if not managers:
+            return None, "Failed to fetch league data"
+
+        with metrics.stage('live', 'fan_out'):
+            await fan_out.join()
+    except StandingsIncomplete as e:
+        return None, str(e)
+    finally:
+        fan_out.cancel()
+    if unavailable:
+        return None, (f"FPL API kept refusing requests for {len(unavailable)} managers. "
+                      f"Please try again in a minute.")
+
+    picks = tiebreak.PicksMatrix({row.team_id: picks_by_team.get(row.team_id) for row in managers})
+    del picks_by_team
+    scores = {name: values.tolist() for name, values in livepoints.score(picks, live.stats).items()}
 
+    leaderboard = []
+    for i, row in enumerate(managers):
+        if not picks.has_picks[i]:
+            continue  # Joined after the deadline: no team this gameweek
+        row.set_points(scores['gw_points'][i], scores['transfer_cost'][i])
+        row.auto_subs = scores['auto_subs'][i]
+        leaderboard.append(row)
+
+    print(f"Scored {len(leaderboard)} managers against live stats version {live.version}")
+    leaderboard.sort(key=lambda x: x.net_points, reverse=True)
     return leaderboard, None
 
 
+def _ndjson(message):
+    return json.dumps(message, separators=(',', ':'), default=records.json_default) + '\n'
+
+
+class SharedBuild:
+    """
+    One leaderboard build on the fetch loop that any number of readers follow, so a
+    streamed request, a job and a plain /process for the same league share the
+    fan-out. Every reader sees all row batches from the start, whenever it joined.
+    The build is cancelled once its last reader leaves before it has finished.
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self.batches = []  # (rows, seen) in arrival order
+        self.done = False
+        self.readers = 0
+        self.future = None
+        self.cond = threading.Condition()
+
+    def add(self, rows, seen):
+        with self.cond:
+            self.batches.append((rows, seen))
+            self.cond.notify_all()
+
+    def finish(self, _):
+        with self.cond:
+            self.done = True
+            self.cond.notify_all()
+        with _builds_lock:
+            if _builds.get(self.key) is self:
+                del _builds[self.key]
+
+    def wait(self):
+        """(leaderboard, error) once the build is done."""
+        return self.future.result()
+
+    def leave(self):
+        with _builds_lock:
+            self.readers -= 1
+            if self.readers == 0 and not self.done:
+                self.future.cancel()
+                if _builds.get(self.key) is self:
+                    del _builds[self.key]
+
+
+_builds = {}  # (league_id, gameweek, shard) -> SharedBuild
+_builds_lock = threading.RLock()  # finish() may run inside join_build if the build is already done
+
+
+def join_build(league_id, gameweek, incremental=False, shard=(0, 1)):
+    """The in-flight build for this league, gameweek and shard, started if there is none. Call leave() when done."""
+    key = (league_id, gameweek, shard)
+    with _builds_lock:
+        build = _builds.get(key)
+        if build is None:
+            build = _builds[key] = SharedBuild(key)
+            build.future = fetcher.submit(_build_leaderboard_async(
+                league_id, gameweek, incremental, on_rows=build.add, shard=shard
+            ))
+            build.future.add_done_callback(build.finish)
+        else:
+            print(f"Joining in-flight build for {key}")
+        build.readers += 1
+    return build
+
+
+def iter_leaderboard_batches(league_id, gameweek, incremental=False, shard=(0, 1)):
+    """
+    Follow a leaderboard build (see join_build) from the calling thread, yielding its
+    rows as they complete: ('rows', batch, received, seen) for every STREAM_INTERVAL's
+    worth of rows, then a final ('done', leaderboard, error). Closing the generator
+    early cancels any fetches still running, unless someone else is following them.
+    """
+    build = join_build(league_id, gameweek, incremental, shard)
+    received = 0
+    position = 0
+    try:
+        finished = False
+        while not finished:
+            # Fold everything that arrives within STREAM_INTERVAL into one batch.
+            batch, seen, deadline = [], None, None
+            with build.cond:
+                while True:
+                    for rows, seen in build.batches[position:]:
+                        batch.extend(rows)
+                    if position < len(build.batches) and deadline is None:
+                        deadline = time.monotonic() + STREAM_INTERVAL
+                    position = len(build.batches)
+                    finished = build.done
+                    if finished or len(batch) >= STREAM_BATCH:
+                        break
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        break
+                    build.cond.wait(remaining)
+            if seen is not None:
+                received += len(batch)
+                yield 'rows', batch, received, seen
+
+        leaderboard, error = build.wait()
+        yield 'done', leaderboard, error
+    finally:
+        build.leave()
+
+
+def stream_leaderboard(league_id, gameweek, incremental=False):
+    """
+    NDJSON generator behind /process with "stream": true. Emits
+      {"type": "rows", "rows": [...], "received": n, "seen": m}  as managers complete
+      {"type": "done", "status": "completed", ...}               once everything is in
+      {"type": "error", "error": "..."}                          on failure
+    Rows arrive in completion order; the client does the final sort.
+    """
+    batches = iter_leaderboard_batches(league_id, gameweek, incremental)
+    try:
+        for kind, *payload in batches:
+            if kind == 'rows':
+                batch, received, seen = payload
+                yield _ndjson({'type': 'rows', 'rows': batch, 'received': received, 'seen': seen})
+                continue
+
+            leaderboard, error = payload
+            if error:
+                yield _ndjson({'type': 'error', 'error': error})
+                return
+
+            print(f"\nSTREAM COMPLETE! Sent {len(leaderboard)} managers")
+            yield _ndjson({
+                'type': 'done',
+                'status': 'completed',
+                'gameweek': gameweek,
+                'league_id': league_id,
+                'total_managers': len(leaderboard),
+            })
+    except Exception as e:
+        print(f"\nSTREAM ERROR: {str(e)}")
+        yield _ndjson({'type': 'error', 'error': str(e)})
+    finally:
+        # Client went away (or we're done): stop any fetches still running.
+        batches.close()
+
+
+def run_leaderboard_job(job):
+    """jobs.py runner: compute a leaderboard, recording rows on the job as they arrive."""
+    print(f"\n{'='*80}")
+    print(f"Running job {job['id']}: GW{job['gameweek']}, League {job['league_id']}")
+    print(f"{'='*80}\n")
+    batches = iter_leaderboard_batches(
+        job['league_id'], job['gameweek'], job['incremental'], (job['shard_index'], job['shard_count'])
+    )
+    for kind, *payload in batches:
+        if kind == 'rows':
+            batch, received, seen = payload
+            jobs.add_rows(job['id'], [row.to_dict() for row in batch], received, seen)
+        else:
+            return payload
+
+
 def enrich_with_tiebreaker(team_ids, gameweek):
     """
-    For the given team_ids (expected: top 15 from the league), fetch picks in parallel,
-    fetch event/{gw}/live/ once, and compute tiebreaker fields for each.
-    Returns a list of dicts keyed by team_id.
+    For the given team_ids (up to a whole league), fetch picks concurrently, fetch
+    event/{gw}/live/ once, and compute tiebreaker fields for all of them in bulk
+    (see tiebreak.py). Returns a dict of field dicts keyed by team_id.
     """
     print(f"\n{'='*80}")
     print(f"Tiebreaker enrichment: GW{gameweek}, {len(team_ids)} managers")
     print(f"{'='*80}\n")
 
-    # One shared call for all per-player stats this GW.
-    event_live = fetch_event_live(gameweek)
-    live_stats_map = build_live_stats_map(event_live)
-    if not live_stats_map:
-        print("Warning: empty live stats map — goals/assists/captain points will be 0")
+    final_at = gameweek_final_at(gameweek)
 
-    enriched = {}
+    # Player stats are shared by every league and request for this GW.
+    stats = livestats.get(gameweek).stats
+    if not len(stats):
+        print("Warning: empty live stats — goals/assists/captain points will be 0")
 
-    def fetch_and_compute(team_id):
-        picks = fetch_manager_picks(team_id, gameweek)
-        fields = compute_tiebreaker_fields(picks, live_stats_map)
-        return team_id, fields
+    picks_by_team = {}
 
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        futures = [executor.submit(fetch_and_compute, tid) for tid in team_ids]
-        for future in as_completed(futures):
-            try:
-                team_id, fields = future.result()
-                enriched[team_id] = fields
-            except Exception as e:
-                print(f"Error in tiebreaker fetch: {e}")
+    async def fetch_picks(team_id):
+        try:
+            picks_by_team[team_id] = await fetch_picks_fields_async(team_id, gameweek, valid_after=final_at)
+        except fetcher.UpstreamUnavailable:
+            raise
+        except Exception as e:
+            print(f"Error in tiebreaker fetch: {e}")
+
+    async def fetch_all():
+        fan_out = fetcher.FanOut(fetch_picks)
+        for tid in team_ids:
+            fan_out.put(tid)
+        await fan_out.join()
+
+    with metrics.stage('tiebreaker', 'fan_out'):
+        fetcher.run(fetch_all())
+
+    with metrics.stage('tiebreaker', 'compute'):
+        picks = tiebreak.PicksMatrix({tid: picks_by_team.get(tid) for tid in team_ids})
+        return tiebreak.fields_by_team(picks, tiebreak.evaluate(picks, stats))
+
+
+def compare_rivals(team_ids, gameweek):
+    """
+    Head-to-head diffs for a few managers (see rivals.py). Returns (comparison, live, error):
+    picks are cached from the deadline on and the live stats are shared, so a warm
+    comparison fetches nothing.
+    """
+    return fetcher.run(_compare_rivals_async(team_ids, gameweek))
 
-    return enriched
+
+async def _compare_rivals_async(team_ids, gameweek):
+    final_at = await gameweek_final_at_async(gameweek)
+    valid_after = final_at
+    if final_at is None:
+        valid_after = await gameweek_deadline_async(gameweek)
+        if valid_after is None or valid_after > time.time():
+            return None, None, f"Gameweek {gameweek} hasn't started yet"
+
+    with metrics.stage('rivals', 'fetch'):
+        try:
+            live, *picks_list = await asyncio.gather(
+                livestats.get_async(gameweek),
+                *(fetch_picks_fields_async(team_id, gameweek, valid_after=valid_after) for team_id in team_ids),
+            )
+        except fetcher.UpstreamUnavailable:
+            return None, None, "FPL API kept refusing requests. Please try again in a minute."
+
+    with metrics.stage('rivals', 'compute'):
+        picks = tiebreak.PicksMatrix(dict(zip(team_ids, picks_list)))
+        return rivals.compare(picks, live.stats), live, None
+
+
+def get_season_table(league_id, first_gameweek, last_gameweek):
+    """
+    Leaderboards for every gameweek in [first_gameweek, last_gameweek] from a single
+    history fetch per manager. Returns (season.SeasonMatrix, error).
+    """
+    print(f"\n{'='*80}")
+    print(f"Season table: League {league_id}, GW{first_gameweek}-{last_gameweek}")
+    print(f"{'='*80}\n")
+    return fetcher.run(_build_season_table_async(league_id, first_gameweek, last_gameweek))
+
+
+async def _build_season_table_async(league_id, first_gameweek, last_gameweek):
+    # Histories stored after the last gameweek of the range went final already hold
+    # every row we need, so a finished range is served from the cache. Its points
+    # may be archived too; today's standings still decide who is listed.
+    final_at = await gameweek_final_at_async(last_gameweek)
+    archived = None
+    if final_at is not None:
+        archived = archive.season_matrix(league_id, first_gameweek, last_gameweek)
+
+    managers = []
+    rows_by_team = {}
+    unavailable = []
+
+    async def fetch_history(team_id):
+        try:
+            rows = await fetch_parsed_async(manager_history_url(team_id), extract.history_range,
+                                            first_gameweek, last_gameweek,
+                                            ttl=cache.TTL_HISTORY, valid_after=final_at)
+            rows_by_team[team_id] = rows or []
+        except fetcher.UpstreamUnavailable:
+            unavailable.append(team_id)
+        except Exception as e:
+            print(f"Error fetching history for {team_id}: {e}")
+
+    fan_out = fetcher.FanOut(fetch_history)
+    try:
+        with metrics.stage('season', 'pagination'):
+            async for _, page_data in iter_league_pages_async(league_id, False, await cache.league_pages_async(league_id)):
+                for manager in page_data['standings']['results']:
+                    managers.append(records.ManagerRow.from_standings(manager))
+
+        if not managers and archived is not None:
+            print(f"Standings unavailable; served {len(archived.managers)} managers from the season archive as built")
+            return archived, None
+        if not managers:
+            return None, "Failed to fetch league data"
+
+        if archived is not None:
+            matrix, missing = archived.reindexed(managers)
+            print(f"Archived points for {len(managers) - len(missing)} managers")
+        else:
+            matrix, missing = None, [manager.team_id for manager in managers]
+        for team_id in missing:
+            fan_out.put(team_id)
+
+        with metrics.stage('season', 'fan_out'):
+            await fan_out.join()
+    except StandingsIncomplete as e:
+        return None, str(e)
+    finally:
+        fan_out.cancel()
+    if unavailable:
+        return None, (f"FPL API kept refusing requests for {len(unavailable)} managers. "
+                      f"Please try again in a minute.")
+
+    print(f"Fetched {len(rows_by_team)} histories for {len(managers)} managers")
+    if matrix is None:
+        matrix = season.SeasonMatrix(managers, rows_by_team, range(first_gameweek, last_gameweek + 1))
+    else:
+        matrix.fill(rows_by_team)
+    members_changed = archived is not None and (missing or len(managers) - len(missing) != len(archived.managers))
+    if final_at is not None and (archived is None or members_changed):
+        await asyncio.get_running_loop().run_in_executor(None, archive_season, league_id, matrix, members_changed)
+    return matrix, None
+
+
+def archive_season(league_id, matrix, replace=False):
+    """Write a final season matrix's archive file; like archive_leaderboard, failures only cost a rebuild."""
+    try:
+        archive.save_season(league_id, matrix, replace)
+    except OSError as e:
+        print(f"Error archiving season for League {league_id}: {e}")
+
+
+def prefetch_plan(leagues):
+    """
+    Prefetch work for the configured leagues, from the gameweek calendar:
+      * once the latest gameweek is final (finished, bonus confirmed): every league's
+        leaderboard (histories, cached permanently from then on), then its tiebreaker
+        picks and live stats;
+      * once a gameweek's deadline has passed: every league's picks for it (they can't
+        change any more) and the shared live stats, so live scoring starts warm.
+    """
+    bootstrap = fetcher.run(fetch_bootstrap_async())
+    events = (bootstrap or {}).get('events', [])
+    now = time.time()
+
+    final = [e['id'] for e in events if e.get('finished') and e.get('data_checked')]
+    started = [e['id'] for e in events if e['id'] not in final and (deadline_timestamp(e) or now + 1) <= now]
+
+    items = []
+    if final:
+        gameweek = max(final)
+        items += [(f"leaderboard:{gameweek}:{league_id}", _prefetch_leaderboard, (league_id, gameweek))
+                  for league_id in leagues]
+        items += [(f"tiebreaker:{gameweek}:{league_id}", _prefetch_tiebreaker, (league_id, gameweek))
+                  for league_id in leagues]
+    if started:
+        gameweek = max(started)
+        items += [(f"picks:{gameweek}:{league_id}", _prefetch_live, (league_id, gameweek))
+                  for league_id in leagues]
+    return items
+
+
+def _prefetch_leaderboard(league_id, gameweek):
+    leaderboard, error = get_gw_leaderboard(league_id, gameweek)
+    if error:
+        raise RuntimeError(error)
+    return leaderboard
+
+
+def _prefetch_tiebreaker(league_id, gameweek):
+    # The leaderboard comes straight from the cache after _prefetch_leaderboard.
+    leaderboard = _prefetch_leaderboard(league_id, gameweek)
+    enrich_with_tiebreaker([row.team_id for row in leaderboard], gameweek)
+
+
+def _prefetch_live(league_id, gameweek):
+    _, error = get_live_leaderboard(league_id, gameweek)
+    if error:
+        raise RuntimeError(error)
+
+
+def rows_out(rows):
+    """A row list in the layout the caller asked for (see wire.py)."""
+    return wire.columnar(rows) if wire.wants_columnar(request.headers) else rows
+
+
+def shard_from(data):
+    """The (index, count) shard a request asks for with "shard": [index, count]; (0, 1) is the whole league."""
+    index, count = (int(n) for n in data.get('shard') or (0, 1))
+    if not 0 <= index < count:
+        raise ValueError(f'Invalid shard {index}/{count}')
+    return index, count
+
+
+def with_gameweek_final(response, final):
+    """Tell caches in front of the worker (the UI proxy) whether this data can still change."""
+    response.headers['X-Gameweek-Final'] = 'true' if final else 'false'
+    return response
+
+
+@app.after_request
+def compress_response(response):
+    return wire.compress_response(response, request.accept_encodings)
 
 
 @app.route('/process', methods=['POST'])
 def process():
-    """Main processing endpoint — returns the full leaderboard sorted by net points."""
+    """
+    Main processing endpoint — returns the full leaderboard sorted by net points.
+    Pass "incremental": true to refresh from the last snapshot (live-GW polling),
+    "live": true to score the gameweek in progress from picks and live stats (see
+    get_live_leaderboard), and "stream": true to get NDJSON rows as they complete
+    (see stream_leaderboard). "shard": [index, count] builds only that manager-ID
+    shard of the league (not with live or stream).
+    """
     try:
         data = request.get_json()
         gameweek = int(data['gameweek'])
         league_id = int(data['league_id'])
+        incremental = bool(data.get('incremental', False))
+        shard = shard_from(data)
 
         print(f"\n{'='*80}")
         print(f"Received request: GW{gameweek}, League {league_id}")
         print(f"Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         print(f"{'='*80}")
 
-        leaderboard_data, error = get_gw_leaderboard(league_id, gameweek)
+        if data.get('live'):
+            leaderboard_data, error = singleflight.do(
+                ('live', league_id, gameweek), get_live_leaderboard, league_id, gameweek
+            )
+            if error:
+                print(f"\nError: {error}")
+                return jsonify({'error': error}), 400
+            live = livestats.peek(gameweek)
+            return with_gameweek_final(jsonify({
+                'status': 'completed',
+                'gameweek': gameweek,
+                'league_id': league_id,
+                'live': True,
+                'live_version': live.version if live else None,
+                'gameweek_final': False,
+                'leaderboard': rows_out(leaderboard_data),
+                'total_managers': len(leaderboard_data)
+            }), False)
+
+        if data.get('stream'):
+            return Response(
+                stream_with_context(stream_leaderboard(league_id, gameweek, incremental)),
+                mimetype='application/x-ndjson',
+            )
+
+        # Concurrent requests for the same league/GW share one computation, streamed ones included.
+        if shard[1] > 1:
+            leaderboard_data, error = singleflight.do(
+                ('process', league_id, gameweek, incremental, shard),
+                get_gw_leaderboard, league_id, gameweek, incremental, shard,
+            )
+        else:
+            leaderboard_data, error = singleflight.do(
+                ('process', league_id, gameweek, incremental), get_gw_leaderboard, league_id, gameweek, incremental
+            )
 
         if error:
             print(f"\nError: {error}")
             return jsonify({'error': error}), 400
 
+        final = gameweek_final_at(gameweek) is not None
         result = {
             'status': 'completed',
             'gameweek': gameweek,
             'league_id': league_id,
-            'leaderboard': leaderboard_data,
+            'gameweek_final': final,
+            'leaderboard': rows_out(leaderboard_data),
             'total_managers': len(leaderboard_data)
         }
+        if shard[1] > 1:
+            result['shard'] = list(shard)
 
         print(f"\n{'='*80}")
         print(f"SUCCESS! Returning {len(leaderboard_data)} managers")
         print(f"{'='*80}\n")
 
-        return jsonify(result)
+        return with_gameweek_final(jsonify(result), final)
 
     except Exception as e:
         print(f"\nERROR: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/batch', methods=['POST'])
+def batch():
+    """
+    Leaderboards for several (typically overlapping) leagues in one pass; each
+    manager is fetched once however many of the leagues they are in.
+    Expected payload: {"gameweek": 12, "league_ids": [208271, 123456]}
+    """
+    try:
+        data = request.get_json()
+        gameweek = int(data['gameweek'])
+        league_ids = list(dict.fromkeys(int(league_id) for league_id in data['league_ids']))
+
+        if not league_ids:
+            return jsonify({'error': 'No leagues provided'}), 400
+
+        leaderboards, errors, unique = singleflight.do(
+            ('batch', gameweek, tuple(sorted(league_ids))), get_batch_leaderboards, league_ids, gameweek
+        )
+
+        print(f"\n{'='*80}")
+        print(f"BATCH SUCCESS! {len(leaderboards)} leagues, {unique} unique managers")
+        print(f"{'='*80}\n")
+
+        return jsonify({
+            'status': 'completed',
+            'gameweek': gameweek,
+            'unique_managers': unique,
+            'leagues': [
+                {'league_id': league_id, 'error': errors[league_id]} if league_id in errors else {
+                    'league_id': league_id,
+                    'leaderboard': rows_out(leaderboards[league_id]),
+                    'total_managers': len(leaderboards[league_id]),
+                }
+                for league_id in league_ids
+            ],
+        })
+
+    except Exception as e:
+        print(f"\nBATCH ERROR: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """
+    Queue a leaderboard job and return its id immediately (202). A league/GW that
+    already has a queued, running or recently finished job gets that job back.
+    Expected payload: {"gameweek": 12, "league_id": 208271, "incremental": false}
+    plus optionally "shard": [index, count] for one manager-ID shard of the league.
+    """
+    try:
+        data = request.get_json()
+        gameweek = int(data['gameweek'])
+        league_id = int(data['league_id'])
+        incremental = bool(data.get('incremental', False))
+        shard = shard_from(data)
+
+        job_id, created = jobs.submit(league_id, gameweek, incremental, shard)
+        print(f"{'Queued' if created else 'Reusing'} job {job_id}: GW{gameweek}, League {league_id}"
+              f"{f', shard {shard[0] + 1}/{shard[1]}' if shard[1] > 1 else ''}")
+
+        job = jobs.describe(job_id)
+        job['rows'] = rows_out(job['rows'])
+        response = jsonify(job)
+        response.headers['X-Job-Id'] = job_id  # Lets the UI proxy remember which worker holds the job
+        return response, 202
+
+    except jobs.QueueFull as e:
+        return jsonify({'error': str(e)}), 429
+
+    except Exception as e:
+        print(f"\nJOB SUBMIT ERROR: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Poll a job. Returns progress plus rows added since batch ?since=N (use `next` for the next poll)."""
+    since = request.args.get('since', 0, type=int)
+    job = jobs.describe(job_id, since)
+    if job is None:
+        return jsonify({'error': 'Job not found or expired'}), 404
+    job['rows'] = rows_out(job['rows'])
+    response = jsonify(job)
+    # Lets the UI proxy notice a finished job (and cache its result) without parsing the body.
+    response.headers['X-Job-Status'] = job['status']
+    response.headers['X-League-Id'] = str(job['league_id'])
+    response.headers['X-Gameweek'] = str(job['gameweek'])
+    return response
+
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    """Full result of a completed job, in the same shape as /process."""
+    job = jobs.describe(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found or expired'}), 404
+    if job['status'] != 'completed':
+        return jsonify({'error': f"Job is {job['status']}", 'status': job['status']}), 409
+
+    leaderboard = sorted(job['rows'], key=lambda x: x['net_points'], reverse=True)
+    final = gameweek_final_at(job['gameweek']) is not None
+    return with_gameweek_final(jsonify({
+        'status': 'completed',
+        'gameweek': job['gameweek'],
+        'league_id': job['league_id'],
+        'gameweek_final': final,
+        'leaderboard': rows_out(leaderboard),
+        'total_managers': len(leaderboard)
+    }), final)
+
+
+@app.route('/season', methods=['POST'])
+def season_table():
+    """
+    Gameweek leaderboards for a range (default: the whole season so far) in one pass.
+    Expected payload: {"league_id": 208271, "from_gameweek": 1, "to_gameweek": 38}
+    Returns manager x gameweek matrices (see season.SeasonMatrix.to_dict).
+    """
+    try:
+        data = request.get_json()
+        league_id = int(data['league_id'])
+        first_gameweek = int(data.get('from_gameweek') or 1)
+        last_gameweek = int(data.get('to_gameweek') or current_gameweek() or 38)
+
+        if not 1 <= first_gameweek <= last_gameweek <= 38:
+            return jsonify({'error': 'Gameweek range must be within 1-38 and from <= to'}), 400
+
+        matrix, error = singleflight.do(
+            ('season', league_id, first_gameweek, last_gameweek),
+            get_season_table, league_id, first_gameweek, last_gameweek
+        )
+        if error:
+            print(f"\nError: {error}")
+            return jsonify({'error': error}), 400
+
+        return jsonify({
+            'status': 'completed',
+            'league_id': league_id,
+            'total_managers': len(matrix.managers),
+            **matrix.to_dict(),
+        })
+
+    except Exception as e:
+        print(f"\nSEASON ERROR: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
+def tiebroken_index(index):
+    """The leaderboard behind a ranking index in tiebreaker-cascade order, enriching it if needed."""
+    tiebroken = ranking.get_tiebreak(index)
+    if tiebroken is None:
+        team_ids = [row.team_id for row in index.manager_rows()]
+        fields = singleflight.do(
+            ('tiebreaker', index.gameweek, frozenset(team_ids)), enrich_with_tiebreaker, team_ids, index.gameweek
+        )
+        tiebroken = ranking.put_tiebreak(index, fields)
+    return tiebroken
+
+
+@app.route('/rankings', methods=['POST'])
+def rankings():
+    """
+    Sorted slices of a league/GW leaderboard from its ranking index (see ranking.py),
+    building the leaderboard first if there is no fresh index.
+    Expected payload: {"league_id": 208271, "gameweek": 12, "sort": "total_points",
+                       "page": 3, "page_size": 50, "team_id": 123}
+    sort is net_points (default), gw_points, total_points or tiebreak; "top": N is
+    page 1 of size N. Rows carry their rank in that sort and the size of their tie
+    group ("tied"). With team_id, "team" holds that manager's row and their rank, tie
+    group and page in every sort, and without a page the page returned is theirs.
+    tiebreak is the full tiebreaker cascade (see /tiebreaker) over the whole league;
+    its rows also carry the tiebreaker fields. The first tiebreak request for a
+    leaderboard fetches every manager's picks.
+    """
+    try:
+        data = request.get_json()
+        league_id = int(data['league_id'])
+        gameweek = int(data['gameweek'])
+        sort = data.get('sort') or 'net_points'
+        page = int(data.get('page') or 1)
+        team_id = int(data['team_id']) if data.get('team_id') is not None else None
+        page_size = int(data.get('top') or data.get('page_size') or 50)
+
+        sorts = ranking.SORT_FIELDS + (ranking.TIEBREAK,)
+        if sort not in sorts:
+            return jsonify({'error': f"sort must be one of {', '.join(sorts)}"}), 400
+        if page < 1 or not 1 <= page_size <= ranking.MAX_PAGE_SIZE:
+            return jsonify({'error': f'page must be >= 1 and page_size within 1-{ranking.MAX_PAGE_SIZE}'}), 400
+
+        index = ranking.get(league_id, gameweek)
+        metrics.inc('fpl_ranking_lookups_total', result='miss' if index is None else 'hit')
+        if index is None:
+            # Building the leaderboard indexes it as a side effect; shared with incremental /process calls.
+            _, error = singleflight.do(
+                ('process', league_id, gameweek, True), get_gw_leaderboard, league_id, gameweek, True
+            )
+            if error:
+                print(f"\nError: {error}")
+                return jsonify({'error': error}), 400
+            index = ranking.get(league_id, gameweek)
+
+        tiebroken = tiebroken_index(index) if sort == ranking.TIEBREAK else None
+        team = index.rank_of(team_id, page_size) if team_id is not None else None
+        if team and tiebroken is not None:
+            team['ranks'][sort] = tiebroken.rank_of(team_id, page_size)
+        if team and not data.get('page'):
+            page = team['ranks'][sort]['page']
+
+        result = {
+            **index.describe(),
+            'sort': sort,
+            'page': page,
+            'page_size': page_size,
+            'pages': -(-len(index) // page_size),
+            'rows': rows_out(tiebroken.page(page, page_size) if tiebroken is not None
+                             else index.page(sort, page, page_size)),
+        }
+        if team_id is not None:
+            result['team'] = team
+        return with_gameweek_final(jsonify(result), index.final)
+
+    except Exception as e:
+        print(f"\nRANKINGS ERROR: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/rankings/index', methods=['POST'])
+def import_ranking_index():
+    """
+    Index a leaderboard built elsewhere — the UI proxy's merge of a sharded league —
+    so /rankings can page it without rebuilding the whole league here.
+    Expected payload: {"league_id": 208271, "gameweek": 12, "leaderboard": [row, ...]}
+    """
+    try:
+        data = request.get_json()
+        league_id = int(data['league_id'])
+        gameweek = int(data['gameweek'])
+        rows = [records.ManagerRow.from_dict(row) for row in data['leaderboard']]
+
+        final = gameweek_final_at(gameweek) is not None
+        index = ranking.put(league_id, gameweek, rows, final)
+        print(f"Imported ranking index: League {league_id}, GW{gameweek}, {len(index)} managers")
+        if final:
+            archive_leaderboard(index)
+        return with_gameweek_final(jsonify(index.describe()), final)
+
+    except Exception as e:
+        print(f"\nRANKING IMPORT ERROR: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/archive', methods=['GET'])
+def archive_listing():
+    """The archive files of finished leaderboards and season matrices (see archive.py)."""
+    return jsonify({'files': archive.listing()})
+
+
+@app.route('/archive/<name>', methods=['GET'])
+def archive_file(name):
+    """One archive file as stored, for copying to the UI proxy's ARCHIVE_DIR."""
+    return send_from_directory(archive.ARCHIVE_DIR, name, mimetype='application/octet-stream')
+
+
+@app.route('/leagues/<int:league_id>', methods=['GET'])
+def league_info(league_id):
+    """What this worker knows about a league's size, from its last full standings pagination."""
+    pages = cache.league_pages(league_id)
+    return jsonify({'league_id': league_id, 'pages': pages, 'managers_estimate': pages * STANDINGS_PAGE_SIZE})
+
+
 @app.route('/tiebreaker', methods=['POST'])
 def tiebreaker():
     """
-    Enrich a list of team_ids (top 15) with tiebreaker data and return them
-    re-sorted by the full cascade:
+    Enrich a list of managers (anything up to the whole league) with tiebreaker data
+    and return them re-sorted by the full cascade:
       net_points → no_chip_bonus → goals → assists → captain → vice-captain
     All descending (higher = better; no_chip_bonus is 1 for no-chip, 0 for chip).
 
@@ -300,6 +1568,7 @@ def tiebreaker():
         ...
       ]
     }
+    Only team_id and net_points are needed; any other fields are echoed back.
     """
     try:
         data = request.get_json()
@@ -310,44 +1579,24 @@ def tiebreaker():
             return jsonify({'error': 'No managers provided'}), 400
 
         team_ids = [int(m['team_id']) for m in managers]
-        enriched_map = enrich_with_tiebreaker(team_ids, gameweek)
+        enriched_map = singleflight.do(
+            ('tiebreaker', gameweek, frozenset(team_ids)), enrich_with_tiebreaker, team_ids, gameweek
+        )
 
-        # Merge enrichment back onto each manager row.
-        enriched_managers = []
+        # Merge enrichment onto each manager row in place, then apply the full cascade.
         for m in managers:
-            tid = int(m['team_id'])
-            extra = enriched_map.get(tid, {
-                'chip_played': False,
-                'no_chip_bonus': 1,
-                'starters_goals': 0,
-                'starters_assists': 0,
-                'captain_points': 0,
-                'vice_captain_points': 0,
-                'active_chip': None,
-            })
-            merged = {**m, **extra}
-            enriched_managers.append(merged)
-
-        # Full tiebreaker cascade. Tuple sort compares left→right.
-        enriched_managers.sort(
-            key=lambda x: (
-                x.get('net_points', 0),
-                x.get('no_chip_bonus', 1),
-                x.get('starters_goals', 0),
-                x.get('starters_assists', 0),
-                x.get('captain_points', 0),
-                x.get('vice_captain_points', 0),
-            ),
-            reverse=True,
-        )
+            m.update(enriched_map.get(int(m['team_id']), tiebreak.DEFAULT_FIELDS))
+        enriched_managers = [managers[i] for i in tiebreak.cascade_order(managers)]
 
         print(f"\n{'='*80}")
         print(f"TIEBREAKER SUCCESS! Returning {len(enriched_managers)} enriched managers")
         print(f"{'='*80}\n")
 
+        live = livestats.peek(gameweek)
         return jsonify({
             'status': 'completed',
             'gameweek': gameweek,
+            'live_version': live.version if live else None,
             'managers': enriched_managers,
         })
 
@@ -356,19 +1605,115 @@ def tiebreaker():
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/rivals', methods=['POST'])
+def rivals_diff():
+    """
+    Compare two or more managers in a gameweek, live or finished: differential
+    players, captaincy swing and chip impact (see rivals.py). The first team is
+    "you" and head_to_head compares it with each of the others.
+    Expected payload: {"gameweek": 20, "team_ids": [123, 456, 789]}
+    """
+    try:
+        data = request.get_json()
+        gameweek = int(data['gameweek'])
+        team_ids = list(dict.fromkeys(int(team_id) for team_id in data.get('team_ids') or ()))
+
+        if not 2 <= len(team_ids) <= MAX_RIVALS:
+            return jsonify({'error': f'team_ids must list 2-{MAX_RIVALS} different managers'}), 400
+
+        comparison, live, error = compare_rivals(team_ids, gameweek)
+        if error:
+            print(f"\nError: {error}")
+            return jsonify({'error': error}), 400
+
+        return with_gameweek_final(jsonify({
+            'status': 'completed',
+            'gameweek': gameweek,
+            'live_version': live.version,
+            **comparison,
+        }), live.final)
+
+    except Exception as e:
+        print(f"\nRIVALS ERROR: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/live/<int:gameweek>', methods=['GET'])
+def live_stats(gameweek):
+    """
+    Version of the shared player stats for a gameweek. The version doubles as an
+    ETag: send it back in If-None-Match to get a 304 while nothing has changed.
+    """
+    try:
+        live = livestats.get(gameweek)
+        etag = f'"{live.version}"'
+        if etag in request.headers.get('If-None-Match', ''):
+            return Response(status=304, headers={'ETag': etag})
+        response = jsonify(live.describe())
+        response.headers['ETag'] = etag
+        return response
+
+    except Exception as e:
+        print(f"\nLIVE STATS ERROR: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
+extract.start()  # Before any thread: the parse pool is forked (see extract.py)
+jobs.configure(run_leaderboard_job)
+livestats.configure(load_event_live_async)
+prefetch.configure(prefetch_plan)
+prefetch.start()
+
+fetcher.add_observer(metrics.observe_upstream)
+metrics.collect('fpl_upstream_in_flight', 'gauge', 'Upstream requests in flight',
+                lambda: fetcher.limiter_stats().get('in_flight', 0))
+metrics.collect('fpl_upstream_concurrency_limit', 'gauge', 'Current adaptive concurrency window',
+                lambda: fetcher.limiter_stats().get('concurrency_limit', 0))
+metrics.collect('fpl_upstream_rate_limit', 'gauge', 'Current adaptive request rate per second',
+                lambda: fetcher.limiter_stats().get('rate_limit', 0))
+metrics.collect('fpl_upstream_retries_total', 'counter', 'Upstream attempts retried after a 429/5xx/network error',
+                lambda: fetcher.limiter_stats()['retries'])
+metrics.collect('fpl_upstream_exhausted_total', 'counter', 'Upstream requests that ran out of retries',
+                lambda: fetcher.limiter_stats()['exhausted'])
+metrics.collect('fpl_computations_in_flight', 'gauge', 'Distinct computations running (see singleflight.py)',
+                singleflight.in_flight)
+metrics.collect('fpl_jobs_active', 'gauge', 'Background jobs queued or running', jobs.active)
+metrics.collect('fpl_parse_in_stage', 'gauge', 'Bodies queued for or being parsed in the CPU stage',
+                lambda: extract.stats()['in_stage'])
+metrics.collect('fpl_parse_batches_total', 'counter', 'Batches sent to the parse processes',
+                lambda: extract.stats()['batches'])
+metrics.collect('fpl_ranking_indexes', 'gauge', 'Ranking indexes held in memory',
+                lambda: ranking.stats()['indexes'])
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus scrape endpoint (see metrics.py)."""
+    return Response(metrics.exposition(), mimetype='text/plain; version=0.0.4')
+
+
 @app.route('/health', methods=['GET'])
 def health():
     """Health check"""
     return jsonify({
         'status': 'ok',
         'message': 'Worker server running',
-        'max_workers': MAX_WORKERS
+        'concurrency': fetcher.CONCURRENCY,
+        'in_flight': singleflight.in_flight(),
+        'upstream': fetcher.limiter_stats(),
+        'live_stats': livestats.stats(),
+        'rankings': ranking.stats(),
+        'prefetch': prefetch.stats(),
+        'parse': extract.stats(),
+        'archive': archive.stats(),
+        'metrics': metrics.summary()
     })
 
 
 if __name__ == '__main__':
     print(f"\n{'='*80}")
     print(f"FPL Worker Server Starting...")
-    print(f"Max parallel workers: {MAX_WORKERS}")
+    print(f"Max concurrent upstream requests: {fetcher.CONCURRENCY}")
+    print(f"Response cache: {cache.CACHE_PATH} (pruned {cache.prune()} stale entries)")
     print(f"{'='*80}\n")
     app.run(debug=True, host='0.0.0.0', port=5001)
@@ -0,0 +1,84 @@
+"""
+Bounded in-memory cache of worker responses for the UI proxy.
+
+Entries hold the worker's bytes exactly as they came over the tunnel (usually
+gzip), keyed by (league_id, gameweek, ...variant), and the whole cache is kept
+under UI_CACHE_MB by evicting the least recently used entries. How long an
+entry is served without asking the worker depends on the gameweek: finished
+gameweeks (the worker's X-Gameweek-Final header) for UI_CACHE_FINAL_TTL,
+anything still changing for UI_CACHE_LIVE_TTL. Expired entries are kept until
+evicted so they can still be served while the worker is unreachable.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+MAX_BYTES = int(os.getenv('UI_CACHE_MB', '64')) * 1024 * 1024
+FINAL_TTL = int(os.getenv('UI_CACHE_FINAL_TTL', '21600'))  # Finished gameweeks only change on FPL corrections
+LIVE_TTL = int(os.getenv('UI_CACHE_LIVE_TTL', '60'))
+
+
+class Entry:
+    __slots__ = ('body', 'content_type', 'encoding', 'final', 'etag', 'stored_at', 'expires')
+
+    def __init__(self, body, content_type, encoding, final):
+        self.body = body
+        self.content_type = content_type
+        self.encoding = encoding
+        self.final = final
+        self.etag = hashlib.blake2b(body, digest_size=12).hexdigest()
+        self.stored_at = int(time.time())  # Whole seconds, as Last-Modified carries
+        self.expires = time.time() + (FINAL_TTL if final else LIVE_TTL)
+
+    def fresh(self):
+        return time.time() < self.expires
+
+
+class ResponseCache:
+    def __init__(self, max_bytes=MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.stale = 0
+
+    def get(self, key):
+        """The entry for key, fresh or not, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, body, content_type, encoding, final):
+        entry = Entry(body, content_type, encoding, final)
+        if len(body) > self.max_bytes:
+            return entry  # Serve it, but don't let one response flush the cache
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old.body)
+            self._entries[key] = entry
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted.body)
+        return entry
+
+    def record(self, outcome):
+        """Count a 'hits', 'misses' or 'stale' answer for stats()."""
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'stale': self.stale,
+            }
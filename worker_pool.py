@@ -0,0 +1,374 @@
+"""
+Pool of worker servers behind the UI proxy.
+
+WORKER_URLS lists them, comma-separated (a lone WORKER_URL still works).
+Requests for a league go to the same worker while it is healthy (rendezvous
+hashing on the league id), so that worker's response cache, snapshots and
+ranking indexes stay warm. A worker that can't be reached, or whose tunnel
+answers with an error page instead of JSON, is benched for WORKER_DOWN_SECONDS
+and the request moves on to the next one.
+
+Leagues big enough for every shard to get at least SHARD_MIN_MANAGERS managers
+(going by the page count the worker remembers from its last pagination) are
+split into manager-ID shards, team_id modulo the shard count, one per healthy
+worker. Each worker paginates the standings but only fetches histories for its
+own shard, so two or three home machines, and their IPs, share one big league.
+The shards' rows are merged back into one leaderboard here, and the merge is
+handed to the league's worker as its ranking index. A shard whose worker drops
+out or fails is run again on another worker.
+"""
+import hashlib
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+WORKER_URLS = [url.strip().rstrip('/') for url in
+               os.getenv('WORKER_URLS', os.getenv('WORKER_URL', 'http://localhost:5001')).split(',') if url.strip()]
+DOWN_SECONDS = int(os.getenv('WORKER_DOWN_SECONDS', '30'))  # How long an unreachable worker is skipped
+SHARD_MIN_MANAGERS = int(os.getenv('SHARD_MIN_MANAGERS', '1000'))
+POLL_FAILURES = 3  # Failed polls in a row before a shard job is presumed lost and restarted elsewhere
+JOB_TTL = 300  # Seconds a finished sharded job is kept for late polls
+
+
+class WorkerUnavailable(requests.exceptions.ConnectionError):
+    """No worker in the pool could take the request."""
+
+
+class ShardFailed(Exception):
+    """A shard failed on every worker it was tried on."""
+
+    def __init__(self, error, status_code):
+        super().__init__(error)
+        self.status_code = status_code
+
+
+class Worker:
+    def __init__(self, url):
+        self.url = url
+        self.down_until = 0.0
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0
+        self.last_error = None
+
+    def up(self):
+        return time.time() >= self.down_until
+
+    def describe(self):
+        return {
+            'url': self.url,
+            'up': self.up(),
+            'in_flight': self.in_flight,
+            'requests': self.requests,
+            'failures': self.failures,
+            'last_error': self.last_error,
+        }
+
+
+def merge_rows(rows):
+    """One leaderboard from shard rows: net points descending, standings order within a tie."""
+    return sorted(rows, key=lambda row: (-row['net_points'], row.get('overall_rank') or 0))
+
+
+class WorkerPool:
+    def __init__(self, urls=WORKER_URLS):
+        self.workers = [Worker(url) for url in urls]
+        self._lock = threading.Lock()
+        self._jobs = {}  # Sharded job id -> ShardedJob
+        self._job_workers = {}  # Worker job id -> Worker that holds it
+
+    def healthy(self):
+        return [worker for worker in self.workers if worker.up()]
+
+    def ranked(self, key=None):
+        """
+        Workers in the order to try them: healthy ones first, by rendezvous hash of
+        key (or fewest requests in flight without one), then benched ones.
+        """
+        def score(worker):
+            if key is None:
+                return worker.in_flight
+            return hashlib.blake2b(f'{key}|{worker.url}'.encode(), digest_size=8).digest()
+
+        healthy = sorted(self.healthy(), key=score)
+        benched = sorted((worker for worker in self.workers if not worker.up()), key=lambda worker: worker.down_until)
+        return healthy + benched
+
+    def mark_down(self, worker, error):
+        with self._lock:
+            worker.down_until = time.time() + DOWN_SECONDS
+            worker.failures += 1
+            worker.last_error = str(error)
+        print(f"⚠️ Worker {worker.url} benched for {DOWN_SECONDS}s: {error}")
+
+    def request(self, method, path, key=None, workers=None, **kwargs):
+        """
+        Send a request to the first worker (of `workers`, default ranked(key)) that
+        answers with JSON. Returns (worker, response). A read timeout is raised
+        straight away rather than repeating a long computation on another worker;
+        WorkerUnavailable once every worker has failed.
+        """
+        problem = 'no workers configured'
+        for worker in workers or self.ranked(key):
+            with self._lock:
+                worker.in_flight += 1
+                worker.requests += 1
+            try:
+                response = requests.request(method, f'{worker.url}{path}', **kwargs)
+            except requests.exceptions.ConnectTimeout as e:
+                problem = e
+                self.mark_down(worker, e)
+                continue
+            except requests.exceptions.Timeout:
+                raise
+            except requests.exceptions.ConnectionError as e:
+                problem = e
+                self.mark_down(worker, e)
+                continue
+            finally:
+                with self._lock:
+                    worker.in_flight -= 1
+
+            if 'json' not in response.headers.get('Content-Type', ''):
+                # ngrok's "endpoint offline" page and friends: the worker behind it is gone.
+                problem = f'HTTP {response.status_code} ({response.headers.get("Content-Type")})'
+                response.close()
+                self.mark_down(worker, problem)
+                continue
+            with self._lock:
+                worker.down_until = 0.0
+            return worker, response
+
+        raise WorkerUnavailable(f'No worker could answer {method} {path}: {problem}')
+
+    def check(self, timeout=5):
+        """Ping every worker's /health at once, benching or restoring each. Returns [(worker, health or None)]."""
+        def ping(worker):
+            try:
+                _, response = self.request('GET', '/health', workers=[worker], timeout=timeout)
+                return worker, response.json()
+            except (requests.exceptions.RequestException, ValueError):
+                return worker, None
+
+        with ThreadPoolExecutor(max_workers=len(self.workers)) as executor:
+            return list(executor.map(ping, self.workers))
+
+    def shard_count(self, league_id):
+        """How many shards to split a league into: 1 unless it is big and several workers are up."""
+        healthy = len(self.healthy())
+        if healthy < 2:
+            return 1
+        try:
+            _, response = self.request('GET', f'/leagues/{league_id}', key=league_id, timeout=5)
+            estimate = response.json().get('managers_estimate', 0) if response.status_code == 200 else 0
+        except (requests.exceptions.RequestException, ValueError):
+            return 1
+        return max(1, min(healthy, estimate // SHARD_MIN_MANAGERS))
+
+    def shard_workers(self, key, index):
+        """Workers for shard `index` of a league, in the order to try them; shards start on different workers."""
+        ranked = self.ranked(key)
+        healthy = len(self.healthy()) or len(ranked)
+        first = index % healthy
+        return ranked[first:healthy] + ranked[:first] + ranked[healthy:]
+
+    def run_shards(self, path, payload, count, key, timeout):
+        """
+        POST payload plus "shard": [i, count] for every shard at once, each to its own
+        worker, moving a failed shard on to the next worker. Returns the JSON answers
+        in shard order; ShardFailed if a shard failed everywhere.
+        """
+        def run(index):
+            error, status_code = 'no workers available', 503
+            for worker in self.shard_workers(key, index):
+                try:
+                    _, response = self.request('POST', path, workers=[worker], json={**payload, 'shard': [index, count]},
+                                               timeout=timeout)
+                    result = response.json()
+                except (WorkerUnavailable, ValueError) as e:
+                    error, status_code = str(e), 503
+                    continue
+                if response.status_code == 200:
+                    return result
+                error, status_code = result.get('error'), response.status_code
+                print(f"Shard {index + 1}/{count} failed on {worker.url}: {error}")
+            raise ShardFailed(f'Shard {index + 1}/{count}: {error}', status_code)
+
+        with ThreadPoolExecutor(max_workers=count) as executor:
+            return list(executor.map(run, range(count)))
+
+    def publish_index(self, league_id, gameweek, leaderboard):
+        """
+        Give a merged leaderboard to the league's worker as its ranking index, so paging
+        it doesn't rebuild the whole league on one machine. Returns whether the gameweek
+        is final (None if no worker took it).
+        """
+        try:
+            _, response = self.request('POST', '/rankings/index', key=league_id, timeout=60,
+                                       json={'league_id': league_id, 'gameweek': gameweek, 'leaderboard': leaderboard})
+            if response.status_code == 200:
+                return response.headers.get('X-Gameweek-Final') == 'true'
+            print(f"Ranking index upload failed: {response.json().get('error')}")
+        except (requests.exceptions.RequestException, ValueError) as e:
+            print(f"Ranking index upload failed: {e}")
+        return None
+
+    def remember_job(self, job_id, worker):
+        with self._lock:
+            self._job_workers[job_id] = worker
+
+    def job_workers(self, job_id):
+        """Where to look for a worker job: the worker it was submitted to, else everyone (e.g. after a restart)."""
+        worker = self._job_workers.get(job_id)
+        return [worker] if worker else self.ranked()
+
+    def submit_sharded(self, league_id, gameweek, incremental, count):
+        """Start a ShardedJob and return it."""
+        job = ShardedJob(self, league_id, gameweek, incremental, count)
+        with self._lock:
+            now = time.time()
+            for job_id in [job_id for job_id, old in self._jobs.items()
+                           if old.finished_at and now - old.finished_at > JOB_TTL]:
+                del self._jobs[job_id]
+            self._jobs[job.id] = job
+        job.start()
+        return job
+
+    def sharded_job(self, job_id):
+        return self._jobs.get(job_id)
+
+    def stats(self):
+        return {
+            'workers': [worker.describe() for worker in self.workers],
+            'healthy': len(self.healthy()),
+            'sharded_jobs': len(self._jobs),
+        }
+
+
+class ShardedJob:
+    """
+    A leaderboard job split into one worker job per shard. It answers polls in the
+    same shape as a worker job, and each poll advances the shard jobs on their
+    workers. Rows a restarted shard sends again are dropped by team_id.
+    """
+
+    def __init__(self, pool, league_id, gameweek, incremental, count):
+        self.id = f'sharded-{uuid.uuid4().hex}'
+        self.pool = pool
+        self.league_id = league_id
+        self.gameweek = gameweek
+        self.incremental = incremental
+        self.count = count
+        self.rows = []  # Every row delivered so far; polls page through it with since/next
+        self.team_ids = set()
+        self.shards = [{'index': i, 'worker': None, 'job_id': None, 'since': 0, 'status': 'queued',
+                        'seen': 0, 'failures': 0, 'tried': set(), 'error': None} for i in range(count)]
+        self.error = None
+        self.leaderboard = None  # Merged, once every shard has completed
+        self.final = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            for shard in self.shards:
+                self._start(shard)
+
+    def _start(self, shard):
+        """Submit a shard to the next worker it hasn't been tried on; fails the job when none are left."""
+        payload = {'league_id': self.league_id, 'gameweek': self.gameweek, 'incremental': self.incremental,
+                   'shard': [shard['index'], self.count]}
+        for worker in self.pool.shard_workers(self.league_id, shard['index']):
+            if worker.url in shard['tried']:
+                continue
+            shard['tried'].add(worker.url)
+            try:
+                _, response = self.pool.request('POST', '/jobs', workers=[worker], json=payload, timeout=15)
+                job = response.json()
+            except (requests.exceptions.RequestException, ValueError) as e:
+                shard['error'] = str(e)
+                continue
+            if response.status_code != 202:
+                shard['error'] = job.get('error')
+                continue
+            print(f"Shard {shard['index'] + 1}/{self.count} of league {self.league_id} -> {worker.url} ({job['job_id']})")
+            shard.update(worker=worker, job_id=job['job_id'], since=0, failures=0)
+            self._take(shard, job)
+            return
+
+        shard['status'] = 'failed'
+        self.error = f"Shard {shard['index'] + 1}/{self.count} failed on every worker: {shard['error']}"
+        self.finished_at = time.time()
+
+    def _take(self, shard, job):
+        shard['status'] = job['status']
+        shard['since'] = job['next']
+        shard['seen'] = job['seen']
+        shard['failures'] = 0
+        for row in job['rows']:
+            if row['team_id'] not in self.team_ids:
+                self.team_ids.add(row['team_id'])
+                self.rows.append(row)
+
+    def _advance(self, shard):
+        try:
+            _, response = self.pool.request('GET', f"/jobs/{shard['job_id']}", workers=[shard['worker']],
+                                            params={'since': shard['since']}, timeout=15)
+            job = response.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            shard['failures'] += 1
+            shard['error'] = str(e)
+            lost = shard['failures'] >= POLL_FAILURES or not shard['worker'].up()
+        else:
+            if response.status_code == 200 and job['status'] != 'failed':
+                self._take(shard, job)
+                return
+            shard['error'] = job.get('error')
+            lost = True  # Failed, or unknown to a worker that restarted
+
+        if lost:
+            print(f"Shard {shard['index'] + 1}/{self.count} lost on {shard['worker'].url} ({shard['error']}), retrying")
+            self._start(shard)
+
+    def poll(self, since=0):
+        """Advance every unfinished shard, then describe the job with the rows after `since`."""
+        with self._lock:
+            if self.error is None and self.leaderboard is None:
+                for shard in self.shards:
+                    if shard['status'] != 'completed':
+                        self._advance(shard)
+                    if self.error:
+                        break
+                if self.error is None and all(shard['status'] == 'completed' for shard in self.shards):
+                    self.leaderboard = merge_rows(self.rows)
+                    self.final = self.pool.publish_index(self.league_id, self.gameweek, self.leaderboard)
+                    self.finished_at = time.time()
+            return self.describe(since)
+
+    def describe(self, since=0):
+        if self.error:
+            status = 'failed'
+        elif self.leaderboard is not None:
+            status = 'completed'
+        elif any(shard['status'] in ('running', 'completed') for shard in self.shards):
+            status = 'running'
+        else:
+            status = 'queued'
+        return {
+            'job_id': self.id,
+            'status': status,
+            'league_id': self.league_id,
+            'gameweek': self.gameweek,
+            'received': len(self.rows),
+            'seen': sum(shard['seen'] for shard in self.shards),
+            'total_managers': len(self.leaderboard) if self.leaderboard is not None else None,
+            'error': self.error,
+            'rows': self.rows[since:],
+            'next': len(self.rows),
+            'shards': [{'index': shard['index'], 'worker': shard['worker'].url if shard['worker'] else None,
+                        'status': shard['status'], 'seen': shard['seen']} for shard in self.shards],
+        }